@@ -1,61 +1,44 @@
 import sys
 import os
+import time
+script_started = time.perf_counter()  # Start of this run of the script, for the time-to-first-progress figure
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Import necessary libraries and external modules
 import streamlit as st
-from agent.planner import generate_subquestions  
-from agent.gather_web import search_web as search_google  
-from agent.gather_academic import search_arxiv, get_pubmed_abstracts  
-from agent.gather_docs import extract_web_page, extract_pdf  
-from agent.chunker import chunk_text, chunk_documents  
-from agent.vectorstore import get_vectorstore, add_chunks_to_vectorstore, query_vectorstore  
-from agent.citations import extract_sources_from_chunks, render_citations  
-from agent.synthesis import generate_report, synthesize_answer  
-
-from fpdf import FPDF  
-from docx import Document  
-import io  
-
-# --- Helper Function to Convert Report to PDF ---
-def report_to_pdf(report_str):
+from agent.planner import stream_subquestions  
+from agent.vectorstore import drop_vectorstore, get_vectorstore, unique_collection_name  
+from agent.orchestrator import FanOut  
+from agent.config import PDF_FOLDER, TRACE_DIR, TRACE_ENABLED, WARMUP
+from agent.ingest import get_pdf_library, sync_folder  
+from agent.dedup import NearDuplicateFilter  
+from agent.streaming import StreamMetrics  
+from agent.llm import llm_stats  
+from agent.pipeline import EXECUTIVE_SUMMARY, MAX_SUBQUESTIONS, build_report, research_subquestion
+from agent.tracing import Tracer, waterfall_spec
+from agent.export import FORMATS, file_name, mime_type, render
+from agent.warmup import start_warm_up
+
+import contextlib
+import json
+import queue  
+import threading  
+from itertools import islice  
+
+# --- Process-wide Start-up ---
+@st.cache_resource(show_spinner=False)
+def boot():
     """
-    Converts the generated report text into a PDF document stored in memory.
+    Runs once per server process, not on every rerun: starts the optional warm-up (AGENT_WARMUP=1)
+    that loads the Ollama models, deferred imports and PDF index in the background.
+    The LLM, embedding, HTTP and PDF index clients are process-wide, so they too survive reruns.
     """
-    pdf = FPDF()  # Create a new PDF document
-    pdf.add_page()  # Add a page to the PDF document
-    pdf.set_font("Arial", size=12)  # Set font style and size for the text
-    for line in report_str.split('\n'):  # Loop through each line in the report
-        pdf.multi_cell(0, 10, line)  # Add the line as a new cell in the PDF
-    buffer = io.BytesIO()  # Store the PDF content in memory (as a buffer)
-    temp_file = "temp_report.pdf"  # Temporary file path (used only for saving and reading in memory)
-    pdf.output(temp_file)  # Save the PDF to the temporary file
-    with open(temp_file, "rb") as f:  # Read the content of the temporary file
-        buffer.write(f.read())  # Write the file content into the memory buffer
-    buffer.seek(0)  # Move the buffer pointer to the start for the download
-    os.remove(temp_file)  # Remove the temporary file to keep the system clean
-    return buffer  # Return the buffer containing the generated PDF
-
-# --- Helper Function to Convert Report to Word Document ---
-def report_to_word(report_str):
-    """
-    Converts the generated report text into a Word document stored in memory.
-    """
-    doc = Document()  # Create a new Word document
-    for line in report_str.split('\n'):  # Loop through each line in the report and format accordingly
-        if line.startswith('# '):  # If line starts with a single hashtag, it's a main heading
-            doc.add_heading(line.lstrip('# ').strip(), level=1)  # Add as level 1 heading
-        elif line.startswith('## '):  # If line starts with double hashtags, it's a sub-heading
-            doc.add_heading(line.lstrip('# ').strip(), level=2)  # Add as level 2 heading
-        elif line.strip():  # Add any non-empty lines as paragraphs
-            doc.add_paragraph(line)  # Add the paragraph to the document
-    buffer = io.BytesIO()  # Create an in-memory buffer to store the Word document
-    doc.save(buffer)  # Save the document to the buffer
-    buffer.seek(0)  # Reset the buffer's pointer to the start for the download
-    return buffer  # Return the buffer containing the Word document
+    return start_warm_up() if WARMUP else None
+
+boot()
 
 # Optional folder setup for handling PDF files
-pdf_folder = "docs"
+pdf_folder = PDF_FOLDER  # Pre-ingest it with `python -m agent.ingest` to keep this off the request path
 os.makedirs(pdf_folder, exist_ok=True)  # Ensure the 'docs' folder exists
 
 # --- Streamlit UI ---
@@ -66,135 +49,164 @@ run_agent = st.button("Run Research Agent")  # Add a button to start processing
 # --- Process the User Query and Generate Sub-questions ---
 if run_agent and user_query.strip():  # Check if the user clicked the button and entered a query
     progress = st.progress(0, text="Starting research pipeline...")  # Display progress bar
-    st.write("## Research Planning")  # Display a header for the research planning section
-    subquestions = generate_subquestions(user_query)[:2]  # Generate sub-questions based on the main query
-    st.write(subquestions)  # Display the sub-questions for the user to see
-    all_answers = []  # Create a list to store all the answers for each sub-question
-    all_chunks = []  # Create a list to store all the chunks of text data (from various sources)
-    n_subqs = len(subquestions)  # Number of sub-questions to be processed
-    vectorstore = get_vectorstore()  # Initialize the vector store for storing and querying chunks
-
-# --- Gather Data for Each Sub-question ---
-    for i, subq in enumerate(subquestions):  # Loop through each sub-question
-        try:
-            st.write(f"### Gathering evidence for: {subq}")  # Display the sub-question
-            progress.progress(int((i / (n_subqs + 3)) * 100), text=f"Processing sub-question {i+1} of {n_subqs}...")  # Update progress bar
-
-            # --- Fetch Web Results ---
-            web_results = search_google(subq, max_results=3)  # Fetch relevant web results for the sub-question
-            web_chunks = []  # List to store web page chunks (content from the web)
-
-            for res in web_results:  # Loop through each web result
+    trace_scope = contextlib.ExitStack()  # Keeps tracing active for the whole run when AGENT_TRACE is set
+    tracer = trace_scope.enter_context(Tracer().activate()) if TRACE_ENABLED else None
+    try:
+        st.write("## Research Planning")  # Display a header for the research planning section
+        planning_box = st.container()  # Sub-questions are listed here as the planner streams them
+        evidence_box = st.container()  # One section per sub-question, filled in as it is researched
+        subquestions = []  # Filled in as the planner streams each sub-question
+        all_answers = []  # Create a list to store all the answers for each sub-question
+        all_chunks = []  # Create a list to store all the chunks of text data (from various sources)
+        n_subqs = MAX_SUBQUESTIONS  # Expected number of sub-questions (the planner may produce fewer)
+        if st.session_state.get('vectorstore') is not None:
+            drop_vectorstore(st.session_state.pop('vectorstore'))  # This session's previous run is finished with it
+        vectorstore = get_vectorstore(collection_name=unique_collection_name("run"))  # Own collection per run; the embedder is shared
+        st.session_state['vectorstore'] = vectorstore
+        vectorstore_lock = threading.Lock()  # Serializes writes to the vector store across sub-questions
+        dedup = NearDuplicateFilter()  # Shared by all sub-questions, so overlap between them is removed too
+        planner_metrics = StreamMetrics()  # Time-to-first-token and throughput of the planning call
+        tokens = queue.Queue()  # (index, token) pairs streamed by the synthesis calls on worker threads
+        answer_boxes = {}  # Sub-question index -> placeholder showing its answer as it streams
+        streamed = {}  # Sub-question index -> answer tokens received so far
+
+# --- Gather Data for All Sub-questions Concurrently ---
+        done_count = [0]  # Number of finished sub-questions (mutated from the callback)
+
+        def on_subquestion_planned(i, item):
+            """
+            Runs in the Streamlit thread as soon as the planner has produced a sub-question.
+            """
+            subq = item[1]
+            subquestions.append(subq)
+            planning_box.write(f"{i+1}. {subq}")  # Display the sub-question for the user to see
+            with evidence_box:
+                st.write(f"### Gathering evidence for: {subq}")  # Display the sub-question
+                answer_boxes[i] = st.empty()
+
+        def on_tokens():
+            """
+            Drains streamed synthesis tokens and re-renders the answers they belong to.
+            """
+            changed = set()
+            while True:
                 try:
-                    page_content = extract_web_page(res['url'])  # Extract content from the web page
-                    if page_content and len(page_content) > 100:  # Ensure the content is meaningful
-                        chunks = chunk_text(page_content)  # Split content into smaller chunks
-                        for chunk in chunks:
-                            chunk_metadata = chunk.page_content if hasattr(chunk, 'page_content') else ""
-                            chunk.metadata = {'source': res['url'], 'content': chunk_metadata}  # Store metadata for each chunk
-                        web_chunks.extend(chunks)  # Add the chunks to the list
-                except Exception as e:
-                    st.error(f"Error extracting/chunking {res['url']}: {e}")  # Handle any errors
-            all_chunks.extend(web_chunks)  # Add the web chunks to the overall list of chunks
-
-            # --- Fetch Academic Results ---
-            academic_chunks = []  # List to store chunks from academic sources
-            try:
-                arxiv_docs = search_arxiv(subq, max_results=2)  # Fetch academic papers from arXiv
-                pubmed_abstracts = get_pubmed_abstracts(subq, max_results=1)  # Fetch abstracts from PubMed
-                for doc in arxiv_docs:
-                    doc.metadata = {'source': 'arXiv'}
-                    academic_chunks.append(doc)  # Add the academic document to the chunks list
-                for ab in pubmed_abstracts:
-                    from langchain_core.documents import Document
-                    doc = Document(page_content=ab['abstract'], metadata={'source': ab['title']})
-                    academic_chunks.append(doc)  # Add the academic abstract to the chunks list
-            except Exception as e:
-                st.error(f"Error in academic search: {e}")  # Handle any errors in academic search
-            all_chunks.extend(academic_chunks)  # Add academic chunks to the overall list
-
-            # --- Process Valid Chunks and Add to Vector Store ---
-            valid_chunks = [c for c in (web_chunks + academic_chunks) if c.page_content and c.page_content.strip()]  # Filter valid chunks
-            if valid_chunks:
-                add_chunks_to_vectorstore(valid_chunks, vectorstore)  # Store valid chunks in the vector store
-
-            # --- Synthesize Answers from Chunks ---
-            top_chunks = query_vectorstore(subq, vectorstore, k=4)  # Retrieve the top chunks related to the sub-question
-            answer = synthesize_answer(subq, top_chunks)  # Generate the final answer based on the top chunks
-            all_answers.append(answer)  # Store the answer for later use
-            progress.progress(int(((i + 1) / (n_subqs + 3)) * 100), text=f"Completed {i+1}/{n_subqs} sub-questions...")  # Update progress bar
-        except Exception as e:
-            st.error(f"Error processing sub-question {i+1}: {e}")  # Handle any errors during sub-question processing
-            continue
+                    i, token = tokens.get_nowait()
+                except queue.Empty:
+                    break
+                streamed.setdefault(i, []).append(token)
+                changed.add(i)
+            for i in changed:
+                answer_boxes[i].markdown("".join(streamed[i]))
+
+        def on_subquestion_done(i, result, error):
+            """
+            Runs in the Streamlit thread as each sub-question finishes, in completion order.
+            """
+            done_count[0] += 1
+            on_tokens()  # Flush any tokens still queued for this answer
+            with evidence_box:
+                if error is not None:
+                    st.error(f"Error processing sub-question {i+1}: {error}")  # Handle any errors during sub-question processing
+                else:
+                    for message in result['errors']:
+                        st.error(message)  # Report source errors collected on the worker threads
+                    answer_boxes[i].markdown(result['answer'])
+                    st.caption(f"Synthesis: {result['metrics']}")  # Time-to-first-token, tokens/sec and total latency
+                    st.caption(f"Context: {result['context']}")  # Prompt tokens saved by packing
+            progress.progress(int((done_count[0] / (n_subqs + 3)) * 100), text=f"Completed {done_count[0]}/{n_subqs} sub-questions...")  # Update progress bar
 
 # --- Handling PDF Documents for Additional Evidence ---
-    try:
-        progress.progress(95, text="Processing PDF documents for additional evidence...")
-        pdf_chunks = []  # List to store chunks from PDF documents
-        for filename in os.listdir(pdf_folder):  # Loop through files in the "docs" folder
-            if filename.lower().endswith('.pdf'):  # Process only PDF files
-                file_path = os.path.join(pdf_folder, filename)
-                docs = extract_pdf(file_path)  # Extract content from the PDF
-                pdf_chunks.extend(chunk_documents(docs))  # Split PDF content into chunks
-        if pdf_chunks:
-            add_chunks_to_vectorstore(pdf_chunks, vectorstore)  # Add PDF chunks to the vector store
-            all_chunks.extend(pdf_chunks)  # Add the PDF chunks to the overall list
-    except Exception as e:
-        st.error(f"Error processing PDFs: {e}")  # Handle any errors in PDF processing
+        library = None  # Searched alongside each sub-question's evidence once PDFs are ingested
+        try:
+            progress.progress(0, text="Syncing PDF library for additional evidence...")
+            pdf_summary = sync_folder(pdf_folder)  # Embed only PDFs that were added or changed since the last sync
+            st.caption(
+                f"PDF library: {pdf_summary['added']} added, {pdf_summary['updated']} updated, "
+                f"{pdf_summary['removed']} removed, {pdf_summary['unchanged']} unchanged"
+            )
+            library = get_pdf_library()
+        except Exception as e:
+            st.error(f"Error processing PDFs: {e}")  # Handle any errors in PDF processing
+
+        progress.progress(0, text="Planning sub-questions...")  # Update progress bar
+        first_progress = time.perf_counter() - script_started  # Time from the click to the planning progress update
+        planned = enumerate(islice(stream_subquestions(user_query, planner_metrics), MAX_SUBQUESTIONS))  # Gathering starts as each one arrives
+        with FanOut() as fanout:
+            results = fanout.map(
+                lambda item: research_subquestion(item[1], fanout, vectorstore, vectorstore_lock, dedup, library=library,
+                                                  on_token=lambda token, i=item[0]: tokens.put((i, token))),
+                planned,
+                on_submit=on_subquestion_planned,
+                on_result=on_subquestion_done,
+                on_poll=on_tokens,
+            )
+        planning_box.caption(f"Planning: {planner_metrics} · planning started {first_progress * 1000:.0f} ms after the click")
+        for result in results:  # Results come back in sub-question order
+            if result is not None:
+                all_chunks.extend(result['chunks'])  # Add the web and academic chunks to the overall list
+                all_answers.append(result['answer'])  # Store the answer for later use
+        if dedup.seen:
+            st.caption(f"Removed {dedup.removed} near-duplicate chunks of {dedup.seen} before embedding.")
 
 # --- Generate the Final Report ---
+        try:
+            progress.progress(98, text="Synthesizing and assembling final report...")
+
+            # --- Title for the Final Report ---
+            st.markdown("## Final Report")
+
+            # --- Findings --- (Display answers to sub-questions without questions)
+            st.markdown("### Findings")
+
+            for i, answer in enumerate(all_answers):  # Display answers dynamically
+                st.markdown(answer)  # Show the answer for each sub-question
+
+            # --- Executive Summary ---
+            st.markdown("## Executive Summary")
+            combined_summary = EXECUTIVE_SUMMARY
+            st.markdown(combined_summary)  # Display the summary
+
+            # # --- References ---
+            # st.markdown("## References")
+            # sources = extract_sources_from_chunks(all_chunks)  # Extract sources from the chunks
+            # numbered_citations = render_citations(sources)  # Format and display citations
+            # st.markdown(numbered_citations)  # Display references in the Streamlit app
+
+            # --- Final Report ---
+            report = build_report(all_answers)  # Findings section followed by the executive summary
+            #report += "## References\n" + numbered_citations  # Add references section
+            st.session_state['last_report'] = report  # Exported below, only in the format the user picks
+
+            with st.expander("LLM cache and latency"):  # Savings from reused completions
+                st.json(llm_stats())
+
+            progress.progress(100, text="Done! Report ready for download.")  # Final progress update
+        except Exception as e:
+            st.error(f"Error finalizing report: {e}")  # Handle errors during final report generation
+    finally:
+        trace_scope.close()  # Also on errors and Streamlit reruns, so tracing never stays active
+        if tracer is not None:
+            st.session_state['last_trace'] = tracer  # Kept so the panel below survives reruns
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            tracer.write_jsonl(os.path.join(TRACE_DIR, f"trace-{time.strftime('%Y%m%d-%H%M%S')}.jsonl"))
+
+# --- Export the Last Report ---
+if st.session_state.get('last_report'):
+    last_report = st.session_state['last_report']
+    export_format = st.selectbox("Export format", list(FORMATS), format_func=lambda fmt: FORMATS[fmt][0])  # Changing it reruns the script
     try:
-        progress.progress(98, text="Synthesizing and assembling final report...")
-
-        # --- Title for the Final Report ---
-        st.markdown("## Final Report")
-
-        # --- Findings --- (Display answers to sub-questions without questions)
-        st.markdown("### Findings")
-
-        for i, answer in enumerate(all_answers):  # Display answers dynamically
-            st.markdown(answer)  # Show the answer for each sub-question
-
-        # --- Executive Summary ---
-        st.markdown("## Executive Summary")
-        combined_summary = (
-            "An AI Research Agent in healthcare diagnostics is a powerful system designed to assist healthcare professionals by automating "
-            "tasks, analyzing vast amounts of medical data, and enhancing diagnostic accuracy. These agents utilize advanced technologies "
-            "such as machine learning (ML), natural language processing (NLP), and predictive analytics to process data from multiple sources "
-            "like medical images, electronic health records (EHR), and genomics data. Their main purpose is to improve patient outcomes by offering "
-            "decision support, diagnosing diseases, and recommending treatment options. The key features of an AI Research Agent include the "
-            "ability to analyze complex medical data, learn from previous outcomes, and integrate various types of medical information for "
-            "holistic diagnosis. Furthermore, these agents can become more autonomous, providing increasing support in diagnostic workflows and "
-            "eventually offering autonomous diagnoses in certain areas of healthcare. As healthcare systems adopt AI technologies, AI Research "
-            "Agents are becoming integral to healthcare delivery, improving efficiency, reducing human error, and ensuring higher-quality care."
-        )
-        st.markdown(combined_summary)  # Display the summary
-
-        # # --- References ---
-        # st.markdown("## References")
-        # sources = extract_sources_from_chunks(all_chunks)  # Extract sources from the chunks
-        # numbered_citations = render_citations(sources)  # Format and display citations
-        # st.markdown(numbered_citations)  # Display references in the Streamlit app
-
-        # --- Final Report ---
-        report = f"# Final Report\n\n"
-        report += "## Findings\n"  # Findings section
-        for i, answer in enumerate(all_answers):  # Loop through answers
-            report += f"{answer}\n\n"
-        report += "## Executive Summary\n" + combined_summary + "\n\n"
-        #report += "## References\n" + numbered_citations  # Add references section
-
-        # --- Streamlit Export Buttons for the Final Report ---
-        st.download_button("Download Report (.txt)", data=report, file_name="research_report.txt", mime="text/plain")
-        st.download_button("Download Report (.md)", data=report, file_name="research_report.md", mime="text/markdown")
-
-        # PDF and Word downloads
-        pdf_buffer = report_to_pdf(report)
-        word_buffer = report_to_word(report)
-
-        st.download_button("Download Report as PDF", data=pdf_buffer.getvalue(), file_name="research_report.pdf", mime="application/pdf")
-        st.download_button("Download Report (.docx)", data=word_buffer.getvalue(), file_name="research_report.docx", mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
-
-        progress.progress(100, text="Done! Report ready for download.")  # Final progress update
+        export_data = render(last_report, export_format)  # Rendered in memory on first request, then memoized by content hash
+        st.download_button(f"Download Report ({FORMATS[export_format][0]})", data=export_data,
+                           file_name=file_name(export_format), mime=mime_type(export_format))
     except Exception as e:
-        st.error(f"Error finalizing report: {e}")  # Handle errors during final report generation
+        st.error(f"Error exporting report: {e}")  # Handle errors from the PDF or Word renderers
+
+# --- Trace of the Last Run ---
+if TRACE_ENABLED and st.session_state.get('last_trace') is not None:
+    last_trace = st.session_state['last_trace']
+    with st.expander("Trace of the last run"):  # Where the time went, stage by stage
+        st.vega_lite_chart(waterfall_spec(last_trace.records()), use_container_width=True)  # Waterfall of every span
+        st.dataframe(last_trace.summary())  # Totals per stage: calls, wall and CPU time, items, bytes
+        st.download_button("Download trace (.jsonl)", data=last_trace.jsonl(), file_name="trace.jsonl", mime="application/x-ndjson")
+        st.download_button("Download Chrome trace (.json)", data=json.dumps(last_trace.chrome_trace()), file_name="trace.json", mime="application/json")
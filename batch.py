@@ -0,0 +1,208 @@
+# agent/batch.py
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from agent.config import BATCH_WORKERS, PDF_INDEX_DIR
+from agent.ingest import sync_folder
+from agent.orchestrator import FanOut
+from agent.pipeline import MAX_SUBQUESTIONS, run_research
+from agent.vectorstore import drop_vectorstore, get_vectorstore, unique_collection_name
+
+CHECKPOINT_NAME = "checkpoint.jsonl"
+QUERY_FIELDS = ("query", "question", "title")  # First field found is the research question
+ID_FIELDS = ("id", "request_id")
+
+
+def query_id(query, record=None):
+    """
+    Stable identifier for a query: its own id field if it has one, else a hash of its text.
+    Safe to use as a file name.
+    """
+    for field in ID_FIELDS:
+        if record and record.get(field):
+            return re.sub(r"[^A-Za-z0-9._-]+", "_", str(record[field]))
+    return "q-" + hashlib.sha1(query.encode("utf-8")).hexdigest()[:12]
+
+
+def load_queries(path, field=None):
+    """
+    Reads queries from a JSON-lines file (one object per line; the question is taken from `field`,
+    or the first of query/question/title present) or from a text file with one question per line.
+    Returns a list of (id, query) in file order, without duplicate ids.
+    """
+    queries = {}
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if path.endswith((".jsonl", ".ndjson")):
+                record = json.loads(line)
+                fields = (field,) if field else QUERY_FIELDS
+                query = next((record[name] for name in fields if record.get(name)), None)
+                if query is None:
+                    raise ValueError(f"{path}:{n}: no {' / '.join(fields)} field")
+                queries.setdefault(query_id(query, record), query)
+            else:
+                queries.setdefault(query_id(line), line)
+    return list(queries.items())
+
+
+def load_checkpoint(out_dir):
+    """
+    Returns {id: last checkpoint record} from an output directory; later records win.
+    """
+    done = {}
+    path = os.path.join(out_dir, CHECKPOINT_NAME)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by a crash
+                done[record["id"]] = record
+    return done
+
+
+def _write_atomic(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class BatchRunner:
+    """
+    Runs the research pipeline for many queries, `workers` at a time, in one process.
+    Every query shares the HTTP connection pool, LLM clients, embedding cache, source worker pools
+    and the pre-ingested PDF index; each gets its own vector store collection, dropped when it finishes.
+    Each finished report is written to `out_dir` straight away and recorded in a checkpoint,
+    so a rerun with the same output directory skips what is already done.
+    """
+
+    def __init__(self, out_dir, workers=BATCH_WORKERS, max_subquestions=MAX_SUBQUESTIONS, log=print):
+        self.out_dir = out_dir
+        self.workers = workers
+        self.max_subquestions = max_subquestions
+        self.log = log
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(out_dir, "reports"), exist_ok=True)
+
+    def _checkpoint(self, record):
+        with self._lock, open(os.path.join(self.out_dir, CHECKPOINT_NAME), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def run_one(self, qid, query, fanout):
+        """
+        Researches one query and writes its report (.md) and details (.json). Returns the checkpoint record.
+        """
+        started = time.perf_counter()
+        vectorstore = get_vectorstore(collection_name=unique_collection_name("batch", qid))  # Ids can be long or end in "_"
+        try:
+            result = run_research(query, max_subquestions=self.max_subquestions, vectorstore=vectorstore, fanout=fanout)
+        finally:
+            drop_vectorstore(vectorstore)  # Dropped as soon as the query is done, so a long batch does not accumulate them
+        report_path = os.path.join(self.out_dir, "reports", f"{qid}.md")
+        _write_atomic(report_path, result["report"])
+        details = {
+            "id": qid, "query": query, "subquestions": result["subquestions"], "sources": result["sources"],
+            "errors": result["errors"], "dedup": result["dedup"], "seconds": result["seconds"],
+            "planner": result["planner_metrics"].as_dict(),
+            "synthesis": [m.as_dict() for m in result["synthesis_metrics"]],
+            "context": [c.as_dict() for c in result["context"]],
+        }
+        _write_atomic(os.path.join(self.out_dir, "reports", f"{qid}.json"), json.dumps(details, indent=2))
+        return {
+            "id": qid, "status": "done", "seconds": time.perf_counter() - started,
+            "report": os.path.relpath(report_path, self.out_dir), "errors": len(result["errors"]),
+        }
+
+    def run(self, queries, resume=True, retry_failed=False):
+        """
+        Runs every (id, query) pair not yet completed. Returns a summary dict with counts and queries/hour.
+        """
+        checkpoint = load_checkpoint(self.out_dir) if resume else {}
+        skip = {qid for qid, record in checkpoint.items() if record["status"] == "done" or not retry_failed}
+        todo = [(qid, query) for qid, query in queries if qid not in skip]
+        self.log(f"{len(queries)} queries: {len(queries) - len(todo)} already in the checkpoint, {len(todo)} to run")
+        summary = {"total": len(queries), "skipped": len(queries) - len(todo), "done": 0, "failed": 0}
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="query") as pool, FanOut() as fanout:
+            pending = {}
+            remaining = iter(todo)
+
+            def submit_next():
+                for qid, query in remaining:
+                    pending[pool.submit(self.run_one, qid, query, fanout)] = qid
+                    return
+
+            for _ in range(self.workers):  # Queries are submitted as workers free up, so an interrupt loses little
+                submit_next()
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    qid = pending.pop(future)
+                    try:
+                        record = future.result()
+                        summary["done"] += 1
+                    except Exception as e:
+                        record = {"id": qid, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+                        summary["failed"] += 1
+                    self._checkpoint(record)
+                    elapsed = time.perf_counter() - started
+                    finished_count = summary["done"] + summary["failed"]
+                    self.log(
+                        f"[{finished_count}/{len(todo)}] {qid}: {record['status']}"
+                        + (f" in {record['seconds']:.1f}s" if "seconds" in record else f" ({record['error']})")
+                        + f" · {3600 * finished_count / elapsed:.1f} queries/hour"
+                    )
+                    submit_next()
+
+        summary["seconds"] = time.perf_counter() - started
+        ran = summary["done"] + summary["failed"]
+        summary["queries_per_hour"] = 3600 * ran / summary["seconds"] if ran and summary["seconds"] else None
+        return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m agent.batch",
+        description="Run the research pipeline headlessly for a file of queries, writing one report per query.",
+    )
+    parser.add_argument("queries", help="JSON-lines file (query/question/title field) or text file with one query per line")
+    parser.add_argument("out_dir", help="Reports and the resume checkpoint are written here")
+    parser.add_argument("--field", help="JSON field holding the question (default: first of query, question, title)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Queries researched at once (default: %(default)s)")
+    parser.add_argument("--subquestions", type=int, default=MAX_SUBQUESTIONS, help="Sub-questions per query (default: %(default)s)")
+    parser.add_argument("--pdf-folder", help="Sync this PDF library into the shared index once before the batch")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore the checkpoint and run every query again")
+    parser.add_argument("--retry-failed", action="store_true", help="Run queries that failed in an earlier attempt again")
+    args = parser.parse_args(argv)
+
+    if args.pdf_folder:
+        pdf_summary = sync_folder(args.pdf_folder, index_dir=PDF_INDEX_DIR)
+        print(f"PDF library: {pdf_summary}")
+    runner = BatchRunner(args.out_dir, workers=args.workers, max_subquestions=args.subquestions)
+    summary = runner.run(load_queries(args.queries, args.field), resume=not args.no_resume, retry_failed=args.retry_failed)
+    rate = summary["queries_per_hour"]
+    print(
+        f"Done: {summary['done']} succeeded, {summary['failed']} failed, {summary['skipped']} skipped "
+        f"in {summary['seconds']:.1f}s" + (f" ({rate:.1f} queries/hour)" if rate else "")
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
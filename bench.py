@@ -0,0 +1,438 @@
+# agent/bench.py
+
+import argparse
+import contextlib
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from agent.config import PACKAGE_DIR
+
+EMBED_DIM = 768
+PAGE_POOL = 200  # Distinct fake pages; sub-questions of one query hit overlapping pages, as real searches do
+VOCAB = [f"{a}{b}" for a in ("cardio", "neuro", "onco", "radio", "patho", "immuno", "geno", "derma") for b in (
+    "logy", "graphy", "scan", "marker", "therapy", "imaging", "model", "cohort", "trial", "assay", "score", "signal")]
+VOCAB += "the a of and in to with for by model patients diagnosis accuracy study data clinical deep learning network".split()
+
+
+def make_text(seed, words):
+    """
+    Deterministic filler prose: `words` words in sentences of 10-20 words.
+    """
+    rng = random.Random(seed)
+    sentences = []
+    while words > 0:
+        n = min(words, rng.randint(10, 20))
+        sentences.append(" ".join(rng.choices(VOCAB, k=n)).capitalize() + ".")
+        words -= n
+    return " ".join(sentences)
+
+
+def embed_text(text, dim=EMBED_DIM):
+    """
+    Hashed bag-of-words vector, so texts sharing words are close, as with a real embedding model.
+    """
+    vector = [0.0] * dim
+    for word in text.lower().split():
+        vector[zlib.crc32(word.encode("utf-8")) % dim] += 1.0
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class FakeServices:
+    """
+    Local HTTP stand-ins for web pages, PubMed E-utilities and the Ollama generate/embed API,
+    each with configurable latency and payload size. Served from a background thread.
+    """
+
+    def __init__(self, latency=0.05, page_kb=20, abstract_words=250, reply_tokens=150,
+                 first_token_delay=0.2, token_delay=0.005, embed_latency=0.01, planner_items=8):
+        self.latency = latency
+        self.page_kb = page_kb
+        self.abstract_words = abstract_words
+        self.reply_tokens = reply_tokens
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.embed_latency = embed_latency
+        self.planner_items = planner_items
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def settings(self):
+        return {key: value for key, value in vars(self).items() if not key.startswith("_") and key != "requests"}
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeHandler)
+        self._server.daemon_threads = True
+        self._server.services = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, route):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    # --- Payloads ---
+
+    def page(self, n):
+        paragraphs = []
+        size = 0
+        j = 0
+        while size < self.page_kb * 1024:
+            seed = j if j % 4 == 3 else n * 1000 + j  # Every fourth paragraph is boilerplate shared by all pages
+            text = make_text(seed, 80)
+            paragraphs.append(f"<p>{text}</p>")
+            size += len(text) + 7
+            j += 1
+        return f"<html><head><title>Page {n}</title></head><body>{''.join(paragraphs)}</body></html>"
+
+    def pubmed_xml(self, ids):
+        articles = "".join(
+            f"<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID><Article>"
+            f"<ArticleTitle>Study {pmid}</ArticleTitle>"
+            f"<Abstract><AbstractText>{make_text(int(pmid), self.abstract_words)}</AbstractText></Abstract>"
+            f"</Article></MedlineCitation></PubmedArticle>"
+            for pmid in ids
+        )
+        return f'<?xml version="1.0"?><PubmedArticleSet>{articles}</PubmedArticleSet>'
+
+    def reply(self, prompt):
+        seed = zlib.crc32(prompt.encode("utf-8"))
+        if prompt.startswith("Decompose"):  # planner.build_prompt
+            return "\n".join(f"{i}. {make_text(seed + i, 12)[:-1]}?" for i in range(1, self.planner_items + 1))
+        return make_text(seed, self.reply_tokens)
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        body = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        services = self.server.services
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path.startswith("/page/"):
+            services.count("page")
+            time.sleep(services.latency)
+            self._send(200, services.page(int(url.path.rsplit("/", 1)[1])), "text/html; charset=utf-8")
+        elif url.path.endswith("/esearch.fcgi"):
+            services.count("esearch")
+            time.sleep(services.latency)
+            seed = zlib.crc32(query.get("term", [""])[0].encode("utf-8")) % 10_000_000
+            ids = [str(seed + i) for i in range(int(query.get("retmax", ["3"])[0]))]
+            self._send(200, json.dumps({"esearchresult": {"idlist": ids}}), "application/json")
+        elif url.path.endswith("/efetch.fcgi"):
+            services.count("efetch")
+            time.sleep(services.latency)
+            ids = [i for i in query.get("id", [""])[0].split(",") if i]
+            self._send(200, services.pubmed_xml(ids), "application/xml")
+        else:
+            self._send(404, "not found", "text/plain")
+
+    def do_POST(self):
+        services = self.server.services
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = body.get("model", "")
+        if self.path == "/api/embed":
+            services.count("embed")
+            texts = body.get("input", [])
+            texts = [texts] if isinstance(texts, str) else texts
+            time.sleep(services.embed_latency)
+            self._send(200, json.dumps({"model": model, "embeddings": [embed_text(t) for t in texts]}), "application/json")
+        elif self.path == "/api/generate":
+            services.count("generate")
+            words = services.reply(body.get("prompt", "")).split(" ")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()  # HTTP/1.0 without Content-Length: the stream ends when the connection closes
+            time.sleep(services.first_token_delay)
+            try:
+                for n, word in enumerate(words):
+                    if n:
+                        time.sleep(services.token_delay)
+                    token = word if n == len(words) - 1 else word + " "
+                    part = {"model": model, "created_at": "2024-01-01T00:00:00Z", "response": token, "done": False}
+                    self.wfile.write(json.dumps(part).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+                done = {"model": model, "created_at": "2024-01-01T00:00:00Z", "response": "", "done": True, "done_reason": "stop"}
+                self.wfile.write(json.dumps(done).encode("utf-8") + b"\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client stopped reading early, as the planner does once it has enough sub-questions
+        else:
+            self._send(404, json.dumps({"error": "not found"}), "application/json")
+
+
+def install_fakes(base_url, search_latency, arxiv_latency, arxiv_words):
+    """
+    Replaces the DDGS web search and the arXiv loader used by the pipeline with local fakes.
+    They keep the caching of the functions they replace.
+    """
+    from langchain_core.documents import Document
+
+    import agent.pipeline as pipeline
+    from agent.cache import cached
+
+    def search_web(query, max_results=3):
+        time.sleep(search_latency)
+        seed = zlib.crc32(query.encode("utf-8"))
+        return [
+            {"title": f"Result {i}", "url": f"{base_url}/page/{(seed + i) % PAGE_POOL}", "snippet": make_text(seed + i, 20)}
+            for i in range(max_results)
+        ]
+
+    def search_arxiv(query, max_results=3):
+        time.sleep(arxiv_latency)
+        seed = zlib.crc32(query.encode("utf-8"))
+        return [Document(page_content=make_text(seed + i, arxiv_words), metadata={"Title": f"Paper {seed + i}"}) for i in range(max_results)]
+
+    pipeline.search_web = cached("web_search")(search_web)
+    pipeline.search_arxiv = cached("arxiv")(search_arxiv)
+
+
+def make_pdfs(folder, count, pages, words_per_page=400):
+    import fitz  # PyMuPDF
+
+    os.makedirs(folder, exist_ok=True)
+    for n in range(count):
+        with fitz.open() as pdf:
+            for p in range(pages):
+                page = pdf.new_page()
+                page.insert_textbox(fitz.Rect(40, 40, 555, 800), make_text(n * 1000 + p, words_per_page), fontsize=8)
+            pdf.save(os.path.join(folder, f"paper{n:03d}.pdf"))
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, KiB on Linux
+
+
+def run_child(spec, out_path):
+    """
+    Runs one benchmark configuration; called in a fresh process so peak memory belongs to this configuration only.
+    """
+    install_fakes(spec["url"], spec["search_latency"], spec["arxiv_latency"], spec["arxiv_words"])
+    from agent.pipeline import StageTimes, run_research
+    from agent.tracing import Tracer
+    from agent.vectorstore import get_vectorstore
+
+    import_rss = peak_rss_mb()
+    limits = {"web": spec["results"], "arxiv": spec["results"], "pubmed": spec["results"]}
+    runs = []
+    for repeat in range(spec["repeat"]):
+        times = StageTimes()
+        tracer = Tracer()
+        with tracer.activate() if spec["trace"] else contextlib.nullcontext():
+            result = run_research(
+                spec["query"], max_subquestions=spec["subquestions"], pdf_folder=spec["pdf_folder"],
+                limits=limits, vectorstore=get_vectorstore(collection_name=f"bench_{repeat}"), times=times,
+            )
+        if spec["trace"]:
+            name = f"subq{spec['subquestions']}-results{spec['results']}-pdfs{spec['pdfs']}-run{repeat}"
+            tracer.write_chrome(os.path.join(spec["trace"], f"{name}.json"))
+            tracer.write_jsonl(os.path.join(spec["trace"], f"{name}.jsonl"))
+        stages = times.as_dict()
+        for stage in stages.values():
+            stage["items_per_sec"] = stage["items"] / stage["seconds"] if stage["seconds"] else None
+        runs.append({
+            "repeat": repeat,
+            "seconds": result["seconds"],
+            "subquestions": len(result["subquestions"]),
+            "chunks": len(result["chunks"]),
+            "sources": len(result["sources"]),
+            "errors": result["errors"],
+            "dedup": result["dedup"],
+            "pdf": result["pdf_summary"],
+            "planner": result["planner_metrics"].as_dict(),
+            "synthesis": [m.as_dict() for m in result["synthesis_metrics"]],
+            "context": [c.as_dict() for c in result["context"]],
+            "stages": stages,
+            "subquestions_per_min": 60 * len(result["subquestions"]) / result["seconds"],
+            "chunks_per_sec": len(result["chunks"]) / result["seconds"],
+        })
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({"runs": runs, "import_rss_mb": import_rss, "peak_rss_mb": peak_rss_mb()}, f)
+
+
+def child_env(url, workdir, backend):
+    env = dict(os.environ)
+    env.update(
+        PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(PACKAGE_DIR), env.get("PYTHONPATH")])),
+        OLLAMA_HOST=url,
+        AGENT_EUTILS_URL=f"{url}/eutils",
+        AGENT_CACHE_PATH=os.path.join(workdir, "cache.sqlite3"),
+        AGENT_EMBED_CACHE_PATH=os.path.join(workdir, "embeddings.sqlite3"),
+        AGENT_PDF_INDEX_DIR=os.path.join(workdir, "pdf_index"),
+    )
+    if backend:
+        env["AGENT_VECTOR_BACKEND"] = backend
+    return env
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=PACKAGE_DIR, capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def config_key(entry):
+    return (entry["subquestions"], entry["results"], entry["pdfs"])
+
+
+def compare(baseline, current, tolerance=0.10):
+    """
+    Prints end-to-end time and peak memory of each configuration against a baseline results file.
+    Returns the number of configurations that got slower by more than `tolerance`.
+    """
+    old = {config_key(entry): entry for entry in baseline["results"] if "runs" in entry}
+    regressions = 0
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'}:")
+    for entry in current["results"]:
+        before = old.get(config_key(entry))
+        if before is None or "runs" not in entry:
+            continue
+        t0, t1 = before["runs"][0]["seconds"], entry["runs"][0]["seconds"]
+        change = t1 / t0 - 1 if t0 else 0.0
+        flag = "  REGRESSION" if change > tolerance else ""
+        regressions += change > tolerance
+        print(
+            f"  subq={entry['subquestions']} results={entry['results']} pdfs={entry['pdfs']}: "
+            f"{t0:.2f}s -> {t1:.2f}s ({change:+.0%}), peak RSS {before['peak_rss_mb']:.0f} -> {entry['peak_rss_mb']:.0f} MB{flag}"
+        )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m agent.bench",
+        description="Offline end-to-end benchmark of the research pipeline against local fakes of every external service.",
+    )
+    parser.add_argument("--subquestions", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--results", type=int, nargs="+", default=[3], help="Results per source (web, arXiv, PubMed)")
+    parser.add_argument("--pdfs", type=int, nargs="+", default=[0], help="PDFs in the library, synced into the index before planning")
+    parser.add_argument("--pdf-pages", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per configuration; later runs hit the warm caches")
+    parser.add_argument("--query", default="How is deep learning used in clinical diagnosis?")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], help="Vector store backend (default: AGENT_VECTOR_BACKEND)")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Latency of page and E-utilities requests")
+    parser.add_argument("--search-latency-ms", type=float, default=300)
+    parser.add_argument("--arxiv-latency-ms", type=float, default=500)
+    parser.add_argument("--page-kb", type=int, default=20)
+    parser.add_argument("--abstract-words", type=int, default=250)
+    parser.add_argument("--arxiv-words", type=int, default=3000)
+    parser.add_argument("--reply-tokens", type=int, default=150)
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--token-ms", type=float, default=5)
+    parser.add_argument("--embed-latency-ms", type=float, default=10)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="Earlier results file to compare against")
+    parser.add_argument("--trace", metavar="DIR", help="Also write a Chrome trace and a JSON-lines trace of every run here")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-out", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(json.loads(args.child), args.child_out)
+        return 0
+
+    services = FakeServices(
+        latency=args.latency_ms / 1000, page_kb=args.page_kb, abstract_words=args.abstract_words,
+        reply_tokens=args.reply_tokens, first_token_delay=args.first_token_ms / 1000,
+        token_delay=args.token_ms / 1000, embed_latency=args.embed_latency_ms / 1000,
+        planner_items=max(args.subquestions),
+    ).start()
+    results = []
+    if args.trace:
+        os.makedirs(args.trace, exist_ok=True)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for n in set(args.pdfs):
+                make_pdfs(os.path.join(tmp, f"pdfs_{n}"), n, args.pdf_pages)
+            grid = list(itertools.product(args.subquestions, args.results, args.pdfs))
+            for i, (subquestions, per_source, pdfs) in enumerate(grid):
+                workdir = os.path.join(tmp, f"run{i}")
+                os.makedirs(workdir)
+                spec = {
+                    "url": services.url, "query": args.query, "repeat": args.repeat,
+                    "subquestions": subquestions, "results": per_source, "pdfs": pdfs,
+                    "trace": os.path.abspath(args.trace) if args.trace else None,
+                    "pdf_folder": os.path.join(tmp, f"pdfs_{pdfs}") if pdfs else None,
+                    "search_latency": args.search_latency_ms / 1000, "arxiv_latency": args.arxiv_latency_ms / 1000,
+                    "arxiv_words": args.arxiv_words,
+                }
+                out_path = os.path.join(workdir, "result.json")
+                proc = subprocess.run(
+                    [sys.executable, "-m", "agent.bench", "--child", json.dumps(spec), "--child-out", out_path],
+                    env=child_env(services.url, workdir, args.backend), stdout=subprocess.DEVNULL,
+                )
+                entry = {"subquestions": subquestions, "results": per_source, "pdfs": pdfs}
+                if proc.returncode != 0:
+                    entry["error"] = f"exit status {proc.returncode}"
+                    print(f"subq={subquestions} results={per_source} pdfs={pdfs}: failed ({entry['error']})")
+                else:
+                    with open(out_path, encoding="utf-8") as f:
+                        entry.update(json.load(f))
+                    run = entry["runs"][-1]
+                    print(
+                        f"subq={subquestions} results={per_source} pdfs={pdfs}: {run['seconds']:.2f}s, "
+                        f"{run['chunks']} chunks, {run['subquestions_per_min']:.1f} sub-questions/min, "
+                        f"peak RSS {entry['peak_rss_mb']:.0f} MB"
+                    )
+                results.append(entry)
+    finally:
+        services.stop()
+
+    output = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "backend": args.backend or os.getenv("AGENT_VECTOR_BACKEND", "chroma"),
+        "services": services.settings(),
+        "requests": services.requests,
+        "args": {key: value for key, value in vars(args).items() if not key.startswith("child")},
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"Wrote {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            return 1 if compare(json.load(f), output) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+# agent/cache.py
+
+import functools
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from agent.config import CACHE_DISABLED, CACHE_MAX_BYTES, CACHE_PATH, CACHE_TTL
+
+EVICT_EVERY = 50  # Writes between size checks
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    hash TEXT NOT NULL REFERENCES blobs(hash),
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed_at);
+CREATE INDEX IF NOT EXISTS entries_hash ON entries(hash);
+"""
+
+
+class Entry:
+    """
+    A cached value with its HTTP validators.
+    `fresh` is False once the entry is older than its namespace's TTL; it can still be revalidated.
+    """
+    __slots__ = ("value", "etag", "last_modified", "fresh")
+
+    def __init__(self, value, etag, last_modified, fresh):
+        self.value = value
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh = fresh
+
+
+def normalize(value):
+    """
+    Normalizes request arguments so trivially different spellings share a key:
+    strings have surrounding and repeated whitespace collapsed, dict keys are sorted.
+    """
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    return value
+
+
+def make_key(namespace, *args, **kwargs):
+    """
+    Builds the cache key for a request: a SHA-256 of the namespace and its normalized arguments.
+    """
+    payload = json.dumps([namespace, normalize(list(args)), normalize(kwargs)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cache:
+    """
+    Content-addressed on-disk cache backed by SQLite.
+    Entries map a request key to the hash of a pickled value, so identical payloads are stored once.
+    WAL mode and one connection per thread make it safe for concurrent Streamlit sessions and processes.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = dict(CACHE_TTL if ttl is None else ttl)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, namespace, field):
+        with self._lock:
+            counters = self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0})
+            counters[field] += 1
+
+    def _ttl(self, namespace):
+        try:
+            return self.ttl[namespace]
+        except KeyError:
+            raise KeyError(f"No TTL configured for cache namespace {namespace!r}; add it to CACHE_TTL") from None
+
+    def get(self, namespace, key):
+        """
+        Returns the Entry stored under key, or None. Counts a hit only for fresh entries.
+        Raises KeyError for a namespace without a TTL, rather than treating every entry as stale.
+        """
+        ttl = self._ttl(namespace)
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT b.data, e.etag, e.last_modified, e.stored_at FROM entries e "
+            "JOIN blobs b ON b.hash = e.hash WHERE e.key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            self._count(namespace, "misses")
+            return None
+        data, etag, last_modified, stored_at = row
+        now = time.time()
+        with conn:
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        fresh = now - stored_at < ttl
+        self._count(namespace, "hits" if fresh else "misses")
+        return Entry(pickle.loads(data), etag, last_modified, fresh)
+
+    def set(self, namespace, key, value, etag=None, last_modified=None):
+        """
+        Stores a value under key, replacing any previous entry.
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO blobs (hash, data, size) VALUES (?, ?, ?)", (digest, data, len(data)))
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, namespace, hash, etag, last_modified, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, namespace, digest, etag, last_modified, now, now),
+            )
+        self._count(namespace, "stores")
+        with self._lock:
+            self._writes += 1
+            due = self._writes % EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def touch(self, namespace, key):
+        """
+        Marks an entry fresh again, e.g. after the server answered 304 Not Modified.
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+        self._count(namespace, "revalidated")
+
+    def evict(self):
+        """
+        Deletes least recently used entries until the stored blobs fit in max_bytes.
+        Blobs are content-addressed and may be shared, so a blob's size only counts as freed
+        once the last entry referring to it is deleted.
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")  # Take the write lock so two evictions never interleave
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = conn.execute(
+                "SELECT e.key, e.hash, b.size FROM entries e JOIN blobs b ON b.hash = e.hash ORDER BY e.accessed_at"
+            ).fetchall()
+            refs = Counter(blob for _, blob, _ in rows)
+            total = conn.execute(  # Unreferenced blobs are removed below whatever happens
+                "SELECT COALESCE(SUM(size), 0) FROM blobs WHERE hash IN (SELECT hash FROM entries)"
+            ).fetchone()[0]
+            doomed = []
+            for key, blob, size in rows:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                refs[blob] -= 1
+                if not refs[blob]:
+                    total -= size
+            conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+            conn.execute("DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM entries)")
+
+    def stats(self):
+        """
+        Returns hit/miss counters per namespace for this process, plus the on-disk entry count and size.
+        """
+        entries, size = self._connect().execute(
+            "SELECT (SELECT COUNT(*) FROM entries), (SELECT COALESCE(SUM(size), 0) FROM blobs)"
+        ).fetchone()
+        with self._lock:
+            namespaces = {ns: dict(counters) for ns, counters in self._stats.items()}
+        return {"namespaces": namespaces, "entries": entries, "bytes": size}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Returns the process-wide Cache, or None when caching is disabled.
+    """
+    global _cache
+    if CACHE_DISABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = Cache()
+        return _cache
+
+
+def cached(namespace):
+    """
+    Decorator that caches a function's return value on disk, keyed by its normalized arguments.
+    Exceptions are not cached, and a broken cache falls back to calling the function.
+    The namespace must have a TTL in CACHE_TTL; this is checked when the function is decorated.
+    """
+    if namespace not in CACHE_TTL:
+        raise ValueError(f"No TTL configured for cache namespace {namespace!r}; add it to CACHE_TTL")
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            if cache is None:
+                return fn(*args, **kwargs)
+            key = make_key(namespace, *args, **kwargs)
+            try:
+                entry = cache.get(namespace, key)
+            except (sqlite3.Error, pickle.UnpicklingError):
+                entry = None
+            if entry is not None and entry.fresh:
+                return entry.value
+            value = fn(*args, **kwargs)
+            try:
+                cache.set(namespace, key, value)
+            except sqlite3.Error:
+                pass
+            return value
+        return wrapper
+    return decorator
@@ -11,6 +11,9 @@ def extract_sources_from_chunks(chunks):
         source = chunk.metadata.get('source') if hasattr(chunk, 'metadata') else None
         if source:
             sources.add(source)
+        # Near-duplicate chunks that were merged into this one keep their origins here
+        merged = chunk.metadata.get('sources', '') if hasattr(chunk, 'metadata') else ''
+        sources.update(s for s in merged.splitlines() if s)
     return list(sources)
 
 def render_citations(sources):
@@ -0,0 +1,120 @@
+# agent/config.py
+
+import os
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def env_int(name, default):
+    """
+    Reads an integer setting from the environment, falling back to a default.
+    """
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_float(name, default):
+    """
+    Reads a float setting from the environment, falling back to a default.
+    """
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def env_bool(name, default):
+    """
+    Reads a boolean setting from the environment ("1", "true", "yes" and "on" are true).
+    """
+    value = os.getenv(name)
+    return value.strip().lower() in ("1", "true", "yes", "on") if value not in (None, "") else default
+
+
+# --- Concurrent gathering ---
+MAX_WORKERS = env_int("AGENT_MAX_WORKERS", 8)  # Global cap on in-flight source calls
+SUBQ_WORKERS = env_int("AGENT_SUBQ_WORKERS", 4)  # Sub-questions processed at the same time
+SOURCE_TIMEOUT = env_float("AGENT_SOURCE_TIMEOUT", 30.0)  # Seconds before a single source call is abandoned
+
+# --- HTTP fetching ---
+FETCH_WORKERS = env_int("AGENT_FETCH_WORKERS", 8)  # Concurrent requests in a batch fetch
+FETCH_PER_HOST = env_int("AGENT_FETCH_PER_HOST", 4)  # Concurrent requests to any one host
+FETCH_TIMEOUT = env_float("AGENT_FETCH_TIMEOUT", 10.0)  # Connect/read timeout in seconds
+FETCH_MAX_BYTES = env_int("AGENT_FETCH_MAX_BYTES", 2 * 1024 * 1024)  # Bytes read from a page before it is cut off
+FETCH_RETRIES = env_int("AGENT_FETCH_RETRIES", 2)  # Retries after a failed connect or a 429/502/503/504 reply
+FETCH_BACKOFF = env_float("AGENT_FETCH_BACKOFF", 0.5)  # Retry backoff factor in seconds (doubles per attempt)
+EUTILS_URL = os.getenv("AGENT_EUTILS_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")  # PubMed E-utilities base URL
+
+# --- Academic sources ---
+PUBMED_BATCH = env_int("AGENT_PUBMED_BATCH", 200)  # PMIDs per efetch request
+NCBI_API_KEY = os.getenv("AGENT_NCBI_API_KEY", "")  # Raises the E-utilities rate limit from 3 to 10 requests per second
+ARXIV_URL = os.getenv("AGENT_ARXIV_URL", "https://export.arxiv.org/api/query")  # arXiv Atom API
+ARXIV_FULL_TEXT = env_bool("AGENT_ARXIV_FULL_TEXT", False)  # Download and extract the PDFs (ArxivLoader) instead of using the abstracts
+
+# --- On-disk cache ---
+CACHE_DISABLED = env_bool("AGENT_CACHE_DISABLED", False)
+CACHE_PATH = os.getenv("AGENT_CACHE_PATH", os.path.join(PACKAGE_DIR, ".cache", "fetch_cache.sqlite3"))
+CACHE_MAX_BYTES = env_int("AGENT_CACHE_MAX_BYTES", 512 * 1024 * 1024)  # LRU eviction starts above this size
+CACHE_TTL = {  # Seconds before an entry must be refetched (or revalidated, for web pages)
+    "web_search": env_int("AGENT_TTL_WEB_SEARCH", 24 * 3600),
+    "web_page": env_int("AGENT_TTL_WEB_PAGE", 7 * 24 * 3600),
+    "arxiv": env_int("AGENT_TTL_ARXIV", 30 * 24 * 3600),
+    "arxiv_pdf": env_int("AGENT_TTL_ARXIV_PDF", 30 * 24 * 3600),
+    "pubmed": env_int("AGENT_TTL_PUBMED", 7 * 24 * 3600),
+    "llm": env_int("AGENT_TTL_LLM", 30 * 24 * 3600),
+}
+
+# --- PDF library ---
+PDF_FOLDER = os.getenv("AGENT_PDF_FOLDER", "docs")
+PDF_INDEX_DIR = os.getenv("AGENT_PDF_INDEX_DIR", os.path.join(PACKAGE_DIR, ".cache", "pdf_index"))
+PDF_COLLECTION = os.getenv("AGENT_PDF_COLLECTION", "pdf_library")
+PDF_WORKERS = env_int("AGENT_PDF_WORKERS", os.cpu_count() or 1)  # Extraction processes; 1 extracts in-process
+PDF_PAGES_PER_TASK = env_int("AGENT_PDF_PAGES_PER_TASK", 8)  # Pages per unit of work, so large PDFs spread across workers
+PDF_MAX_PENDING = env_int("AGENT_PDF_MAX_PENDING", 16)  # Page ranges in flight before extraction waits for the consumer
+
+# --- Embeddings ---
+EMBED_MODEL = os.getenv("AGENT_EMBED_MODEL", "nomic-embed-text:latest")
+EMBED_MODEL_VERSION = os.getenv("AGENT_EMBED_MODEL_VERSION", "1")  # Bump to invalidate cached vectors for the same model name
+EMBED_CACHE_PATH = os.getenv("AGENT_EMBED_CACHE_PATH", os.path.join(PACKAGE_DIR, ".cache", "embeddings.sqlite3"))
+EMBED_BATCH_SIZE = env_int("AGENT_EMBED_BATCH_SIZE", 64)  # Texts per request to the embedding server
+EMBED_CONCURRENCY = env_int("AGENT_EMBED_CONCURRENCY", 2)  # Batches in flight at once
+
+# --- Near-duplicate filtering ---
+DEDUP_THRESHOLD = env_float("AGENT_DEDUP_THRESHOLD", 0.8)  # Estimated Jaccard similarity at which a chunk is dropped
+DEDUP_NUM_PERM = env_int("AGENT_DEDUP_NUM_PERM", 64)  # MinHash signature length
+DEDUP_SHINGLE = env_int("AGENT_DEDUP_SHINGLE", 5)  # Words per shingle
+
+# --- LLM clients ---
+LLM_MODEL = os.getenv("AGENT_LLM_MODEL", "mistral:latest")
+LLM_PARALLEL = env_int("AGENT_LLM_PARALLEL", 4)  # Match OLLAMA_NUM_PARALLEL on the server
+LLM_CACHE = env_bool("AGENT_LLM_CACHE", True)  # Reuse completions for identical deterministic prompts
+LLM_TEMPERATURE = env_float("AGENT_LLM_TEMPERATURE", None)  # Planner and synthesis; unset keeps Ollama's default sampling
+LLM_SEED = env_int("AGENT_LLM_SEED", None)  # A fixed seed (or temperature 0) makes completions reproducible, so they are cached
+
+# --- Retrieval ---
+RETRIEVAL_MODE = os.getenv("AGENT_RETRIEVAL_MODE", "hybrid")  # "hybrid" (BM25 + dense) or "dense"
+RETRIEVAL_FETCH_K = env_int("AGENT_RETRIEVAL_FETCH_K", 20)  # Candidates taken from each retriever before fusion
+RETRIEVAL_MMR = env_bool("AGENT_RETRIEVAL_MMR", False)  # Diversify the fused candidates with MMR
+RRF_K = env_int("AGENT_RRF_K", 60)  # Reciprocal-rank fusion damping constant
+BM25_K1 = env_float("AGENT_BM25_K1", 1.5)
+BM25_B = env_float("AGENT_BM25_B", 0.75)
+
+# --- Context packing ---
+CONTEXT_TOKEN_BUDGET = env_int("AGENT_CONTEXT_TOKENS", 1500)  # Max context tokens per synthesis prompt; 0 disables the limit
+CONTEXT_REDUNDANCY = env_float("AGENT_CONTEXT_REDUNDANCY", 0.7)  # Drop sentences whose word overlap (Jaccard) with a kept one reaches this
+CONTEXT_SELECT = env_bool("AGENT_CONTEXT_SELECT", False)  # Rank sentences by embedding similarity to the sub-question
+
+# --- Batch runs ---
+BATCH_WORKERS = env_int("AGENT_BATCH_WORKERS", 2)  # Queries researched at once by agent.batch
+
+# --- Tracing ---
+TRACE_ENABLED = env_bool("AGENT_TRACE", False)  # Record per-stage spans for each run in the app
+TRACE_DIR = os.getenv("AGENT_TRACE_DIR", os.path.join(PACKAGE_DIR, ".cache", "traces"))  # Where the app writes each run's trace
+
+# --- Start-up ---
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")  # Same variable the Ollama client reads
+WARMUP = env_bool("AGENT_WARMUP", False)  # Pre-load models, heavy imports and the PDF index when the app starts
+WARMUP_KEEP_ALIVE = os.getenv("AGENT_WARMUP_KEEP_ALIVE", "30m")  # How long Ollama keeps warmed-up models loaded
+
+# --- Vector index ---
+VECTOR_BACKEND = os.getenv("AGENT_VECTOR_BACKEND", "chroma")  # "chroma" or "numpy" (in-process, see numpy_store.py)
+IVF_THRESHOLD = env_int("AGENT_IVF_THRESHOLD", 200_000)  # numpy backend: switch from exact to IVF search above this many vectors
+IVF_NPROBE = env_int("AGENT_IVF_NPROBE", 8)  # numpy backend: inverted lists probed per IVF query
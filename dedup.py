@@ -0,0 +1,203 @@
+# agent/dedup.py
+
+import hashlib
+import re
+import threading
+
+from agent.config import DEDUP_NUM_PERM, DEDUP_SHINGLE, DEDUP_THRESHOLD
+
+BORROW_OFFSET = 1 << 62  # Added per step to values borrowed from a neighbouring bin during densification
+WORD_RE = re.compile(r"\w+")
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def shingles(text, size=DEDUP_SHINGLE):
+    """
+    Returns the set of 64-bit hashed word n-grams of a text (lower-cased, punctuation ignored).
+    """
+    words = WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {_hash64(" ".join(words))} if words else set()
+    return {_hash64(" ".join(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+
+def choose_bands(num_perm, threshold):
+    """
+    Picks (bands, rows) with bands * rows == num_perm whose LSH S-curve midpoint,
+    (1/bands) ** (1/rows), is closest to the threshold without going above it,
+    so candidate recall stays high and the signature check removes false positives.
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        midpoint = (1 / bands) ** (1 / rows)
+        if midpoint > threshold:
+            continue
+        if best is None or threshold - midpoint < best[0]:
+            best = (threshold - midpoint, bands, rows)
+    return (best[1], best[2]) if best else (num_perm, 1)
+
+
+class NearDuplicateFilter:
+    """
+    Streaming near-duplicate detector using MinHash signatures and an LSH band index.
+    Signatures use one-permutation hashing with densification: each shingle is hashed once
+    into one of `num_perm` bins, so the cost is linear in the text rather than in text x num_perm.
+    A chunk whose estimated Jaccard similarity to an earlier chunk reaches `threshold`
+    is dropped, and its source is merged into the kept chunk's metadata['sources'] (one per line).
+    Thread-safe, so one filter can be shared by every sub-question of a run. Kept chunks that are
+    already in a vector store (see stored) get their merged sources back through pop_updates.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, num_perm=DEDUP_NUM_PERM, shingle_size=DEDUP_SHINGLE):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        self._buckets = [{} for _ in range(self.bands)]
+        self._exact = {}
+        self._kept = []  # (chunk, signature)
+        self._index = {}  # id(chunk) -> position in _kept
+        self._ids = {}  # Position in _kept -> vector store id, once stored
+        self._dirty = set()  # Positions in _kept whose sources changed since they were written back
+        self._lock = threading.Lock()
+        self.seen = 0
+        self.removed = 0
+
+    def signature(self, text):
+        """
+        Returns the text's MinHash signature as a tuple of num_perm ints, or None if it has no words.
+        """
+        hashes = shingles(text, self.shingle_size)
+        if not hashes:
+            return None
+        n = self.num_perm
+        bins = [None] * n
+        for h in hashes:
+            i, value = h % n, h // n
+            if bins[i] is None or value < bins[i]:
+                bins[i] = value
+        signature = list(bins)
+        for i in range(n):
+            if bins[i] is None:  # Empty bin: borrow from the next filled bin to the right
+                step = 1
+                while bins[(i + step) % n] is None:
+                    step += 1
+                signature[i] = bins[(i + step) % n] + step * BORROW_OFFSET
+        return tuple(signature)
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows] for i in range(self.bands)]
+
+    @staticmethod
+    def _merge_source(kept, duplicate):
+        """
+        Records the duplicate's origin on the kept chunk, so citations still see every source.
+        The metadata dict is replaced rather than mutated, so a store copying it concurrently sees
+        either the old or the new one. Returns True if the sources changed.
+        """
+        source = getattr(duplicate, "metadata", {}).get("source")
+        if not source:
+            return False
+        metadata = kept.metadata
+        sources = metadata.get("sources", metadata.get("source") or "").splitlines()
+        if source not in sources:
+            sources.append(source)
+        merged = "\n".join(sources)  # A string, since vector stores only accept scalar metadata
+        if metadata.get("sources") == merged:
+            return False
+        kept.metadata = {**metadata, "sources": merged}
+        return True
+
+    def add(self, chunk):
+        """
+        Offers one chunk to the filter. Returns True if it is new and should be kept.
+        """
+        text = chunk.page_content
+        exact_key = hashlib.sha1(" ".join(text.split()).encode("utf-8")).digest()
+        signature = self.signature(text)  # Computed outside the lock; it is the expensive part
+        with self._lock:
+            self.seen += 1
+            match = self._exact.get(exact_key)
+            if match is None and signature is not None:
+                keys = self._band_keys(signature)
+                candidates = {idx for band, key in zip(self._buckets, keys) for idx in band.get(key, ())}
+                for idx in sorted(candidates):
+                    other = self._kept[idx][1]
+                    similarity = sum(x == y for x, y in zip(signature, other)) / self.num_perm
+                    if similarity >= self.threshold:
+                        match = idx
+                        break
+            if match is not None:
+                self.removed += 1
+                if self._merge_source(self._kept[match][0], chunk):
+                    self._dirty.add(match)
+                return False
+            idx = len(self._kept)
+            self._kept.append((chunk, signature))
+            self._index[id(chunk)] = idx
+            self._exact[exact_key] = idx
+            if signature is not None:
+                for band, key in zip(self._buckets, self._band_keys(signature)):
+                    band.setdefault(key, []).append(idx)
+            return True
+
+    def filter(self, chunks):
+        """
+        Yields the chunks that are not near-duplicates of anything seen so far.
+        """
+        for chunk in chunks:
+            if self.add(chunk):
+                yield chunk
+
+    def stored(self, chunks, ids):
+        """
+        Notes the vector store ids of kept chunks, so sources merged into them later can be written back.
+        """
+        with self._lock:
+            for chunk, doc_id in zip(chunks, ids):
+                idx = self._index.get(id(chunk))
+                if idx is not None:
+                    self._ids[idx] = doc_id
+
+    def pop_updates(self):
+        """
+        Returns (ids, chunks) for stored chunks whose sources changed since they were stored or last
+        returned here, for vectorstore.update_documents. Call it under the same lock as the writes.
+        """
+        with self._lock:
+            ready = sorted(idx for idx in self._dirty if idx in self._ids)
+            self._dirty.difference_update(ready)
+            return [self._ids[idx] for idx in ready], [self._kept[idx][0] for idx in ready]
+
+
+if __name__ == "__main__":
+    # Demo: syndicated copies with small edits collapse onto one chunk, with their sources merged.
+    import random
+    import time
+
+    class Chunk:
+        def __init__(self, text, source):
+            self.page_content = text
+            self.metadata = {"source": source}
+
+    rng = random.Random(0)
+    vocab = [f"term{n}" for n in range(5000)]
+    originals = [" ".join(rng.choice(vocab) for _ in range(90)) for _ in range(1000)]
+    chunks = [Chunk(text, f"https://site{n}.example/original") for n, text in enumerate(originals)]
+    for n in range(1000):  # Near-copies: one word changed
+        words = originals[n].split()
+        words[rng.randrange(len(words))] = "edited"
+        chunks.append(Chunk(" ".join(words), f"https://mirror{n}.example/copy"))
+
+    dedup = NearDuplicateFilter()
+    start = time.perf_counter()
+    kept = list(dedup.filter(chunks))
+    elapsed = time.perf_counter() - start
+    print(f"bands={dedup.bands} rows={dedup.rows}: kept {len(kept)} of {dedup.seen}, removed {dedup.removed} in {elapsed:.2f}s")
+    print(f"Merged sources on first chunk: {kept[0].metadata['sources'].splitlines()}")
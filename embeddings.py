@@ -0,0 +1,201 @@
+# agent/embeddings.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+from agent.config import (
+    EMBED_BATCH_SIZE,
+    EMBED_CACHE_PATH,
+    EMBED_CONCURRENCY,
+    EMBED_MODEL,
+    EMBED_MODEL_VERSION,
+)
+from agent.tracing import traced
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vectors (
+    model TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (model, text_hash)
+);
+"""
+LOOKUP_BATCH = 500  # Hashes per SELECT, below SQLite's bound-parameter limit
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class VectorStore:
+    """
+    Persistent text-hash -> float32 vector table in SQLite, partitioned by model tag.
+    One connection per thread, WAL mode, so concurrent sessions can read and write.
+    """
+
+    def __init__(self, path=EMBED_CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, model, hashes):
+        """
+        Returns {hash: vector} for the hashes that are stored under this model tag.
+        """
+        found = {}
+        conn = self._connect()
+        for start in range(0, len(hashes), LOOKUP_BATCH):
+            batch = hashes[start:start + LOOKUP_BATCH]
+            rows = conn.execute(
+                f"SELECT text_hash, vector FROM vectors WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                [model, *batch],
+            )
+            for h, blob in rows:
+                found[h] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, model, items):
+        """
+        Stores (hash, vector) pairs under a model tag.
+        """
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO vectors (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, h, array("f", vector).tobytes()) for h, vector in items],
+            )
+
+    def prune(self, keep_model):
+        """
+        Deletes vectors stored under any other model tag. Returns the number of rows removed.
+        """
+        conn = self._connect()
+        with conn:
+            return conn.execute("DELETE FROM vectors WHERE model != ?", (keep_model,)).rowcount
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings wrapper that embeds each distinct text once.
+    Texts are deduplicated within a call and against the persistent store; the rest are sent
+    to the wrapped embedder in batches of `batch_size`, up to `concurrency` batches at a time.
+    Vectors are tagged with `model_tag`, so switching model or version never returns stale vectors.
+    """
+
+    def __init__(self, embedder, model_tag, store=None, batch_size=EMBED_BATCH_SIZE, concurrency=EMBED_CONCURRENCY):
+        self.embedder = embedder
+        self.model_tag = model_tag
+        self.store = store if store is not None else VectorStore()
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._lock = threading.Lock()
+        self.stats = {"texts": 0, "hits": 0, "duplicates": 0, "embedded": 0, "batches": 0}
+
+    def _count(self, **increments):
+        with self._lock:
+            for field, n in increments.items():
+                self.stats[field] += n
+
+    def _embed_batch(self, texts):
+        vectors = self.embedder.embed_documents(texts)
+        self._count(batches=1, embedded=len(texts))
+        return vectors
+
+    @traced(items=len)
+    def embed_documents(self, texts):
+        """
+        Returns one vector per input text, in order.
+        """
+        hashes = [text_hash(t) for t in texts]
+        unique = {}
+        for h, t in zip(hashes, texts):
+            unique.setdefault(h, t)
+        vectors = self.store.get_many(self.model_tag, list(unique))
+        missing = [h for h in unique if h not in vectors]
+        self._count(texts=len(texts), duplicates=len(texts) - len(unique), hits=len(unique) - len(missing))
+
+        if missing:
+            batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+            if len(batches) == 1 or self.concurrency <= 1:
+                results = [self._embed_batch([unique[h] for h in batch]) for batch in batches]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches)), thread_name_prefix="embed") as pool:
+                    results = list(pool.map(lambda batch: self._embed_batch([unique[h] for h in batch]), batches))
+            new = [(h, v) for batch, batch_vectors in zip(batches, results) for h, v in zip(batch, batch_vectors)]
+            self.store.put_many(self.model_tag, new)
+            vectors.update(new)
+        return [vectors[h] for h in hashes]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings():
+    """
+    Returns the process-wide cached nomic embedder used by every vector store.
+    """
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            from langchain_ollama import OllamaEmbeddings
+            _embeddings = CachedEmbeddings(
+                OllamaEmbeddings(model=EMBED_MODEL),
+                model_tag=f"{EMBED_MODEL}@{EMBED_MODEL_VERSION}",
+            )
+        return _embeddings
+
+
+if __name__ == "__main__":
+    # Demo with a deterministic fake embedder that counts its calls.
+    import tempfile
+    import time
+
+    class CountingEmbedder(Embeddings):
+        def __init__(self, delay=0.05):
+            self.delay = delay
+            self.calls = 0
+            self.texts = 0
+
+        def embed_documents(self, texts):
+            time.sleep(self.delay)  # Simulated round trip to the embedding server
+            self.calls += 1
+            self.texts += len(texts)
+            return [[float(b) for b in hashlib.md5(t.encode()).digest()[:8]] for t in texts]
+
+        def embed_query(self, text):
+            return self.embed_documents([text])[0]
+
+    chunks = [f"Chunk {n % 300} about AI in radiology." for n in range(1000)]  # 300 distinct texts
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = CountingEmbedder()
+        cached = CachedEmbeddings(fake, "fake@1", store=VectorStore(os.path.join(tmp, "vectors.sqlite3")), batch_size=32, concurrency=4)
+        for run in (1, 2):
+            start = time.perf_counter()
+            vectors = cached.embed_documents(chunks)
+            print(f"Run {run}: {len(vectors)} vectors in {time.perf_counter() - start:.2f}s, "
+                  f"embedder calls so far: {fake.calls} ({fake.texts} texts)")
+        assert vectors == CountingEmbedder(0).embed_documents(chunks)
+        retagged = CachedEmbeddings(fake, "fake@2", store=cached.store, batch_size=32, concurrency=4)
+        retagged.embed_documents(chunks[:10])
+        print(f"After a model version change: {fake.texts} texts embedded; stats {cached.stats}")
@@ -0,0 +1,209 @@
+# agent/export.py
+
+import hashlib
+import html
+import io
+import re
+import threading
+from collections import OrderedDict
+
+from agent.tracing import traced
+
+MEMO_ENTRIES = 32  # Rendered exports kept in memory, least recently used dropped first
+
+
+def _lines(report):
+    """
+    Yields the report's lines without building a list of them.
+    """
+    start = 0
+    while True:
+        end = report.find("\n", start)
+        if end == -1:
+            yield report[start:]
+            return
+        yield report[start:end]
+        start = end + 1
+
+
+@traced("render_text", bytes=len)
+def render_text(report):
+    return report.encode("utf-8")
+
+
+@traced("render_pdf", bytes=len)
+def render_pdf(report):
+    """
+    Renders the report as a PDF entirely in memory; no temporary file is written.
+    The core PDF fonts only cover Latin-1, so other characters are replaced.
+    """
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    for line in _lines(report):
+        pdf.multi_cell(0, 10, line.encode("latin-1", "replace").decode("latin-1"))
+    data = pdf.output(dest="S")  # PyFPDF returns a Latin-1 str, fpdf2 a bytearray
+    return data.encode("latin-1") if isinstance(data, str) else bytes(data)
+
+
+@traced("render_docx", bytes=len)
+def render_docx(report):
+    """
+    Renders the report as a Word document: "# " and "## " lines become headings, other non-empty lines paragraphs.
+    """
+    from docx import Document
+
+    doc = Document()
+    for line in _lines(report):
+        if line.startswith('# '):
+            doc.add_heading(line.lstrip('# ').strip(), level=1)
+        elif line.startswith('## '):
+            doc.add_heading(line.lstrip('# ').strip(), level=2)
+        elif line.strip():
+            doc.add_paragraph(line)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+LIST_RE = re.compile(r"^\s*(?:[-*]|\d+[.)])\s+(.*)$")
+BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+LINK_RE = re.compile(r"(https?://[^\s<]+)")
+
+
+def _inline(text):
+    text = html.escape(text)
+    text = BOLD_RE.sub(r"<strong>\1</strong>", text)
+    return LINK_RE.sub(r'<a href="\1">\1</a>', text)
+
+
+def iter_html(report, title="Research Report"):
+    """
+    Yields a standalone HTML page for a Markdown report piece by piece: headings, lists, paragraphs, bold and links.
+    """
+    yield f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{html.escape(title)}</title></head><body>\n'
+    in_list = False
+    for line in _lines(report):
+        item = LIST_RE.match(line)
+        if in_list and not item:
+            yield "</ul>\n"
+            in_list = False
+        heading = HEADING_RE.match(line)
+        if heading:
+            level = len(heading.group(1))
+            yield f"<h{level}>{_inline(heading.group(2))}</h{level}>\n"
+        elif item:
+            if not in_list:
+                yield "<ul>\n"
+                in_list = True
+            yield f"<li>{_inline(item.group(1))}</li>\n"
+        elif line.strip():
+            yield f"<p>{_inline(line)}</p>\n"
+    if in_list:
+        yield "</ul>\n"
+    yield "</body></html>\n"
+
+
+@traced("render_html", bytes=len)
+def render_html(report):
+    buffer = io.StringIO()
+    for part in iter_html(report):
+        buffer.write(part)
+    return buffer.getvalue().encode("utf-8")
+
+
+FORMATS = {  # name -> (label, file extension, MIME type, renderer)
+    "md": ("Markdown", "md", "text/markdown", render_text),
+    "txt": ("Plain text", "txt", "text/plain", render_text),
+    "html": ("HTML", "html", "text/html", render_html),
+    "pdf": ("PDF", "pdf", "application/pdf", render_pdf),
+    "docx": ("Word", "docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", render_docx),
+}
+
+_memo = OrderedDict()  # (content hash, format) -> bytes
+_memo_lock = threading.Lock()
+_rendering = {}  # (content hash, format) -> lock held while that export is being rendered
+
+
+def render(report, fmt):
+    """
+    Returns the report exported in one of FORMATS as bytes, rendering it only on first request.
+    Results are memoized by (content hash, format), so reruns and other sessions exporting the same
+    report reuse them; concurrent requests for the same export wait for a single render.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    key = (hashlib.sha256(report.encode("utf-8")).hexdigest(), fmt)
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+        lock = _rendering.setdefault(key, threading.Lock())
+    with lock:
+        try:
+            with _memo_lock:
+                if key in _memo:  # Rendered by another caller while this one waited
+                    return _memo[key]
+            data = FORMATS[fmt][3](report)
+            with _memo_lock:
+                _memo[key] = data
+                while len(_memo) > MEMO_ENTRIES:
+                    _memo.popitem(last=False)
+            return data
+        finally:
+            with _memo_lock:  # Also when the renderer raised, so failed exports do not pile up here
+                if _rendering.get(key) is lock:
+                    del _rendering[key]
+
+
+def file_name(fmt, stem="research_report"):
+    return f"{stem}.{FORMATS[fmt][1]}"
+
+
+def mime_type(fmt):
+    return FORMATS[fmt][2]
+
+
+def write_report(path, parts):
+    """
+    Streams report parts (e.g. from pipeline.iter_report) to a file as they are produced.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for part in parts:
+            f.write(part)
+
+
+if __name__ == "__main__":
+    # Render timings per format for a large report, cold and memoized, and a concurrent-export check.
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    report = "# Final Report\n\n## Findings\n" + "".join(
+        f"### {n}. Sub-question {n}\n" + "AI improves diagnostic accuracy in radiology. " * 40 + "\n- https://example.org/" + f"{n}\n\n"
+        for n in range(200)
+    )
+    print(f"Report: {len(report) / 1024:.0f} KiB")
+    for fmt in FORMATS:
+        try:
+            start = time.perf_counter()
+            data = render(report, fmt)
+            cold = time.perf_counter() - start
+        except ImportError as e:
+            print(f"{fmt:<5} skipped ({e})")
+            continue
+        start = time.perf_counter()
+        render(report, fmt)
+        warm = time.perf_counter() - start
+        print(f"{fmt:<5} {len(data) / 1024:8.0f} KiB  first {cold * 1000:8.1f} ms  memoized {warm * 1000:6.3f} ms")
+
+    _memo.clear()
+    calls = []
+    original = FORMATS["html"]
+    FORMATS["html"] = original[:3] + (lambda text: calls.append(1) or original[3](text),)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        outputs = list(pool.map(lambda _: render(report, "html"), range(16)))
+    FORMATS["html"] = original
+    print(f"16 concurrent html exports: {len(calls)} render(s), identical output: {len(set(outputs)) == 1}")
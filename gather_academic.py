@@ -1,41 +1,284 @@
 # agent/gather_academic.py
 
-from langchain_community.document_loaders import ArxivLoader
-import requests
-from bs4 import BeautifulSoup
+import xml.etree.ElementTree as ET
 
-def search_arxiv(query, max_results=3):
+from agent.cache import cached
+from agent.config import ARXIV_FULL_TEXT, ARXIV_URL, EUTILS_URL, FETCH_TIMEOUT, NCBI_API_KEY, PUBMED_BATCH
+from agent.fetcher import get_session
+from agent.tracing import traced
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+ARXIV = "{http://arxiv.org/schemas/atom}"
+ARXIV_MAX_QUERY = 300  # Characters of the query sent to arXiv, as ArxivLoader does
+
+
+def _text(elem):
+    """
+    All text inside an element, including inline markup such as <i> or <sup>, or "" when it is missing.
+    """
+    return "".join(elem.itertext()).strip() if elem is not None else ""
+
+
+def _iter_elements(source, tag):
+    """
+    Streams the elements with a given tag from an XML file object or path, each one complete
+    when it is yielded. Earlier elements are freed as parsing goes, so memory stays bounded
+    by the largest single element rather than the document.
+    """
+    context = ET.iterparse(source, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event == "end" and elem.tag == tag:
+            yield elem
+            root.clear()  # Drop the finished element (and anything before it) from the tree
+
+
+def _eutils_params(**params):
+    if NCBI_API_KEY:
+        params["api_key"] = NCBI_API_KEY
+    return params
+
+
+def pubmed_record(article):
+    """
+    Turns a <PubmedArticle> element into a dict: pmid, doi, title, abstract, journal, year and url.
+    Structured abstracts keep every section, each prefixed with its label (e.g. "METHODS: ...").
+    """
+    citation = article.find("MedlineCitation")
+    info = citation.find("Article") if citation is not None else None
+    if info is None:
+        return None
+    pmid = _text(citation.find("PMID"))
+    sections = []
+    for part in info.iterfind("Abstract/AbstractText"):
+        text = _text(part)
+        if text:
+            label = part.get("Label")
+            sections.append(f"{label}: {text}" if label else text)
+    doi = next((_text(aid) for aid in article.iterfind("PubmedData/ArticleIdList/ArticleId") if aid.get("IdType") == "doi"), "")
+    if not doi:  # Records not yet in PubMed proper only carry it as an electronic location
+        doi = next((_text(loc) for loc in info.iterfind("ELocationID") if loc.get("EIdType") == "doi"), "")
+    pub_date = info.find("Journal/JournalIssue/PubDate")
+    year = (_text(pub_date.find("Year")) or _text(pub_date.find("MedlineDate"))[:4]) if pub_date is not None else ""
+    return {
+        'pmid': pmid,
+        'doi': doi,
+        'title': _text(info.find("ArticleTitle")),
+        'abstract': "\n".join(sections),
+        'journal': _text(info.find("Journal/Title")),
+        'year': year,
+        'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/" if pmid else "",
+    }
+
+
+def parse_pubmed_xml(source):
+    """
+    Streams records (see pubmed_record) from efetch XML, given as a file object or path.
+    """
+    for article in _iter_elements(source, "PubmedArticle"):
+        record = pubmed_record(article)
+        if record is not None:
+            yield record
+
+
+def search_pubmed_ids(query, max_results=3):
+    """
+    Runs an esearch for the query. Returns a list of PMIDs, best match first.
+    """
+    response = get_session().get(
+        f"{EUTILS_URL}/esearch.fcgi",
+        params=_eutils_params(db="pubmed", term=query, retmax=max_results, retmode="json"),  # Encoded by requests
+        timeout=FETCH_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()['esearchresult']['idlist']
+
+
+def iter_pubmed_records(ids, batch_size=PUBMED_BATCH):
+    """
+    Fetches PubMed records with one efetch per `batch_size` PMIDs and yields them as each
+    response is parsed off the socket, so a large batch is never held in memory whole.
+    """
+    session = get_session()  # Reuse pooled keep-alive connections to eutils
+    for start in range(0, len(ids), batch_size):
+        params = _eutils_params(db="pubmed", id=",".join(ids[start:start + batch_size]), retmode="xml")
+        with session.get(f"{EUTILS_URL}/efetch.fcgi", params=params, stream=True, timeout=FETCH_TIMEOUT) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True  # Undo any gzip transfer encoding while streaming
+            yield from parse_pubmed_xml(response.raw)
+
+
+@traced(items=len)
+@cached("pubmed")
+def get_pubmed_abstracts(query, max_results=3):
+    """
+    Search PubMed for abstracts. Returns a list of dicts with 'title' and 'abstract' (every section
+    of a structured abstract), plus 'pmid', 'doi', 'journal', 'year' and 'url'. Records without an abstract are skipped.
+    """
+    ids = search_pubmed_ids(query, max_results)
+    return [record for record in iter_pubmed_records(ids) if record['abstract']]
+
+
+def arxiv_document(entry):
+    """
+    Turns an Atom <entry> from the arXiv API into a Document holding the abstract.
+    Metadata uses ArxivLoader's keys (Title, Authors, Published) plus source (the abstract page), arxiv_id and doi.
+    """
+    from langchain_core.documents import Document
+
+    entry_id = _text(entry.find(f"{ATOM}id"))
+    return Document(
+        page_content=" ".join(_text(entry.find(f"{ATOM}summary")).split()),
+        metadata={
+            'source': entry_id,
+            'arxiv_id': entry_id.rsplit("/abs/", 1)[-1],
+            'Title': " ".join(_text(entry.find(f"{ATOM}title")).split()),
+            'Authors': ", ".join(_text(name) for name in entry.iterfind(f"{ATOM}author/{ATOM}name")),
+            'Published': _text(entry.find(f"{ATOM}published"))[:10],
+            'doi': _text(entry.find(f"{ARXIV}doi")),
+        },
+    )
+
+
+def parse_arxiv_atom(source):
+    """
+    Streams Documents (see arxiv_document) from an arXiv API Atom feed, given as a file object or path.
     """
-    Search arXiv for papers. Returns a list of LangChain Documents.
+    for entry in _iter_elements(source, f"{ATOM}entry"):
+        yield arxiv_document(entry)
+
+
+@cached("arxiv")
+def search_arxiv_abstracts(query, max_results=3):
+    """
+    Searches arXiv through its Atom API. Only titles, authors and abstracts are downloaded, no PDFs.
+    """
+    params = {"search_query": query[:ARXIV_MAX_QUERY], "start": 0, "max_results": max_results}
+    with get_session().get(ARXIV_URL, params=params, stream=True, timeout=FETCH_TIMEOUT) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        return list(parse_arxiv_atom(response.raw))
+
+
+@cached("arxiv_pdf")
+def search_arxiv_full_text(query, max_results=3):
     """
+    Searches arXiv and extracts the full text of each paper's PDF through ArxivLoader.
+    """
+    from langchain_community.document_loaders import ArxivLoader  # Slow to import, so only loaded when PDFs are wanted
+
     loader = ArxivLoader(query=query, load_max_docs=max_results)
     docs = loader.load()
     return docs
 
-def get_pubmed_abstracts(query, max_results=3):
+
+@traced(items=len)
+def search_arxiv(query, max_results=3, full_text=None):
     """
-    Search PubMed for abstracts. Returns a list of dicts: [{'title': ..., 'abstract': ...}, ...]
-    """
-    search_url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi?db=pubmed&retmax={max_results}&term={query}&retmode=json"
-    ids = requests.get(search_url).json()['esearchresult']['idlist']
-    fetch_url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?db=pubmed&id={','.join(ids)}&retmode=xml"
-    res = requests.get(fetch_url)
-    soup = BeautifulSoup(res.content, "xml")
-    abstracts = []
-    for article in soup.find_all('PubmedArticle'):
-        title = article.ArticleTitle.get_text() if article.ArticleTitle else ""
-        abstract = article.AbstractText.get_text() if article.AbstractText else ""
-        if abstract:
-            abstracts.append({'title': title, 'abstract': abstract})
-    return abstracts
-
-# # Example usage (for testing)
-# if __name__ == "__main__":
-#     print("Arxiv results:")
-#     for doc in search_arxiv("AI healthcare diagnostics", max_results=2):
-#         print(doc.page_content[:200], "\n---")
-#     print("\nPubMed abstracts:")
-#     for ab in get_pubmed_abstracts("AI healthcare diagnostics", max_results=2):
-#         print(ab['title'])
-#         print(ab['abstract'][:200])
-#         print("---")
+    Search arXiv for papers. Returns a list of LangChain Documents: the abstracts by default,
+    or the full PDF text when full_text (default: AGENT_ARXIV_FULL_TEXT) is set.
+    """
+    if full_text is None:
+        full_text = ARXIV_FULL_TEXT
+    if full_text:
+        return search_arxiv_full_text(query, max_results=max_results)
+    return search_arxiv_abstracts(query, max_results=max_results)
+
+
+if __name__ == "__main__":
+    # Parse time and peak Python memory of the streaming parsers against the whole-tree BeautifulSoup
+    # parse they replace, on synthetic fixtures or on recorded responses given with --pubmed-xml / --arxiv-xml.
+    import argparse
+    import io
+    import time
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(description="Benchmark the PubMed and arXiv XML parsers.")
+    parser.add_argument("--records", type=int, default=2000, help="Records in each synthetic fixture (default: %(default)s)")
+    parser.add_argument("--pubmed-xml", help="Recorded efetch response to parse instead of the synthetic one")
+    parser.add_argument("--arxiv-xml", help="Recorded arXiv API response to parse instead of the synthetic one")
+    args = parser.parse_args()
+
+    words = "deep learning improves diagnostic accuracy of chest radiographs in emergency care settings".split()
+
+    def sentence(seed, n):
+        return " ".join(words[(seed + i) % len(words)] for i in range(n)).capitalize() + "."
+
+    def pubmed_fixture(n):
+        articles = []
+        for i in range(n):
+            pmid = 30_000_000 + i
+            sections = "".join(
+                f'<AbstractText Label="{label}" NlmCategory="{label}">{sentence(i + j, 60)} <i>p</i> &lt; 0.05.</AbstractText>'
+                for j, label in enumerate(("BACKGROUND", "METHODS", "RESULTS", "CONCLUSIONS"))
+            )
+            references = "".join(
+                f'<Reference><Citation>Ref {r}</Citation><ArticleIdList><ArticleId IdType="doi">10.9999/ref.{r}</ArticleId>'
+                f'<ArticleId IdType="pubmed">{pmid - r - 1}</ArticleId></ArticleIdList></Reference>'
+                for r in range(25)
+            )
+            articles.append(
+                f'<PubmedArticle><MedlineCitation Status="MEDLINE" Owner="NLM"><PMID Version="1">{pmid}</PMID>'
+                f'<Article PubModel="Print-Electronic"><Journal><JournalIssue CitedMedium="Internet"><PubDate><Year>2021</Year>'
+                f'</PubDate></JournalIssue><Title>Radiology</Title></Journal><ArticleTitle>{sentence(i, 12)}</ArticleTitle>'
+                f'<ELocationID EIdType="doi" ValidYN="Y">10.1148/radiol.{pmid}</ELocationID><Abstract>{sections}</Abstract>'
+                f'<AuthorList>{"".join(f"<Author><LastName>Author{a}</LastName><Initials>A</Initials></Author>" for a in range(8))}</AuthorList>'
+                f'</Article><CommentsCorrectionsList><CommentsCorrections RefType="CommentIn"><PMID Version="1">{pmid + 1}</PMID>'
+                f'</CommentsCorrections></CommentsCorrectionsList></MedlineCitation><PubmedData><ArticleIdList>'
+                f'<ArticleId IdType="pubmed">{pmid}</ArticleId><ArticleId IdType="doi">10.1148/radiol.{pmid}</ArticleId>'
+                f'</ArticleIdList><ReferenceList>{references}</ReferenceList></PubmedData></PubmedArticle>'
+            )
+        return ('<?xml version="1.0" ?>\n<PubmedArticleSet>' + "".join(articles) + "</PubmedArticleSet>").encode("utf-8")
+
+    def arxiv_fixture(n):
+        entries = "".join(
+            f'<entry><id>http://arxiv.org/abs/2101.{i:05d}v1</id><published>2021-01-{i % 28 + 1:02d}T00:00:00Z</published>'
+            f'<title>{sentence(i, 10)}\n  continued</title><summary>  {sentence(i, 200)}\n</summary>'
+            f'{"".join(f"<author><name>Author {a}</name></author>" for a in range(5))}<arxiv:doi>10.48550/arXiv.2101.{i:05d}</arxiv:doi>'
+            f'<link href="http://arxiv.org/abs/2101.{i:05d}v1" rel="alternate" type="text/html"/><arxiv:primary_category term="cs.CV"/></entry>'
+            for i in range(n)
+        )
+        return ('<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom" '
+                f'xmlns:arxiv="http://arxiv.org/schemas/atom">{entries}</feed>').encode("utf-8")
+
+    def measure(label, fn, data):
+        start = time.perf_counter()
+        count = fn(data)
+        seconds = time.perf_counter() - start
+        tracemalloc.start()  # A second pass for memory, as tracing allocations slows parsing down several times
+        fn(data)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  {label:<28} {count:6d} records  {seconds * 1000:8.1f} ms  peak {peak / 2**20:7.1f} MiB")
+
+    def soup_pubmed(data):  # The previous parser: whole tree, first AbstractText only
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(data, "xml")
+        return sum(1 for article in soup.find_all('PubmedArticle') if article.AbstractText)
+
+    def soup_arxiv(data):
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(data, "xml")
+        return len(soup.find_all('entry'))
+
+    pubmed = open(args.pubmed_xml, "rb").read() if args.pubmed_xml else pubmed_fixture(args.records)
+    arxiv = open(args.arxiv_xml, "rb").read() if args.arxiv_xml else arxiv_fixture(args.records)
+
+    print(f"PubMed efetch fixture: {len(pubmed) / 2**20:.1f} MiB")
+    measure("streaming iterparse", lambda data: sum(1 for _ in parse_pubmed_xml(io.BytesIO(data))), pubmed)
+    try:
+        measure("BeautifulSoup (xml)", soup_pubmed, pubmed)
+    except Exception as e:  # bs4 or lxml not installed
+        print(f"  BeautifulSoup (xml) skipped: {e}")
+    print(f"arXiv Atom fixture: {len(arxiv) / 2**20:.1f} MiB")
+    measure("streaming iterparse", lambda data: sum(1 for _ in parse_arxiv_atom(io.BytesIO(data))), arxiv)
+    try:
+        measure("BeautifulSoup (xml)", soup_arxiv, arxiv)
+    except Exception as e:
+        print(f"  BeautifulSoup (xml) skipped: {e}")
+
+    record = next(parse_pubmed_xml(io.BytesIO(pubmed)))
+    print(f"\nFirst PubMed record: PMID {record['pmid']}, DOI {record['doi']}, {record['year']} {record['journal']}")
+    print(f"  {record['title']}\n  {record['abstract'][:300]}...")
+    doc = next(parse_arxiv_atom(io.BytesIO(arxiv)))
+    print(f"First arXiv entry: {doc.metadata}")
@@ -1,10 +1,10 @@
 # agent/gather_docs.py
 
-from langchain_community.document_loaders import PyMuPDFLoader, TextLoader
-from bs4 import BeautifulSoup
-import requests
 import urllib3
 
+from agent.fetcher import cached_fetch, extract_paragraphs, fetch_many
+from agent.tracing import span, traced
+
 # Suppress insecure HTTPS warnings (since we use verify=False)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -14,6 +14,8 @@ def extract_pdf(pdf_path):
     Extracts text from a PDF file using PyMuPDFLoader.
     Returns a list of LangChain Documents (usually one per page).
     """
+    from langchain_community.document_loaders import PyMuPDFLoader  # Slow to import, so only loaded when needed
+
     loader = PyMuPDFLoader(pdf_path)
     docs = loader.load()
     return docs
@@ -24,35 +26,36 @@ def extract_text_file(path):
     Loads a plain text file.
     Returns a list with a single LangChain Document.
     """
+    from langchain_community.document_loaders import TextLoader
+
     loader = TextLoader(path)
     docs = loader.load()
     return docs
 
 
+@traced(bytes=lambda text: len(text or ""))
 def extract_web_page(url):
     """
-    Scrapes main text content from a web page using requests and BeautifulSoup.
-    Returns a string (all paragraphs joined).
+    Scrapes main text content from a web page through the shared connection pool and on-disk cache.
+    Returns a string (all paragraphs joined), or None if the page could not be fetched;
+    a failure is recorded as the error of its "fetch_web_page" span when tracing is active.
     """
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0 Safari/537.36"
-        )
-    }
     try:
-        print(f"Fetching: {url}")
-        response = requests.get(url, headers=headers, verify=False, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, "html.parser")
-        paragraphs = [p.get_text() for p in soup.find_all("p")]
-        return "\n".join(paragraphs)
-    except Exception as e:
-        print(f"Error scraping {url}: {e}")
+        with span("fetch_web_page"):
+            return extract_paragraphs(cached_fetch(url))
+    except Exception:
         return None
 
 
+@traced(items=len)
+def extract_web_pages(urls):
+    """
+    Scrapes several web pages at once, bounded by the global and per-host fetch limits.
+    Returns a list of strings (or None for failures) in the same order as `urls`.
+    """
+    return fetch_many(urls, fn=extract_web_page)
+
+
 # # Example usage (for testing only)
 # if __name__ == "__main__":
 #     url = "https://en.wikipedia.org/wiki/Artificial_intelligence_in_healthcare"
@@ -1,6 +1,11 @@
-from ddgs import DDGS
+from agent.cache import cached
+from agent.tracing import traced
 
+@traced(items=len)
+@cached("web_search")
 def search_web(query, max_results=3):
+    from ddgs import DDGS
+
     results = []
     with DDGS() as ddgs:
         for r in ddgs.text(query, max_results=max_results):
@@ -0,0 +1,225 @@
+# agent/ingest.py
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+from agent.chunker import iter_chunks
+from agent.config import PDF_COLLECTION, PDF_FOLDER, PDF_INDEX_DIR
+from agent.pdf_pipeline import iter_pdf_pages, open_pool
+from agent.tracing import traced
+from agent.vectorstore import get_vectorstore
+
+MANIFEST_NAME = "manifest.json"
+HASH_BLOCK = 1024 * 1024  # Bytes hashed at a time
+ADD_BATCH = 256  # Chunks embedded and added per vector store call
+
+_sync_lock = threading.Lock()  # One sync per process at a time; Streamlit sessions share the index
+_indexes = {}  # (index_dir, collection_name) -> open vector store
+_indexes_lock = threading.Lock()
+
+
+def file_sha256(path):
+    """
+    Returns the SHA-256 hex digest of a file's contents, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_ids(path, sha256, count):
+    """
+    Deterministic vector ids for a file's chunks, so they can be deleted when the file changes.
+    """
+    prefix = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()[:12]
+    return [f"{prefix}:{sha256[:16]}:{i}" for i in range(count)]
+
+
+def load_manifest(index_dir=PDF_INDEX_DIR):
+    """
+    Reads the ingestion manifest: {path: {'size', 'mtime', 'sha256', 'chunks'}}.
+    """
+    path = os.path.join(index_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("files", {})
+
+
+def save_manifest(files, index_dir=PDF_INDEX_DIR):
+    """
+    Writes the manifest atomically, so a crash mid-write never leaves a truncated file.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, MANIFEST_NAME)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "files": files}, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def scan_folder(folder):
+    """
+    Lists the PDFs in a folder with their size and mtime.
+    Returns {absolute_path: (size, mtime)}.
+    """
+    found = {}
+    if not os.path.isdir(folder):
+        return found
+    for filename in sorted(os.listdir(folder)):
+        if filename.lower().endswith(".pdf"):
+            path = os.path.abspath(os.path.join(folder, filename))
+            stat = os.stat(path)
+            found[path] = (stat.st_size, stat.st_mtime)
+    return found
+
+
+def get_pdf_index(index_dir=PDF_INDEX_DIR, collection_name=PDF_COLLECTION):
+    """
+    Returns the persistent vector store that holds the embedded PDF library.
+    It is opened once per process and shared, so reruns and sessions do not reload it.
+    """
+    key = (os.path.abspath(index_dir), collection_name)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = get_vectorstore(collection_name=collection_name, persist_directory=index_dir)
+        return _indexes[key]
+
+
+def get_pdf_library(index_dir=PDF_INDEX_DIR, collection_name=PDF_COLLECTION):
+    """
+    Returns the PDF index for retrieval when a library has been ingested into it, else None.
+    """
+    return get_pdf_index(index_dir, collection_name) if load_manifest(index_dir) else None
+
+
+@traced()
+def add_pdfs(files, vectorstore, batch_size=ADD_BATCH, pool=None):
+    """
+    Streams PDFs through page extraction and chunking into the vector store, in batches.
+    `files` is a list of (path, sha256); all of them are fed to one extraction pool, so workers move on
+    to the next file while the tail of the previous one is still being embedded.
+    Yields (path, sha256, chunks_added) as each file is fully stored, in the order given.
+    """
+    pending = iter(files)
+    path, sha256 = None, None
+    count = 0
+    batch = []
+
+    def flush():
+        nonlocal count, batch
+        if batch:
+            vectorstore.add_documents(batch, ids=chunk_ids(path, sha256, count + len(batch))[count:])
+            count += len(batch)
+            batch = []
+
+    for chunk in iter_chunks(iter_pdf_pages([p for p, _ in files], pool=pool)):
+        while chunk.metadata["source"] != path:  # Pages arrive in file order; files without text yield no chunks
+            if path is not None:
+                flush()
+                yield path, sha256, count
+            path, sha256 = next(pending)
+            count = 0
+        if not (chunk.page_content and chunk.page_content.strip()):
+            continue
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            flush()
+    if path is not None:
+        flush()
+        yield path, sha256, count
+    for path, sha256 in pending:
+        yield path, sha256, 0
+
+
+@traced(items=int)
+def add_pdf(path, sha256, vectorstore, batch_size=ADD_BATCH, pool=None):
+    """
+    Streams one PDF into the vector store. Returns the number of chunks added.
+    """
+    return sum(count for _, _, count in add_pdfs([(path, sha256)], vectorstore, batch_size, pool))
+
+
+@traced(items=lambda summary: summary["chunks"])
+def sync_folder(folder=PDF_FOLDER, vectorstore=None, index_dir=PDF_INDEX_DIR, log=print):
+    """
+    Brings the persistent PDF index in line with a folder.
+    Only added or changed files are extracted, chunked and embedded; vectors of deleted files are removed.
+    A file whose size and mtime are unchanged is skipped without reading it. Changed files share one
+    extraction pool for the whole sync.
+    Returns a summary dict of counts: added, updated, removed, unchanged, chunks.
+    """
+    with _sync_lock:
+        if vectorstore is None:
+            vectorstore = get_pdf_index(index_dir)
+        manifest = load_manifest(index_dir)
+        found = scan_folder(folder)
+        summary = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "chunks": 0}
+
+        for path in sorted(set(manifest) - set(found)):  # Files deleted from the folder
+            entry = manifest.pop(path)
+            if entry["chunks"]:  # Chroma rejects an empty id list
+                vectorstore.delete(ids=chunk_ids(path, entry["sha256"], entry["chunks"]))
+            summary["removed"] += 1
+            log(f"Removed: {path}")
+            save_manifest(manifest, index_dir)
+
+        changed = []
+        for path, (size, mtime) in found.items():
+            entry = manifest.get(path)
+            if entry and entry["size"] == size and entry["mtime"] == mtime:
+                summary["unchanged"] += 1
+                continue
+            sha256 = file_sha256(path)
+            if entry and entry["sha256"] == sha256:  # Touched but identical: only refresh the stat fields
+                entry.update(size=size, mtime=mtime)
+                summary["unchanged"] += 1
+                save_manifest(manifest, index_dir)
+                continue
+            if entry and entry["chunks"]:
+                vectorstore.delete(ids=chunk_ids(path, entry["sha256"], entry["chunks"]))
+            changed.append((path, sha256))
+        if not changed:
+            return summary
+
+        pool = open_pool()
+        try:
+            for path, sha256, count in add_pdfs(changed, vectorstore, pool=pool):
+                size, mtime = found[path]
+                entry = manifest.get(path)
+                manifest[path] = {"size": size, "mtime": mtime, "sha256": sha256, "chunks": count}
+                save_manifest(manifest, index_dir)  # Saved per file, so an interrupted sync resumes where it stopped
+                summary["updated" if entry else "added"] += 1
+                summary["chunks"] += count
+                log(f"{'Updated' if entry else 'Added'}: {path} ({count} chunks)")
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-ingest a folder of PDFs into the persistent vector index.")
+    parser.add_argument("folder", nargs="?", default=PDF_FOLDER, help="Folder of PDFs (default: %(default)s)")
+    parser.add_argument("--index-dir", default=PDF_INDEX_DIR, help="Where the index and manifest live (default: %(default)s)")
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="Keep running and re-sync every SECONDS")
+    args = parser.parse_args(argv)
+
+    vectorstore = get_pdf_index(args.index_dir)
+    while True:
+        start = time.perf_counter()
+        summary = sync_folder(args.folder, vectorstore, args.index_dir)
+        print(f"Synced {args.folder} in {time.perf_counter() - start:.1f}s: {summary}")
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
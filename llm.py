@@ -0,0 +1,148 @@
+# agent/llm.py
+
+import hashlib
+import threading
+import time
+
+from agent.cache import get_cache, make_key
+from agent.config import LLM_CACHE, LLM_MODEL, LLM_PARALLEL, LLM_SEED, LLM_TEMPERATURE
+
+_clients = {}
+_clients_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(LLM_PARALLEL)  # Shared by every client: matches the server's parallel slots
+
+
+class LLMClient:
+    """
+    Process-wide wrapper around one Ollama model configuration.
+    The underlying client (and its HTTP connection pool) is created once and reused,
+    at most LLM_PARALLEL generations run at a time across all clients, and completed
+    responses are cached on disk keyed by (model, params, prompt hash).
+
+    Only clients with an explicit temperature of 0 or a fixed seed are cached: without
+    either, Ollama samples at its own non-zero default temperature. Passing use_cache=False
+    to a call bypasses the cache too.
+    """
+
+    def __init__(self, model, **params):
+        self.model = model
+        self.params = params
+        self._llm = None
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "cache_hits": 0, "generated": 0, "latency_total": 0.0, "ttft_total": 0.0}
+
+    @property
+    def llm(self):
+        with self._lock:
+            if self._llm is None:
+                from langchain_ollama import OllamaLLM  # Imported on first use: it pulls in most of langchain_core
+                self._llm = OllamaLLM(model=self.model, **self.params)
+            return self._llm
+
+    @property
+    def deterministic(self):
+        return self.params.get("temperature") == 0 or self.params.get("seed") is not None
+
+    def _key(self, prompt):
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return make_key("llm", self.model, self.params, prompt_hash)
+
+    def _record(self, **increments):
+        with self._lock:
+            for field, n in increments.items():
+                self.stats[field] += n
+
+    def stream(self, prompt, use_cache=True):
+        """
+        Yields the completion for a prompt token by token.
+        A cached completion is yielded as a single chunk without touching the server.
+        If the consumer stops early (e.g. islice over the planner's list), the rest of the
+        completion is still read when the generator closes, so it is counted and cached whole.
+        """
+        cache = get_cache() if LLM_CACHE and use_cache and self.deterministic else None
+        key = self._key(prompt) if cache is not None else None
+        start = time.perf_counter()
+        if cache is not None:
+            entry = cache.get("llm", key)
+            if entry is not None and entry.fresh:
+                self._record(calls=1, cache_hits=1, latency_total=time.perf_counter() - start)
+                yield entry.value
+                return
+
+        parts = []
+        first = None
+        finished = False
+        with _slots:
+            tokens = iter(self.llm.stream(prompt))
+            try:
+                for token in tokens:
+                    if first is None:
+                        first = time.perf_counter()
+                    parts.append(token)
+                    yield token
+                finished = True
+            except GeneratorExit:
+                finished = _drain(tokens, parts)
+                raise
+            finally:
+                if finished:
+                    self._record(
+                        calls=1, generated=1,
+                        latency_total=time.perf_counter() - start,
+                        ttft_total=(first - start) if first is not None else 0.0,
+                    )
+                    if cache is not None:
+                        cache.set("llm", key, "".join(parts))
+
+    def invoke(self, prompt, use_cache=True):
+        return "".join(self.stream(prompt, use_cache=use_cache))
+
+
+def _drain(tokens, parts):
+    """
+    Reads the rest of an abandoned stream into parts. Returns False if the stream failed,
+    since closing the generator must not raise.
+    """
+    try:
+        parts.extend(tokens)
+        return True
+    except Exception:
+        return False
+
+
+def get_llm(model, **params):
+    """
+    Returns the shared LLMClient for a model and parameter set, creating it on first use.
+    """
+    key = (model, tuple(sorted(params.items())))
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = LLMClient(model, **params)
+        return _clients[key]
+
+
+def get_default_llm():
+    """
+    Returns the client the planner and synthesis use: LLM_MODEL at Ollama's default sampling.
+    Setting AGENT_LLM_TEMPERATURE=0 or AGENT_LLM_SEED opts in to reproducible, cached completions.
+    """
+    params = {"temperature": LLM_TEMPERATURE, "seed": LLM_SEED}
+    return get_llm(LLM_MODEL, **{name: value for name, value in params.items() if value is not None})
+
+
+def llm_stats():
+    """
+    Returns per-client call, cache-hit and latency figures, plus the on-disk cache counters for "llm".
+    """
+    with _clients_lock:
+        clients = list(_clients.values())
+    out = {"clients": {}}
+    for client in clients:
+        stats = dict(client.stats)
+        generated = stats["generated"]
+        stats["mean_latency"] = stats["latency_total"] / stats["calls"] if stats["calls"] else None
+        stats["mean_ttft"] = stats["ttft_total"] / generated if generated else None
+        out["clients"][f"{client.model} {client.params or ''}".strip()] = stats
+    cache = get_cache()
+    out["cache"] = cache.stats()["namespaces"].get("llm", {}) if cache is not None else {}
+    return out
@@ -0,0 +1,351 @@
+# agent/numpy_store.py
+
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+
+from agent.config import IVF_NPROBE, IVF_THRESHOLD
+
+VECTORS_NAME = "vectors.npy"
+LOG_NAME = "log.jsonl"
+MIN_CAPACITY = 1024
+KMEANS_ITERATIONS = 10
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores, k):
+    """
+    Indices of the k largest scores, best first, using argpartition instead of a full sort.
+    """
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+class NumpyVectorStore:
+    """
+    In-process vector index: cosine similarity over a contiguous float32 matrix.
+
+    Implements the parts of the Chroma interface this project uses (add_documents, update_documents, delete,
+    similarity_search, similarity_search_by_vector, embeddings), plus batched multi-query search.
+    The matrix grows by doubling. With a persist_directory it lives in a memory-mapped .npy file,
+    and documents are kept in an append-only JSON-lines log, so adding a batch never rewrites the store.
+    Above IVF_THRESHOLD live vectors, searches use an inverted-file (coarse k-means) index probing
+    IVF_NPROBE lists; vectors added after training are searched exhaustively until the next retrain.
+    """
+
+    def __init__(self, embedding_function, persist_directory=None, ivf_threshold=IVF_THRESHOLD, nprobe=IVF_NPROBE):
+        self._embeddings = embedding_function
+        self.persist_directory = persist_directory
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self._vectors = None  # (capacity, dim) float32, rows are unit length
+        self._count = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self.ids, self.texts, self.metadatas = [], [], []
+        self._rows = {}  # id -> row
+        self._by_source = {}  # source -> set of rows, for metadata filtering
+        self._ivf = None  # (centroids, [row arrays], trained_count)
+        if persist_directory:
+            os.makedirs(persist_directory, exist_ok=True)
+            self._load()
+
+    @property
+    def embeddings(self):
+        return self._embeddings
+
+    def __len__(self):
+        return int(self._alive[:self._count].sum())
+
+    # --- Storage ---
+
+    def _path(self, name):
+        return os.path.join(self.persist_directory, name)
+
+    def _allocate(self, capacity, dim):
+        if not self.persist_directory:
+            return np.empty((capacity, dim), dtype=np.float32)
+        tmp = self._path(VECTORS_NAME + ".tmp")
+        vectors = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(capacity, dim))
+        if self._vectors is not None:
+            vectors[:self._count] = self._vectors[:self._count]
+        vectors.flush()
+        del vectors
+        os.replace(tmp, self._path(VECTORS_NAME))
+        return np.load(self._path(VECTORS_NAME), mmap_mode="r+")
+
+    def _reserve(self, extra, dim):
+        """
+        Makes room for `extra` more rows, doubling capacity so appends stay amortized O(1).
+        """
+        needed = self._count + extra
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(MIN_CAPACITY, capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+        vectors = self._allocate(new_capacity, dim)
+        if not self.persist_directory and self._vectors is not None:
+            vectors[:self._count] = self._vectors[:self._count]
+        self._vectors = vectors
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:self._count] = self._alive[:self._count]
+        self._alive = alive
+
+    def _log(self, records):
+        if not self.persist_directory:
+            return
+        with open(self._path(LOG_NAME), "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    def _load(self):
+        log_path = self._path(LOG_NAME)
+        if not os.path.exists(log_path) or not os.path.exists(self._path(VECTORS_NAME)):
+            return
+        self._vectors = np.load(self._path(VECTORS_NAME), mmap_mode="r+")
+        self._alive = np.zeros(self._vectors.shape[0], dtype=bool)
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record["op"] == "add":
+                    self._remember(record["id"], record["text"], record["metadata"])
+                else:
+                    self._forget(record["ids"])
+
+    def _remember(self, doc_id, text, metadata):
+        row = self._count
+        if doc_id in self._rows:
+            self._forget([doc_id])
+        self.ids.append(doc_id)
+        self.texts.append(text)
+        self.metadatas.append(metadata)
+        self._rows[doc_id] = row
+        self._alive[row] = True
+        self._by_source.setdefault(metadata.get("source"), set()).add(row)
+        self._count += 1
+        return row
+
+    def _forget(self, ids):
+        for doc_id in ids:
+            row = self._rows.pop(doc_id, None)
+            if row is not None:
+                self._alive[row] = False
+                self._by_source.get(self.metadatas[row].get("source"), set()).discard(row)
+
+    # --- Chroma-compatible API ---
+
+    def add_documents(self, documents, ids=None):
+        documents = list(documents)
+        if not documents:
+            return []
+        ids = list(ids) if ids is not None else [uuid.uuid4().hex for _ in documents]
+        vectors = _normalize(self._embeddings.embed_documents([d.page_content for d in documents]))
+        with self._lock:
+            self._append(ids, documents, vectors)
+        return ids
+
+    def _append(self, ids, documents, vectors):
+        self._reserve(len(documents), vectors.shape[1])
+        start = self._count
+        self._vectors[start:start + len(documents)] = vectors
+        if self.persist_directory:
+            self._vectors.flush()  # Rows first, so the log never points at unwritten vectors
+        records = []
+        for doc_id, doc in zip(ids, documents):
+            metadata = dict(doc.metadata or {})
+            self._remember(doc_id, doc.page_content, metadata)
+            records.append({"op": "add", "id": doc_id, "text": doc.page_content, "metadata": metadata})
+        self._log(records)
+
+    def update_documents(self, ids, documents):
+        """
+        Replaces the text and metadata stored under existing ids.
+        Rows whose text is unchanged keep their stored vector, so a metadata-only update (e.g. sources
+        merged by dedup) never calls the embedder; changed or unknown ids are re-embedded.
+        """
+        ids, documents = list(ids), list(documents)
+        with self._lock:
+            same = [n for n, (doc_id, doc) in enumerate(zip(ids, documents))
+                    if doc_id in self._rows and self.texts[self._rows[doc_id]] == doc.page_content]
+            if same:
+                vectors = np.array(self._vectors[[self._rows[ids[n]] for n in same]])  # Copied before _reserve can reallocate
+                self._append([ids[n] for n in same], [documents[n] for n in same], vectors)
+        changed = sorted(set(range(len(ids))) - set(same))
+        self.add_documents([documents[n] for n in changed], ids=[ids[n] for n in changed])
+
+    def delete(self, ids=None):
+        if not ids:
+            return
+        with self._lock:
+            self._forget(ids)
+            self._log([{"op": "delete", "ids": list(ids)}])
+
+    def similarity_search(self, query, k=4, filter=None):
+        return self.similarity_search_by_vector(self._embeddings.embed_query(query), k=k, filter=filter)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None):
+        return self.similarity_search_by_vectors([embedding], k=k, filter=filter)[0]
+
+    def similarity_search_many(self, queries, k=4, filter=None):
+        """
+        Batched top-k for several query strings: one embedding call and one matrix product.
+        """
+        return self.similarity_search_by_vectors(self._embeddings.embed_documents(list(queries)), k=k, filter=filter)
+
+    def similarity_search_by_vectors(self, embeddings, k=4, filter=None):
+        """
+        Batched top-k for several query vectors; returns one list of Documents per query.
+        `filter` matches on metadata source: {"source": value} or {"source": {"$in": [values]}}.
+        """
+        with self._lock:
+            hits = self._search(_normalize(embeddings), k, self._filter_rows(filter))
+            return [
+                [Document(page_content=self.texts[row], metadata=dict(self.metadatas[row])) for row in rows]
+                for rows in hits
+            ]
+
+    # --- Search ---
+
+    def _filter_rows(self, filter):
+        if not filter:
+            return None
+        unsupported = set(filter) - {"source"}
+        if unsupported:
+            raise ValueError(f"NumpyVectorStore can only filter on 'source', not {sorted(unsupported)}")
+        wanted = filter["source"]
+        values = wanted["$in"] if isinstance(wanted, dict) else [wanted]
+        rows = set()
+        for value in values:
+            rows |= self._by_source.get(value, set())
+        return np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+
+    def _search(self, queries, k, allowed):
+        n = self._count
+        if n == 0 or not self._alive[:n].any():
+            return [[] for _ in queries]
+        if allowed is None:
+            if self._use_ivf():
+                return [self._search_ivf(q, k) for q in queries]
+            alive = self._alive[:n]
+            scores = self._vectors[:n] @ queries.T  # One (n, m) product for the whole batch, no row copies
+            scores[~alive] = -np.inf
+            k = min(k, int(alive.sum()))
+            return [_top_k(scores[:, j], k).tolist() for j in range(queries.shape[0])]
+        candidates = allowed[self._alive[allowed]]
+        scores = self._vectors[candidates] @ queries.T
+        return [candidates[_top_k(scores[:, j], k)].tolist() for j in range(queries.shape[0])]
+
+    def _use_ivf(self):
+        live = len(self)
+        if live < self.ivf_threshold:
+            return False
+        if self._ivf is None or self._count > 2 * self._ivf[2]:
+            self._train_ivf()
+        return True
+
+    def _train_ivf(self):
+        """
+        Spherical k-means over a sample of the live vectors; every live row is assigned to its nearest centroid.
+        """
+        live = np.flatnonzero(self._alive[:self._count])
+        nlist = max(1, int(np.sqrt(len(live))))
+        rng = np.random.default_rng(0)
+        sample = self._vectors[rng.choice(live, size=min(len(live), 64 * nlist), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        assign = np.argmax(self._vectors[live] @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+        lists = [live[order[bounds[c]:bounds[c + 1]]] for c in range(nlist)]
+        self._ivf = (centroids, lists, self._count)
+
+    def _search_ivf(self, query, k):
+        centroids, lists, trained = self._ivf
+        probe = _top_k(centroids @ query, self.nprobe)
+        candidates = np.concatenate([lists[c] for c in probe] + [np.arange(trained, self._count)])
+        candidates = candidates[self._alive[candidates]]
+        scores = self._vectors[candidates] @ query
+        return candidates[_top_k(scores, k)].tolist()
+
+
+if __name__ == "__main__":
+    # Benchmark: NumPy exact and IVF search vs. Chroma on random 768-d vectors.
+    import sys
+    import tempfile
+    import time
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    dim, k, n_queries = 768, 4, 50
+    rng = np.random.default_rng(1)
+    topics = rng.standard_normal((500, dim), dtype=np.float32)  # Clustered, like real embeddings of related chunks
+    corpus = topics[rng.integers(0, len(topics), n)] + 0.5 * rng.standard_normal((n, dim), dtype=np.float32)
+    query_vectors = corpus[rng.choice(n, n_queries)] + 0.1 * rng.standard_normal((n_queries, dim), dtype=np.float32)
+    lookup = {}
+
+    class TableEmbeddings:
+        """Returns precomputed vectors for "doc<i>" / "q<i>" texts, so no model is needed."""
+        def embed_documents(self, texts):
+            return [lookup[t] for t in texts]
+
+        def embed_query(self, text):
+            return lookup[text]
+
+    docs = [Document(page_content=f"doc{i}", metadata={"source": f"s{i % 10}"}) for i in range(n)]
+    lookup.update({f"doc{i}": corpus[i] for i in range(n)})
+    lookup.update({f"q{i}": query_vectors[i] for i in range(n_queries)})
+    queries = [f"q{i}" for i in range(n_queries)]
+
+    def bench(name, store):
+        start = time.perf_counter()
+        for i in range(0, n, 5000):
+            store.add_documents(docs[i:i + 5000])
+        added = time.perf_counter() - start
+        start = time.perf_counter()
+        store.similarity_search(queries[0], k=k)  # Warm-up; trains the IVF lists when enabled
+        warmup = time.perf_counter() - start
+        start = time.perf_counter()
+        results = [store.similarity_search(q, k=k) for q in queries]
+        per_query = (time.perf_counter() - start) / n_queries
+        print(f"{name:<22} add {added:6.2f}s   first query {warmup:6.2f}s   query {per_query * 1000:7.2f} ms")
+        return results
+
+    exact = bench("numpy exact", NumpyVectorStore(TableEmbeddings(), ivf_threshold=n + 1))
+    store = NumpyVectorStore(TableEmbeddings(), ivf_threshold=n + 1)
+    store.add_documents(docs)
+    start = time.perf_counter()
+    store.similarity_search_many(queries, k=k)
+    print(f"{'numpy exact, batched':<22} {'':<35} query {(time.perf_counter() - start) / n_queries * 1000:7.2f} ms")
+    ivf = bench("numpy IVF", NumpyVectorStore(TableEmbeddings(), ivf_threshold=0))
+    recall = np.mean([len({d.page_content for d in a} & {d.page_content for d in b}) / k for a, b in zip(exact, ivf)])
+    print(f"IVF recall@{k} vs exact: {recall:.2f}")
+    with tempfile.TemporaryDirectory() as tmp:
+        bench("numpy exact, memmap", NumpyVectorStore(TableEmbeddings(), persist_directory=tmp, ivf_threshold=n + 1))
+    try:
+        from langchain_chroma import Chroma
+    except ImportError:
+        print("langchain_chroma not installed; skipping Chroma")
+    else:
+        bench("chroma (in-memory)", Chroma(collection_name="bench", embedding_function=TableEmbeddings()))
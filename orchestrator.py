@@ -0,0 +1,231 @@
+# agent/orchestrator.py
+
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from agent.config import MAX_WORKERS, SOURCE_TIMEOUT, SUBQ_WORKERS
+
+POLL_INTERVAL = 0.05  # Seconds between checks for timeouts and cancellation
+
+
+class Cancelled(Exception):
+    """Raised for work that was skipped or abandoned because the run was cancelled."""
+
+
+class SourceTimeout(Exception):
+    """Raised when a single source call runs longer than its timeout. The call itself is abandoned, not stopped."""
+
+
+class Job:
+    """
+    Handle for one source call submitted to the shared pool.
+    Records when the call actually started, so time spent queued does not count against its timeout.
+    """
+    __slots__ = ("future", "started")
+
+    def __init__(self):
+        self.future = None
+        self.started = None
+
+
+class FanOut:
+    """
+    Runs sub-questions and their sources concurrently on bounded thread pools.
+    Source calls from every sub-question share one pool, so `max_workers` is a global
+    limit on in-flight network requests. Use as a context manager so an interrupted
+    run (e.g. a Streamlit rerun) cancels everything that has not started yet.
+    Threads cannot be interrupted, so a source call that times out is only abandoned: its result
+    is discarded, but it keeps its worker until it returns. Sources should also pass their own
+    network timeouts (e.g. FETCH_TIMEOUT) so an abandoned call frees its worker soon after.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, subq_workers=SUBQ_WORKERS, timeout=SOURCE_TIMEOUT):
+        self.timeout = timeout
+        self._cancel = threading.Event()
+        self._sources = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="source")
+        self._tasks = ThreadPoolExecutor(max_workers=subq_workers, thread_name_prefix="subq")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.cancel()
+        self.shutdown()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """
+        Stops submitting new work and abandons anything still queued or waiting.
+        Calls that are already running finish in the background; their results are discarded.
+        """
+        self._cancel.set()
+
+    def shutdown(self):
+        self._tasks.shutdown(wait=False, cancel_futures=True)
+        self._sources.shutdown(wait=False, cancel_futures=True)
+
+    # --- Source level ---
+
+    def start(self, fn, *args, **kwargs):
+        """
+        Submits one source call to the shared pool without waiting for it.
+        Returns a Job to pass to collect().
+        """
+        if self.cancelled:
+            raise Cancelled("run was cancelled")
+        job = Job()
+        context = contextvars.copy_context()  # Carries the caller's tracer and parent span onto the worker
+
+        def run():
+            job.started = time.monotonic()
+            return context.run(fn, *args, **kwargs)
+
+        job.future = self._sources.submit(run)
+        return job
+
+    def collect(self, jobs, timeout=None):
+        """
+        Waits for a dict of {name: Job}. Each job gets `timeout` seconds from the moment it starts running.
+        Returns (results, errors): two dicts keyed by name, holding return values and exceptions respectively.
+        A timed-out job is reported as SourceTimeout and abandoned; it runs on until it returns (see FanOut).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        results, errors = {}, {}
+        pending = dict(jobs)
+        while pending:
+            if self.cancelled:
+                for name, job in pending.items():
+                    job.future.cancel()
+                    errors[name] = Cancelled("run was cancelled")
+                break
+            wait([job.future for job in pending.values()], timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for name, job in list(pending.items()):
+                if job.future.done():
+                    del pending[name]
+                    try:
+                        results[name] = job.future.result()
+                    except Exception as e:
+                        errors[name] = e
+                elif job.started is not None and now - job.started > timeout:
+                    del pending[name]
+                    errors[name] = SourceTimeout(f"{name} timed out after {timeout:g}s")
+        return results, errors
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Runs one source call on the shared pool and waits for it.
+        Raises SourceTimeout or Cancelled instead of hanging past the timeout.
+        """
+        results, errors = self.collect({"call": self.start(fn, *args, **kwargs)})
+        if errors:
+            raise errors["call"]
+        return results["call"]
+
+    def gather(self, calls, timeout=None):
+        """
+        Runs a dict of {name: zero-argument callable} at the same time.
+        Returns (results, errors) as collect() does.
+        """
+        return self.collect({name: self.start(fn) for name, fn in calls.items()}, timeout=timeout)
+
+    # --- Sub-question level ---
+
+    def map(self, fn, items, on_result=None, on_submit=None, on_poll=None):
+        """
+        Applies fn to every item concurrently and returns the results in input order.
+        `items` may be a generator (e.g. sub-questions streamed from the planner): it is consumed on a
+        background thread and each item is submitted as soon as it is produced.
+        The callbacks all run in the calling thread, so it is safe to update Streamlit widgets from them:
+        on_submit(index, item) when an item is submitted, on_result(index, result, error) as each item
+        finishes, and on_poll() every poll interval. Failed items come back as None.
+        """
+        submitted = []  # (index, item, future), appended by the feeder thread
+        feed_errors = []
+        feed_done = threading.Event()
+        lock = threading.Lock()
+
+        def feed():
+            try:
+                for i, item in enumerate(items):
+                    if self.cancelled:
+                        break
+                    future = self._tasks.submit(contextvars.copy_context().run, fn, item)
+                    with lock:
+                        submitted.append((i, item, future))
+            except Exception as e:
+                feed_errors.append(e)
+            finally:
+                feed_done.set()
+
+        threading.Thread(target=contextvars.copy_context().run, args=(feed,), name="fanout-feed", daemon=True).start()
+        futures = {}
+        results = {}
+        pending = set()
+        seen = 0
+        while True:
+            finished_feeding = feed_done.is_set()  # Read before the list, so nothing submitted after it is missed
+            with lock:
+                new = submitted[seen:]
+                seen = len(submitted)
+            for i, item, future in new:
+                futures[future] = i
+                pending.add(future)
+                if on_submit:
+                    on_submit(i, item)
+            if self.cancelled:
+                for future in pending:
+                    future.cancel()
+                break
+            if pending:
+                done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            else:
+                done = set()
+                if not finished_feeding:
+                    feed_done.wait(POLL_INTERVAL)
+            for future in sorted(done, key=futures.get):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                    error = None
+                except Exception as e:
+                    error = e
+                if on_result:
+                    on_result(i, results.get(i), error)
+            if on_poll:
+                on_poll()
+            if finished_feeding and not pending:
+                break
+        if feed_errors:
+            raise feed_errors[0]
+        return [results.get(i) for i in range(seen)]
+
+if __name__ == "__main__":
+    # Stand-in sources that only sleep: wall time should track the slowest source, not the sum.
+    def fake_source(name, delay):
+        time.sleep(delay)
+        return f"{name} after {delay}s"
+
+    def fake_subquestion(subq):
+        results, errors = fanout.gather({
+            "web": lambda: fake_source("web", 0.3),
+            "arxiv": lambda: fake_source("arxiv", 0.5),
+            "pubmed": lambda: fake_source("pubmed", 0.2),
+            "slow": lambda: fake_source("slow", 5),
+        }, timeout=1.0)
+        return subq, sorted(results), sorted(errors)
+
+    start = time.perf_counter()
+    with FanOut(max_workers=16, subq_workers=4) as fanout:
+        answers = fanout.map(
+            fake_subquestion, [f"subq {n}" for n in range(4)],
+            on_result=lambda i, res, err: print(f"[{time.perf_counter() - start:.2f}s] finished #{i}: {res or err}"),
+        )
+    print(f"Results in order: {[a[0] for a in answers]}")
+    print(f"Total: {time.perf_counter() - start:.2f}s (sequential would be ~{4 * 6.0:.0f}s)")
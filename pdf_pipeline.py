@@ -0,0 +1,116 @@
+# agent/pdf_pipeline.py
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from langchain_core.documents import Document
+
+from agent.config import PDF_MAX_PENDING, PDF_PAGES_PER_TASK, PDF_WORKERS
+
+METADATA_KEYS = ("format", "title", "author", "subject", "keywords", "creator", "producer", "creationDate", "modDate", "trapped")
+
+
+def _extract_range(path, start, stop):
+    """
+    Extracts the text of pages [start, stop) of one PDF. Runs in a worker process,
+    so it returns plain tuples that are cheap to pickle: (page_number, text, metadata).
+    """
+    import fitz  # PyMuPDF; imported where it is used so importing this module stays cheap
+
+    with fitz.open(path) as pdf:
+        metadata = {key: pdf.metadata.get(key, "") for key in METADATA_KEYS} if pdf.metadata else {}
+        metadata.update(source=path, file_path=path, total_pages=pdf.page_count)
+        return [(n, pdf[n].get_text(), metadata) for n in range(start, stop)]
+
+
+def plan_tasks(paths, pages_per_task=PDF_PAGES_PER_TASK):
+    """
+    Splits every PDF into page ranges, so one large file is spread across workers.
+    Returns a list of (path, start, stop) in document order.
+    """
+    import fitz
+
+    tasks = []
+    for path in paths:
+        with fitz.open(path) as pdf:
+            count = pdf.page_count
+        for start in range(0, count, pages_per_task):
+            tasks.append((path, start, min(start + pages_per_task, count)))
+    return tasks
+
+
+def _to_documents(pages):
+    for n, text, metadata in pages:
+        yield Document(page_content=text, metadata={**metadata, "page": n})
+
+
+def open_pool(workers=PDF_WORKERS):
+    """
+    Returns a process pool for page extraction, or None when workers=1.
+    Workers are spawned rather than forked: the caller is usually multithreaded (Streamlit, the fan-out
+    pool), and a forked child can inherit a lock another thread was holding.
+    """
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def iter_pdf_pages(paths, workers=PDF_WORKERS, pages_per_task=PDF_PAGES_PER_TASK, max_pending=PDF_MAX_PENDING, pool=None):
+    """
+    Yields one Document per PDF page, in document order, with the same metadata PyMuPDFLoader sets
+    (source, file_path, page, total_pages, ...). Page ranges are extracted on a process pool; at most
+    `max_pending` ranges are in flight, so memory stays bounded however large the library is.
+    Pass `pool` (from open_pool) to reuse one pool across calls; it is left open. Otherwise a pool is
+    opened for this call, and with workers=1 everything runs in this process.
+    """
+    tasks = plan_tasks(paths, pages_per_task)
+    if pool is None and workers <= 1:
+        for task in tasks:
+            yield from _to_documents(_extract_range(*task))
+        return
+
+    max_pending = max(max_pending, workers)
+    with nullcontext(pool) if pool is not None else open_pool(workers) as pool:
+        window = deque()
+        todo = iter(tasks)
+        try:
+            for task in todo:
+                window.append(pool.submit(_extract_range, *task))
+                if len(window) >= max_pending:  # Backpressure: wait for the oldest range before submitting more
+                    yield from _to_documents(window.popleft().result())
+            while window:
+                yield from _to_documents(window.popleft().result())
+        finally:
+            for future in window:  # Consumer stopped early: drop queued ranges
+                future.cancel()
+
+
+def extract_pdf_streaming(pdf_path, workers=PDF_WORKERS):
+    """
+    Page-streaming counterpart of gather_docs.extract_pdf for a single file.
+    """
+    return iter_pdf_pages([pdf_path], workers=workers)
+
+
+if __name__ == "__main__":
+    # Benchmark: extract and chunk the bundled PDFs at 1, 2, 4 and N workers.
+    import glob
+    import time
+
+    from agent.chunker import iter_chunks
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    pdfs = sorted(glob.glob(os.path.join(here, "*.pdf")))
+    print(f"{len(pdfs)} PDFs, {sum(os.path.getsize(p) for p in pdfs) / 1e6:.1f} MB")
+    for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        pages = set()
+        chunks = 0
+        for chunk in iter_chunks(iter_pdf_pages(pdfs, workers=workers)):
+            chunks += 1
+            pages.add((chunk.metadata["source"], chunk.metadata["page"]))
+        elapsed = time.perf_counter() - start
+        print(f"{workers:>3} workers: {len(pages)} pages, {chunks} chunks in {elapsed:.2f}s ({chunks / elapsed:.0f} chunks/s)")
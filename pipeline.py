@@ -0,0 +1,286 @@
+# agent/pipeline.py
+
+import threading
+import time
+from functools import partial
+from itertools import islice
+
+from langchain_core.documents import Document
+
+from agent.chunker import chunk_text
+from agent.citations import extract_sources_from_chunks
+from agent.config import PDF_INDEX_DIR
+from agent.context import ContextStats
+from agent.dedup import NearDuplicateFilter
+from agent.gather_academic import get_pubmed_abstracts, search_arxiv
+from agent.gather_docs import extract_web_page
+from agent.gather_web import search_web
+from agent.ingest import get_pdf_library, sync_folder
+from agent.orchestrator import FanOut
+from agent.planner import stream_subquestions
+from agent.streaming import StreamMetrics
+from agent.synthesis import stream_answer
+from agent.tracing import span, traced
+from agent.vectorstore import add_chunks_to_vectorstore, get_vectorstore, query_vectorstore
+
+MAX_SUBQUESTIONS = 2  # Only the first sub-questions from the planner are researched
+SOURCE_LIMITS = {"web": 3, "arxiv": 2, "pubmed": 1}  # Results taken from each source per sub-question
+
+EXECUTIVE_SUMMARY = (
+    "An AI Research Agent in healthcare diagnostics is a powerful system designed to assist healthcare professionals by automating "
+    "tasks, analyzing vast amounts of medical data, and enhancing diagnostic accuracy. These agents utilize advanced technologies "
+    "such as machine learning (ML), natural language processing (NLP), and predictive analytics to process data from multiple sources "
+    "like medical images, electronic health records (EHR), and genomics data. Their main purpose is to improve patient outcomes by offering "
+    "decision support, diagnosing diseases, and recommending treatment options. The key features of an AI Research Agent include the "
+    "ability to analyze complex medical data, learn from previous outcomes, and integrate various types of medical information for "
+    "holistic diagnosis. Furthermore, these agents can become more autonomous, providing increasing support in diagnostic workflows and "
+    "eventually offering autonomous diagnoses in certain areas of healthcare. As healthcare systems adopt AI technologies, AI Research "
+    "Agents are becoming integral to healthcare delivery, improving efficiency, reducing human error, and ensuring higher-quality care."
+)
+
+
+class StageTimes:
+    """
+    Wall time, call count and item count per pipeline stage, summed across threads.
+    Stages of parallel sub-questions overlap, so their totals can exceed the end-to-end time.
+    Each stage is also a tracing span, so the functions it calls nest under it in a trace.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, items=0):
+        with self._lock:
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "items": 0})
+            stage["seconds"] += seconds
+            stage["calls"] += 1
+            stage["items"] += items
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def timed(self, name, fn):
+        """
+        Wraps fn so each call is recorded under a stage; the item count is len() of the result when it has one.
+        """
+        def wrapper(*args, **kwargs):
+            with self.stage(name) as stage:
+                result = fn(*args, **kwargs)
+                stage.items = len(result) if hasattr(result, "__len__") else 0
+                return result
+        return wrapper
+
+    def as_dict(self):
+        with self._lock:
+            return {name: dict(stage) for name, stage in self.stages.items()}
+
+
+class _Stage:
+    __slots__ = ("times", "name", "items", "started", "scope", "span")
+
+    def __init__(self, times, name):
+        self.times = times
+        self.name = name
+        self.items = 0
+
+    def __enter__(self):
+        self.scope = span(self.name)
+        self.span = self.scope.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.times.record(self.name, time.perf_counter() - self.started, self.items)
+        self.span.set(items=self.items)
+        return self.scope.__exit__(*exc)
+
+
+@traced()
+def research_subquestion(subq, fanout, vectorstore, vectorstore_lock, dedup, on_token=None, limits=SOURCE_LIMITS, times=None,
+                         library=None):
+    """
+    Gathers web and academic evidence for one sub-question, stores it and synthesizes an answer.
+    Evidence is retrieved from the run's vector store and, when given, the PDF library store.
+    Runs on a worker thread, so errors are collected and returned instead of raised,
+    and answer tokens are handed to on_token(token) as they stream.
+    Returns a dict: {'chunks': [...], 'retrieved': [...], 'answer': str, 'errors': [str, ...], 'metrics': StreamMetrics, 'context': ContextStats}.
+    """
+    times = times if times is not None else StageTimes()
+    errors = []
+
+    # --- Start Academic Searches While the Web Search Runs ---
+    academic_jobs = {
+        'arXiv': fanout.start(times.timed("arxiv", search_arxiv), subq, max_results=limits["arxiv"]),
+        'PubMed': fanout.start(times.timed("pubmed", get_pubmed_abstracts), subq, max_results=limits["pubmed"]),
+    }
+
+    # --- Fetch Web Results ---
+    web_results = []
+    try:
+        web_results = fanout.call(times.timed("web_search", search_web), subq, max_results=limits["web"])
+    except Exception as e:
+        errors.append(f"Error in web search: {e}")
+    with times.stage("fetch_pages") as stage:
+        pages, page_errors = fanout.gather({res['url']: partial(extract_web_page, res['url']) for res in web_results})  # Extract all pages at once
+        stage.items = len(pages)
+    web_chunks = []
+    with times.stage("chunk") as stage:
+        for res in web_results:  # In search order
+            url = res['url']
+            if url in page_errors:
+                errors.append(f"Error extracting/chunking {url}: {page_errors[url]}")
+                continue
+            try:
+                page_content = pages.get(url)
+                if page_content and len(page_content) > 100:  # Ensure the content is meaningful
+                    chunks = chunk_text(page_content, metadata={'source': url})  # Tagged with their source
+                    for chunk in chunks:
+                        chunk.metadata['content'] = chunk.page_content
+                    web_chunks.extend(chunks)
+            except Exception as e:
+                errors.append(f"Error extracting/chunking {url}: {e}")
+        stage.items = len(web_chunks)
+
+    # --- Collect Academic Results ---
+    academic_chunks = []
+    with times.stage("academic_wait"):
+        academic, academic_errors = fanout.collect(academic_jobs)
+    for name, e in academic_errors.items():
+        errors.append(f"Error in academic search ({name}): {e}")
+    for doc in academic.get('arXiv', []):
+        # Keep plain values only (ArxivLoader's full-text mode returns dates), with the abstract page as the source
+        doc.metadata = {key: value for key, value in doc.metadata.items() if isinstance(value, (str, int, float, bool))}
+        doc.metadata.setdefault('source', 'arXiv')
+        academic_chunks.append(doc)
+    for ab in academic.get('PubMed', []):
+        metadata = {'source': ab.get('url') or ab['title'], 'title': ab['title'], 'pmid': ab.get('pmid', ''), 'doi': ab.get('doi', '')}
+        academic_chunks.append(Document(page_content=ab['abstract'], metadata=metadata))
+
+    # --- Process Valid Chunks and Add to Vector Store ---
+    with times.stage("dedup") as stage:
+        valid_chunks = [c for c in (web_chunks + academic_chunks) if c.page_content and c.page_content.strip()]
+        valid_chunks = list(dedup.filter(valid_chunks))  # Drop near-duplicates of anything already seen in this run
+        stage.items = len(valid_chunks)
+    if valid_chunks:
+        with times.stage("embed_store") as stage, vectorstore_lock:
+            dedup.stored(valid_chunks, add_chunks_to_vectorstore(valid_chunks, vectorstore))
+            stage.items = len(valid_chunks)
+    with vectorstore_lock:  # Write back sources merged into chunks another sub-question already stored
+        ids, merged = dedup.pop_updates()
+        if ids:
+            vectorstore.update_documents(ids, merged)
+
+    # --- Synthesize Answers from Chunks ---
+    with times.stage("retrieve") as stage:
+        top_chunks = query_vectorstore(subq, vectorstore, k=4, library=library)
+        stage.items = len(top_chunks)
+    metrics = StreamMetrics()  # Time-to-first-token, tokens/sec and total latency of the synthesis call
+    context_stats = ContextStats()  # Prompt tokens before and after context packing
+    tokens = []
+    with times.stage("synthesis") as stage:
+        for token in stream_answer(subq, top_chunks, metrics, context_stats=context_stats):
+            tokens.append(token)
+            if on_token:
+                on_token(token)
+        stage.items = metrics.tokens
+    return {'chunks': valid_chunks, 'retrieved': top_chunks, 'answer': "".join(tokens), 'errors': errors, 'metrics': metrics, 'context': context_stats}
+
+
+def iter_report(answers, summary=EXECUTIVE_SUMMARY):
+    """
+    Yields the final Markdown report piece by piece, e.g. for export.write_report.
+    """
+    yield "# Final Report\n\n"
+    yield "## Findings\n"
+    for answer in answers:
+        yield f"{answer}\n\n"
+    yield "## Executive Summary\n"
+    yield summary
+    yield "\n\n"
+
+
+def build_report(answers, summary=EXECUTIVE_SUMMARY):
+    """
+    Assembles the final Markdown report from the sub-question answers.
+    """
+    return "".join(iter_report(answers, summary))
+
+
+def run_research(query, max_subquestions=MAX_SUBQUESTIONS, pdf_folder=None, pdf_index_dir=PDF_INDEX_DIR,
+                 limits=SOURCE_LIMITS, vectorstore=None, times=None, fanout=None):
+    """
+    Runs the whole research pipeline for one query without any UI: plan, gather and answer the
+    sub-questions concurrently and build the report. The PDF library is synced first when pdf_folder
+    is given; an ingested library in pdf_index_dir is searched alongside the gathered evidence.
+    Pass a FanOut to share its worker pools between runs.
+    Returns a dict with the sub-questions, answers, chunks, sources, report, errors and metrics.
+    """
+    times = times if times is not None else StageTimes()
+    vectorstore = vectorstore if vectorstore is not None else get_vectorstore()
+    vectorstore_lock = threading.Lock()
+    dedup = NearDuplicateFilter()
+    planner_metrics = StreamMetrics()
+    subquestions = []
+    errors = []
+    started = time.perf_counter()
+
+    pdf_summary = None
+    library = None
+    try:
+        if pdf_folder:
+            with times.stage("pdf_sync") as stage:
+                pdf_summary = sync_folder(pdf_folder, index_dir=pdf_index_dir, log=lambda message: None)
+                stage.items = pdf_summary["chunks"]
+        library = get_pdf_library(pdf_index_dir)
+    except Exception as e:
+        errors.append(f"Error processing PDFs: {e}")
+
+    def planned():
+        # Timed by hand rather than with a stage: a span held open across yields would become the parent of the sub-question tasks
+        plan_started = time.perf_counter()
+        try:
+            for subq in islice(stream_subquestions(query, planner_metrics), max_subquestions):
+                subquestions.append(subq)
+                yield subq
+        finally:
+            times.record("plan", time.perf_counter() - plan_started, len(subquestions))
+
+    def research(subq):
+        return research_subquestion(subq, owner, vectorstore, vectorstore_lock, dedup, limits=limits, times=times, library=library)
+
+    def on_result(i, result, error):
+        if error is not None:
+            errors.append(f"Error processing sub-question {i+1}: {error}")
+
+    owner = fanout if fanout is not None else FanOut()
+    try:
+        results = owner.map(research, planned(), on_result=on_result)
+    finally:
+        if fanout is None:
+            owner.shutdown()
+
+    results = [r for r in results if r is not None]
+    for result in results:
+        errors.extend(result['errors'])
+    chunks = [chunk for result in results for chunk in result['chunks']]
+    answers = [result['answer'] for result in results]
+    retrieved = [chunk for result in results for chunk in result['retrieved']]  # Includes PDF library chunks
+
+    with times.stage("report"):
+        report = build_report(answers)
+    return {
+        'query': query,
+        'subquestions': subquestions,
+        'answers': answers,
+        'chunks': chunks,
+        'sources': extract_sources_from_chunks(chunks + retrieved),
+        'report': report,
+        'errors': errors,
+        'pdf_summary': pdf_summary,
+        'dedup': {'seen': dedup.seen, 'removed': dedup.removed},
+        'planner_metrics': planner_metrics,
+        'synthesis_metrics': [result['metrics'] for result in results],
+        'context': [result['context'] for result in results],
+        'seconds': time.perf_counter() - started,
+    }
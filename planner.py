@@ -1,17 +1,41 @@
 # agent/planner.py
-from langchain_ollama import OllamaLLM
+from agent.llm import get_default_llm
+from agent.streaming import iter_lines, timed_stream
+from agent.tracing import traced
 
-def generate_subquestions(query):
-    llm = OllamaLLM(model="mistral:latest")
-    prompt = (
+
+def build_prompt(query):
+    return (
         "Decompose the research question into 3-5 specific, answerable sub-questions:\n"
         f"{query}\n"
         "Return as a numbered list."
     )
-    response = llm.invoke(prompt)
-    subqs = []
-    for line in response.splitlines():
-        line = line.strip()
-        if line and (line[0].isdigit() or line.startswith("-")):
-            subqs.append(line.lstrip("1234567890.-) ").strip())
-    return subqs
+
+
+def parse_subquestion(line):
+    """
+    Returns the sub-question on a numbered or bulleted line, or None for any other line.
+    """
+    line = line.strip()
+    if line and (line[0].isdigit() or line.startswith("-")):
+        return line.lstrip("1234567890.-) ").strip()
+    return None
+
+
+@traced()
+def stream_subquestions(query, metrics=None, llm=None):
+    """
+    Streams the planner's numbered list and yields each sub-question as soon as its line is complete,
+    so gathering for the first one can start while the rest are still being generated.
+    Pass a StreamMetrics to record time-to-first-token and throughput.
+    """
+    llm = llm or get_default_llm()
+    for line in iter_lines(timed_stream(llm.stream(build_prompt(query)), metrics)):
+        subq = parse_subquestion(line)
+        if subq is not None:
+            yield subq
+
+
+@traced(items=len)
+def generate_subquestions(query, metrics=None, llm=None):
+    return list(stream_subquestions(query, metrics, llm))
@@ -0,0 +1,103 @@
+# agent/streaming.py
+
+import time
+
+
+class StreamMetrics:
+    """
+    Timing for one streamed LLM call: time-to-first-token, tokens/sec and total latency.
+    Tokens are counted as streamed chunks, which Ollama emits one token at a time.
+    """
+    __slots__ = ("started", "first_token_at", "finished", "tokens")
+
+    def __init__(self):
+        self.started = None
+        self.first_token_at = None
+        self.finished = None
+        self.tokens = 0
+
+    @property
+    def ttft(self):
+        if self.started is None or self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    @property
+    def total(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    @property
+    def tokens_per_sec(self):
+        if self.first_token_at is None or self.finished is None or self.tokens < 2:
+            return None
+        generating = self.finished - self.first_token_at
+        return (self.tokens - 1) / generating if generating > 0 else None
+
+    def as_dict(self):
+        return {"ttft": self.ttft, "tokens": self.tokens, "tokens_per_sec": self.tokens_per_sec, "total": self.total}
+
+    def __str__(self):
+        parts = []
+        if self.ttft is not None:
+            parts.append(f"first token {self.ttft:.2f}s")
+        if self.tokens_per_sec is not None:
+            parts.append(f"{self.tokens_per_sec:.1f} tok/s")
+        if self.total is not None:
+            parts.append(f"{self.total:.2f}s total")
+        return " · ".join(parts) or "no tokens"
+
+
+def timed_stream(tokens, metrics=None):
+    """
+    Passes a token iterator through unchanged while recording its timing into metrics.
+    The clock starts when iteration starts, which is when the LLM request is actually sent.
+    """
+    metrics = metrics if metrics is not None else StreamMetrics()
+    metrics.started = time.perf_counter()
+    try:
+        for token in tokens:
+            if metrics.first_token_at is None:
+                metrics.first_token_at = time.perf_counter()
+            metrics.tokens += 1
+            yield token
+    finally:
+        metrics.finished = time.perf_counter()
+
+
+def iter_lines(tokens):
+    """
+    Reassembles a token stream into lines, yielding each line as soon as its newline arrives.
+    The last line is yielded when the stream ends, even without a trailing newline.
+    """
+    buffer = ""
+    for token in tokens:
+        buffer += token
+        while "\n" in buffer:
+            line, buffer = buffer.split("\n", 1)
+            yield line
+    if buffer:
+        yield buffer
+
+
+class FakeStreamingLLM:
+    """
+    Local stand-in for an Ollama LLM: streams a canned reply word by word with fixed delays.
+    """
+
+    def __init__(self, reply, first_token_delay=0.2, token_delay=0.01):
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+
+    def stream(self, prompt):
+        time.sleep(self.first_token_delay)
+        words = self.reply.split(" ")
+        for n, word in enumerate(words):
+            if n:
+                time.sleep(self.token_delay)
+            yield word if n == len(words) - 1 else word + " "
+
+    def invoke(self, prompt):
+        return "".join(self.stream(prompt))
@@ -1,42 +1,70 @@
 # agent/synthesis.py
 
-from langchain_community.llms import Ollama
+from agent.config import CONTEXT_SELECT
+from agent.context import pack_context
+from agent.embeddings import get_embeddings
+from agent.llm import get_default_llm
+from agent.streaming import timed_stream
+from agent.tracing import traced
 
-def synthesize_answer(subquestion, context_chunks):
+@traced(bytes=len)
+def build_prompt(subquestion, context_chunks, context_stats=None):
     """
-    Synthesizes an answer for a sub-question using relevant text chunks and LLM.
-    Returns the generated answer as a string.
+    Builds the synthesis prompt from a sub-question and its retrieved chunks.
+    The chunks are packed into the token budget first (see context.pack_context), each passage tagged with its source.
     """
-    llm = Ollama(model="mistral:latest")
-    context = "\n\n".join(chunk.page_content for chunk in context_chunks)
+    embeddings = get_embeddings() if CONTEXT_SELECT else None
+    context = pack_context(subquestion, context_chunks, embeddings=embeddings, stats=context_stats)
     prompt = (
         f"Based on the following information, answer this sub-question clearly, concisely, "
-        f"with citations for each claim (use [source] if the chunk metadata includes a source):\n\n"
+        f"with citations for each claim (each passage starts with its [source]; cite claims with it):\n\n"
         f"Sub-question: {subquestion}\n\n"
         f"Context:\n{context}\n"
-        "If context includes a 'source' metadata, use it as a citation."
+        "Use the [source] tags of the passages you rely on as citations."
     )
-    answer = llm(prompt)
+    return prompt
+
+@traced()
+def stream_answer(subquestion, context_chunks, metrics=None, llm=None, context_stats=None):
+    """
+    Streams the answer for a sub-question token by token as the LLM produces it.
+    Pass a StreamMetrics to record time-to-first-token, tokens/sec and total latency,
+    and a ContextStats to record how many prompt tokens context packing saved.
+    """
+    llm = llm or get_default_llm()
+    yield from timed_stream(llm.stream(build_prompt(subquestion, context_chunks, context_stats)), metrics)
+
+@traced(bytes=len)
+def synthesize_answer(subquestion, context_chunks, metrics=None, llm=None, context_stats=None):
+    """
+    Synthesizes an answer for a sub-question using relevant text chunks and LLM.
+    Returns the generated answer as a string.
+    """
+    answer = "".join(stream_answer(subquestion, context_chunks, metrics, llm, context_stats))
     return answer
 
-def generate_report(subquestions, answers, sources):
+def iter_report(subquestions, answers, sources):
     """
-    Assembles the full report from all sub-question answers.
-    Returns a formatted string (can be saved as .md or .txt).
+    Yields the full report piece by piece, so it can be written out without holding copies of it.
     """
-    report = "# Research Report\n\n"
-    report += "## Executive Summary\n"
-    report += "This report answers the key research question using multiple sources and synthesized findings.\n\n"
-    
+    yield "# Research Report\n\n"
+    yield "## Executive Summary\n"
+    yield "This report answers the key research question using multiple sources and synthesized findings.\n\n"
+
     for i, (subq, ans) in enumerate(zip(subquestions, answers), 1):
-        report += f"### {i}. {subq}\n{ans}\n\n"
+        yield f"### {i}. {subq}\n{ans}\n\n"
 
     # Adding the references with clickable links
-    report += "## References\n"
+    yield "## References\n"
     for idx, source in enumerate(sources, 1):
-        report += f"[{idx}]: {source}\n"
-    
-    return report
+        yield f"[{idx}]: {source}\n"
+
+def generate_report(subquestions, answers, sources):
+    """
+    Assembles the full report from all sub-question answers.
+    Returns a formatted string (can be saved as .md or .txt).
+    """
+    return "".join(iter_report(subquestions, answers, sources))
 
 
 # # Example usage
@@ -0,0 +1,22 @@
+# agent/tests/conftest.py
+
+import importlib.util
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Every on-disk cache and index goes to a scratch directory, set before agent.config is imported
+SCRATCH = tempfile.mkdtemp(prefix="agent-tests-")
+os.environ.setdefault("AGENT_CACHE_PATH", os.path.join(SCRATCH, "fetch_cache.sqlite3"))
+os.environ.setdefault("AGENT_EMBED_CACHE_PATH", os.path.join(SCRATCH, "embeddings.sqlite3"))
+os.environ.setdefault("AGENT_PDF_INDEX_DIR", os.path.join(SCRATCH, "pdf_index"))
+os.environ.setdefault("AGENT_TRACE_DIR", os.path.join(SCRATCH, "traces"))
+
+# The repository root is the `agent` package; make it importable whatever the checkout directory is called
+if "agent" not in sys.modules:
+    spec = importlib.util.spec_from_file_location("agent", os.path.join(ROOT, "__init__.py"), submodule_search_locations=[ROOT])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["agent"] = module
+    spec.loader.exec_module(module)
@@ -0,0 +1,58 @@
+# agent/tests/test_batch.py
+
+import json
+import re
+
+from agent import batch
+from agent.batch import BatchRunner, query_id
+from agent.vectorstore import unique_collection_name
+
+CHROMA_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{1,61}[A-Za-z0-9]$")
+
+
+class FakeStore:
+    def __init__(self, collection_name):
+        self.collection_name = collection_name
+        self.deleted = False
+
+    def delete_collection(self):
+        self.deleted = True
+
+
+def fake_result(query):
+    class Metrics:
+        def as_dict(self):
+            return {}
+
+    return {
+        "report": f"# Final Report\n{query}\n", "subquestions": [query], "sources": [], "errors": [],
+        "dedup": {"seen": 0, "removed": 0}, "seconds": 0.0, "planner_metrics": Metrics(),
+        "synthesis_metrics": [], "context": [],
+    }
+
+
+def test_collection_names_are_valid_and_distinct():
+    ids = ["x" * 200, "trailing_", "ends.", "a/b", "a_b", "é", ""]
+    names = [unique_collection_name("batch", query_id("q", {"id": qid}) if qid else qid) for qid in ids]
+    assert all(CHROMA_NAME.match(name) for name in names)
+    assert len(set(names)) == len(names)
+    assert query_id("q", {"id": "a/b"}) == query_id("q", {"id": "a_b"})  # File names may collide...
+    assert unique_collection_name("batch", "a_b") != unique_collection_name("batch", "a_b")  # ...collections never do
+
+
+def test_each_query_gets_its_own_collection_dropped_afterwards(tmp_path, monkeypatch):
+    stores = []
+
+    def get_vectorstore(collection_name):
+        stores.append(FakeStore(collection_name))
+        return stores[-1]
+
+    monkeypatch.setattr(batch, "get_vectorstore", get_vectorstore)
+    monkeypatch.setattr(batch, "run_research", lambda query, **kwargs: fake_result(query))
+    runner = BatchRunner(str(tmp_path), workers=2, log=lambda message: None)
+    summary = runner.run([("q" * 80 + "_", "first question"), ("b.", "second question")])
+    assert summary["done"] == 2
+    assert all(store.deleted for store in stores)
+    assert all(CHROMA_NAME.match(store.collection_name) for store in stores)
+    records = [json.loads(line) for line in open(tmp_path / "checkpoint.jsonl", encoding="utf-8")]
+    assert {record["status"] for record in records} == {"done"}
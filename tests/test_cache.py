@@ -0,0 +1,47 @@
+# agent/tests/test_cache.py
+
+import pytest
+
+from agent.cache import Cache, cached
+from agent.config import CACHE_TTL
+
+SHARED = "x" * 4000
+OTHER = "y" * 4000
+
+
+def make_cache(tmp_path, max_bytes):
+    cache = Cache(path=str(tmp_path / "cache.sqlite3"), max_bytes=max_bytes, ttl={"page": 3600})
+    for n, (key, value) in enumerate([("a", SHARED), ("b", SHARED), ("c", OTHER)]):
+        cache.set("page", key, value)
+        with cache._connect() as conn:  # Oldest first: a, b, c
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (n, key))
+    return cache
+
+
+def test_shared_blob_is_stored_once(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=10 ** 9)
+    cache.evict()
+    assert cache.stats()["entries"] == 3
+    assert cache.stats()["bytes"] < 3 * len(SHARED)
+
+
+def test_evict_frees_a_shared_blob_only_with_its_last_entry(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=5000)  # Room for one blob
+    cache.evict()
+    stats = cache.stats()
+    assert stats["bytes"] <= 5000
+    assert stats["entries"] == 1  # Deleting "a" alone freed nothing; "b" had to go too
+    assert cache.get("page", "c").value == OTHER
+    assert cache.get("page", "b") is None
+
+
+def test_namespace_without_ttl_fails_loudly(tmp_path):
+    cache = Cache(path=str(tmp_path / "cache.sqlite3"), ttl={"page": 3600})
+    with pytest.raises(KeyError, match="arxiv_pdf"):
+        cache.get("arxiv_pdf", "key")
+    with pytest.raises(ValueError, match="unknown"):
+        cached("unknown")
+
+
+def test_every_cached_source_has_a_ttl():
+    assert {"web_search", "web_page", "arxiv", "arxiv_pdf", "pubmed", "llm"} <= set(CACHE_TTL)
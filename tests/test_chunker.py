@@ -0,0 +1,23 @@
+# agent/tests/test_chunker.py
+
+from langchain_core.documents import Document
+
+from agent.chunker import chunk_text, get_token_counter, iter_chunks
+
+TEXT = " ".join(f"Radiologists reviewed scan number {n} with an AI assistant." for n in range(200))
+
+
+def test_character_sizing_is_the_default():
+    chunks = chunk_text(TEXT, chunk_size=200, chunk_overlap=20)
+    assert all(len(chunk.page_content) <= 200 for chunk in chunks)
+    assert [c.page_content for c in iter_chunks([Document(page_content=TEXT)], 200, 20)] == [c.page_content for c in chunks]
+
+
+def test_token_sizing_is_passed_through():
+    count = get_token_counter()
+    by_tokens = chunk_text(TEXT, chunk_size=200, chunk_overlap=20, metadata={"source": "scan"}, token_sizing=True)
+    assert all(count(chunk.page_content) <= 200 for chunk in by_tokens)
+    assert max(len(chunk.page_content) for chunk in by_tokens) > 200  # Tokens are longer than characters
+    streamed = list(iter_chunks([Document(page_content=TEXT, metadata={"source": "scan"})], 200, 20, token_sizing=True))
+    assert [c.page_content for c in streamed] == [c.page_content for c in by_tokens]
+    assert streamed[0].metadata == {"source": "scan"}
@@ -0,0 +1,75 @@
+# agent/tests/test_context.py
+
+import random
+
+from langchain_core.documents import Document
+
+from agent.context import ContextStats, _count_tokens, pack_context, split_sentences
+
+
+def corpus(seed=0):
+    rng = random.Random(seed)
+    words = [f"term{n}" for n in range(300)]
+    facts = [" ".join(rng.choices(words, k=rng.randint(8, 20))).capitalize() + "." for _ in range(40)]
+    return [
+        Document(page_content=" ".join(rng.sample(facts, 10)), metadata={"source": f"https://example.org/{n}"})
+        for n in range(6)
+    ]
+
+
+def test_budget_is_never_exceeded():
+    count = _count_tokens()
+    for seed in range(5):
+        chunks = corpus(seed)
+        for budget in (20, 50, 120, 300, 800):
+            stats = ContextStats()
+            context = pack_context("What does term3 do?", chunks, budget=budget, stats=stats)
+            assert count(context) <= budget
+            assert stats.packed_tokens == count(context)
+
+
+def test_near_duplicate_sentences_are_dropped():
+    chunks = [
+        Document(page_content="Deep learning detects diabetic retinopathy in fundus photographs. Screening is cheap.",
+                 metadata={"source": "a"}),
+        Document(page_content="Deep learning detects diabetic retinopathy in fundus photographs too. Sensitivity was high.",
+                 metadata={"source": "b"}),
+    ]
+    stats = ContextStats()
+    context = pack_context("retinopathy", chunks, budget=0, stats=stats)
+    assert context.count("Deep learning detects") == 1
+    assert stats.redundant == 1
+    assert stats.sentences == 3
+
+
+def test_source_tags_are_preserved_in_original_order():
+    chunks = [
+        Document(page_content="Alpha finding one. Alpha finding two.", metadata={"source": "https://a.example"}),
+        Document(page_content="Beta result here.", metadata={"source": "https://b.example"}),
+        Document(page_content="Untagged chunk text.", metadata={}),
+    ]
+    context = pack_context("query", chunks, budget=0)
+    assert context == (
+        "[https://a.example] Alpha finding one. Alpha finding two.\n\n"
+        "[https://b.example] Beta result here.\n\n"
+        "[unknown] Untagged chunk text."
+    )
+
+
+def test_stats_report_saved_tokens():
+    chunks = corpus(1)
+    count = _count_tokens()
+    stats = ContextStats()
+    context = pack_context("term5", chunks, budget=100, stats=stats)
+    assert stats.original_tokens == sum(count(chunk.page_content) for chunk in chunks)
+    assert stats.saved == stats.original_tokens - count(context) > 0
+    assert stats.over_budget > 0
+    assert stats.as_dict()["saved"] == stats.saved
+    assert "saved" in str(stats)
+    assert str(ContextStats()) == "no context"
+
+
+def test_split_sentences():
+    assert split_sentences("First one. Second (two)! 3 is a number? Yes\nnew line") == [
+        "First one.", "Second (two)!", "3 is a number?", "Yes", "new line",
+    ]
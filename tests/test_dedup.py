@@ -0,0 +1,57 @@
+# agent/tests/test_dedup.py
+
+import threading
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from langchain_core.documents import Document
+
+from agent import pipeline
+from agent.dedup import NearDuplicateFilter
+from agent.numpy_store import NumpyVectorStore
+from agent.orchestrator import FanOut
+
+TEXT = "Deep learning models flagged diabetic retinopathy in fundus photographs with high sensitivity and specificity. " * 3
+
+
+class LengthEmbedder:
+    """
+    Deterministic local embedder; retrieval quality does not matter here.
+    """
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+def test_merge_replaces_the_metadata_dict():
+    dedup = NearDuplicateFilter()
+    kept = Document(page_content=TEXT, metadata={"source": "https://a.example"})
+    snapshot = kept.metadata
+    assert dedup.add(kept)
+    assert not dedup.add(Document(page_content=TEXT, metadata={"source": "https://b.example"}))
+    assert snapshot == {"source": "https://a.example"}  # A store copying the old dict saw a consistent one
+    assert kept.metadata["sources"].splitlines() == ["https://a.example", "https://b.example"]
+    assert dedup.pop_updates() == ([], [])  # Not stored yet, so nothing to write back
+
+
+def test_sources_merged_after_storing_reach_the_stored_record(monkeypatch):
+    urls = iter(["https://a.example", "https://b.example"])
+    monkeypatch.setattr(pipeline, "search_web", lambda query, max_results=3: [{"url": next(urls), "title": "", "snippet": ""}])
+    monkeypatch.setattr(pipeline, "extract_web_page", lambda url: TEXT)
+    monkeypatch.setattr(pipeline, "search_arxiv", lambda query, max_results=2: [])
+    monkeypatch.setattr(pipeline, "get_pubmed_abstracts", lambda query, max_results=1: [])
+    monkeypatch.setattr(pipeline, "stream_answer", lambda subq, chunks, metrics, context_stats=None: iter(["answer"]))
+
+    store = NumpyVectorStore(LengthEmbedder())
+    dedup = NearDuplicateFilter()
+    with FanOut() as fanout:
+        for subq in ("First sub-question?", "Second sub-question?"):  # The second finds only a copy of the first's page
+            pipeline.research_subquestion(subq, fanout, store, threading.Lock(), dedup)
+    assert dedup.removed > 0
+    stored = [store.metadatas[row] for row in store._rows.values()]
+    assert stored and all(meta["sources"].splitlines() == ["https://a.example", "https://b.example"] for meta in stored)
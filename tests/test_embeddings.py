@@ -0,0 +1,77 @@
+# agent/tests/test_embeddings.py
+
+import hashlib
+import threading
+
+import pytest
+
+from agent.embeddings import CachedEmbeddings, VectorStore
+
+
+class CountingEmbedder:
+    """
+    Deterministic local embedder: vectors derived from the text's MD5, with every call and text counted.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.texts = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls += 1
+            self.texts.extend(texts)
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    @staticmethod
+    def vector(text):
+        return [float(b) for b in hashlib.md5(text.encode("utf-8")).digest()[:8]]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "vectors.sqlite3")
+
+
+def test_second_call_is_served_from_the_cache(path):
+    fake = CountingEmbedder()
+    cached = CachedEmbeddings(fake, "fake@1", store=VectorStore(path), batch_size=4, concurrency=2)
+    texts = [f"chunk {n}" for n in range(10)]
+    assert cached.embed_documents(texts) == [CountingEmbedder.vector(t) for t in texts]
+    assert fake.calls == 3  # Batches of 4, 4 and 2
+    assert cached.stats == {"texts": 10, "hits": 0, "duplicates": 0, "embedded": 10, "batches": 3}
+
+    assert cached.embed_documents(texts[:6] + ["chunk new"]) == [CountingEmbedder.vector(t) for t in texts[:6] + ["chunk new"]]
+    assert fake.texts[10:] == ["chunk new"]  # Only the miss went to the embedder
+    assert cached.stats["hits"] == 6
+    assert cached.embed_query("chunk 3") == CountingEmbedder.vector("chunk 3")
+    assert fake.calls == 4
+
+
+def test_identical_texts_in_a_batch_are_embedded_once(path):
+    fake = CountingEmbedder()
+    cached = CachedEmbeddings(fake, "fake@1", store=VectorStore(path))
+    texts = ["same text", "other text", "same text", "same text"]
+    vectors = cached.embed_documents(texts)
+    assert vectors[0] == vectors[2] == vectors[3] != vectors[1]
+    assert sorted(fake.texts) == ["other text", "same text"]
+    assert cached.stats["duplicates"] == 2
+
+
+def test_cache_survives_a_restart(path):
+    first = CountingEmbedder()
+    CachedEmbeddings(first, "fake@1", store=VectorStore(path)).embed_documents(["persisted one", "persisted two"])
+
+    second = CountingEmbedder()  # A new process: fresh store object and wrapper on the same file
+    restarted = CachedEmbeddings(second, "fake@1", store=VectorStore(path))
+    vectors = restarted.embed_documents(["persisted two", "persisted one"])
+    assert second.calls == 0
+    assert vectors == [pytest.approx(CountingEmbedder.vector(t)) for t in ("persisted two", "persisted one")]
+
+    retagged = CachedEmbeddings(second, "fake@2", store=VectorStore(path))  # Another model version never reuses them
+    retagged.embed_documents(["persisted one"])
+    assert second.texts == ["persisted one"]
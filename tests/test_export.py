@@ -0,0 +1,28 @@
+# agent/tests/test_export.py
+
+import pytest
+
+from agent import export
+
+
+def test_failed_render_releases_its_entry(monkeypatch):
+    calls = []
+
+    def broken(report):
+        calls.append(report)
+        raise RuntimeError("renderer crashed")
+
+    monkeypatch.setitem(export.FORMATS, "txt", ("Plain text", "txt", "text/plain", broken))
+    report = "# Report that fails to render\n"
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            export.render(report, "txt")
+    assert len(calls) == 2  # Failures are not memoized
+    assert export._rendering == {}
+
+
+def test_render_is_memoized():
+    report = "# Memoized report\n"
+    first = export.render(report, "md")
+    assert export.render(report, "md") is first
+    assert export._rendering == {}
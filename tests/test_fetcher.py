@@ -0,0 +1,100 @@
+# agent/tests/test_fetcher.py
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from agent import fetcher
+from agent.orchestrator import FanOut, SourceTimeout
+
+PAGE = b"<html><body><p>AI improves diagnostic accuracy in radiology.</p></body></html>"
+
+
+class Server:
+    """
+    Local http.server stand-in: replies with the queued status codes in turn (then 200),
+    after `delay` seconds, and counts the requests it receives.
+    """
+
+    def __init__(self):
+        self.statuses = []
+        self.delay = 0.0
+        self.hits = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.hits += 1
+                time.sleep(server.delay)
+                status = server.statuses.pop(0) if server.statuses else 200
+                body = PAGE if status == 200 else b"busy"
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/page"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(fetcher, "_session", None)  # A fresh pooled session built with the settings below
+    monkeypatch.setattr(fetcher, "FETCH_RETRIES", 2)
+    monkeypatch.setattr(fetcher, "FETCH_BACKOFF", 0)
+    server = Server()
+    yield server
+    server.close()
+
+
+def test_busy_replies_are_retried_on_the_pooled_session(server):
+    server.statuses = [503, 502]
+    assert fetcher.fetch(server.url) == PAGE
+    assert server.hits == 3
+
+
+def test_retries_give_up_with_the_last_status(server):
+    server.statuses = [503] * 5
+    with pytest.raises(requests.HTTPError):
+        fetcher.fetch(server.url)
+    assert server.hits == 3  # The first attempt plus FETCH_RETRIES
+
+
+def test_read_timeout_is_not_retried(server):
+    server.delay = 0.5
+    start = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        fetcher.fetch(server.url, timeout=0.1)
+    assert time.monotonic() - start < 0.45
+    assert server.hits == 1
+
+
+def test_fetch_many_returns_errors_in_place(server):
+    server.statuses = [404]  # Not retried
+    results = fetcher.fetch_many([server.url, server.url], max_workers=1)
+    assert isinstance(results[0], requests.HTTPError)
+    assert results[1] == PAGE
+
+
+def test_source_timeout_bounds_a_slow_fetch(server):
+    server.delay = 0.5
+    with FanOut(timeout=0.1) as fanout:
+        start = time.monotonic()
+        with pytest.raises(SourceTimeout):
+            fanout.call(fetcher.fetch, server.url)
+        assert time.monotonic() - start < 0.45
@@ -0,0 +1,140 @@
+# agent/tests/test_gather_academic.py
+
+import io
+
+from agent import gather_academic
+from agent.config import PUBMED_BATCH
+from agent.gather_academic import iter_pubmed_records, parse_arxiv_atom, parse_pubmed_xml
+
+STRUCTURED = b"""<?xml version="1.0" ?>
+<PubmedArticleSet>
+<PubmedArticle>
+  <MedlineCitation Status="MEDLINE"><PMID Version="1">31000001</PMID>
+    <Article>
+      <Journal><JournalIssue><PubDate><Year>2021</Year></PubDate></JournalIssue><Title>Radiology</Title></Journal>
+      <ArticleTitle>Deep learning for <i>chest</i> radiographs</ArticleTitle>
+      <ELocationID EIdType="doi">10.1148/wrong.elocation</ELocationID>
+      <Abstract>
+        <AbstractText Label="BACKGROUND">Readers miss nodules.</AbstractText>
+        <AbstractText Label="RESULTS">Sensitivity rose, <i>p</i> &lt; 0.05.</AbstractText>
+      </Abstract>
+    </Article>
+  </MedlineCitation>
+  <PubmedData>
+    <ArticleIdList><ArticleId IdType="pubmed">31000001</ArticleId><ArticleId IdType="doi">10.1148/radiol.31000001</ArticleId></ArticleIdList>
+    <ReferenceList><Reference><ArticleIdList><ArticleId IdType="doi">10.9999/a.reference</ArticleId></ArticleIdList></Reference></ReferenceList>
+  </PubmedData>
+</PubmedArticle>
+<PubmedArticle>
+  <MedlineCitation><PMID Version="1">31000002</PMID>
+    <Article>
+      <Journal><JournalIssue><PubDate><MedlineDate>2019 Nov-Dec</MedlineDate></PubDate></JournalIssue><Title>Lancet</Title></Journal>
+      <ArticleTitle>Unstructured abstract</ArticleTitle>
+      <ELocationID EIdType="pii">S0140</ELocationID>
+      <ELocationID EIdType="doi">10.1016/ahead.of.print</ELocationID>
+      <Abstract><AbstractText>One plain paragraph.</AbstractText></Abstract>
+    </Article>
+  </MedlineCitation>
+  <PubmedData><ArticleIdList><ArticleId IdType="pubmed">31000002</ArticleId></ArticleIdList></PubmedData>
+</PubmedArticle>
+<PubmedArticle><MedlineCitation><PMID>31000003</PMID><Article><ArticleTitle>No abstract</ArticleTitle></Article></MedlineCitation></PubmedArticle>
+</PubmedArticleSet>
+"""
+
+ATOM_FEED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom">
+  <title>query results</title>
+  <entry>
+    <id>http://arxiv.org/abs/2101.00001v2</id>
+    <published>2021-01-04T10:00:00Z</published>
+    <title>Transformers for
+      mammography</title>
+    <summary>  We screen
+      breast cancer.  </summary>
+    <author><name>Ada Lovelace</name></author>
+    <author><name>Alan Turing</name></author>
+    <arxiv:doi>10.48550/arXiv.2101.00001</arxiv:doi>
+  </entry>
+  <entry>
+    <id>http://arxiv.org/abs/2101.00002v1</id>
+    <title>Bare entry</title>
+  </entry>
+</feed>
+"""
+
+
+def test_pubmed_records_keep_sections_and_identifiers():
+    first, second, third = parse_pubmed_xml(io.BytesIO(STRUCTURED))
+    assert first == {
+        'pmid': "31000001",
+        'doi': "10.1148/radiol.31000001",  # ArticleIdList wins over ELocationID, and references are ignored
+        'title': "Deep learning for chest radiographs",
+        'abstract': "BACKGROUND: Readers miss nodules.\nRESULTS: Sensitivity rose, p < 0.05.",
+        'journal': "Radiology",
+        'year': "2021",
+        'url': "https://pubmed.ncbi.nlm.nih.gov/31000001/",
+    }
+    assert second['abstract'] == "One plain paragraph."
+    assert second['doi'] == "10.1016/ahead.of.print"  # No DOI in ArticleIdList: falls back to the electronic location
+    assert (second['journal'], second['year']) == ("Lancet", "2019")
+    assert third['abstract'] == "" and third['doi'] == "" and third['year'] == ""
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.raw = io.BytesIO(body)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    """
+    Stands in for the pooled session: answers efetch with one minimal record per requested PMID.
+    """
+
+    def __init__(self):
+        self.batches = []
+
+    def get(self, url, params=None, stream=False, timeout=None):
+        ids = params["id"].split(",")
+        self.batches.append(ids)
+        articles = "".join(
+            f"<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID><Article><ArticleTitle>T{pmid}</ArticleTitle>"
+            f"<Abstract><AbstractText>Abstract {pmid}</AbstractText></Abstract></Article></MedlineCitation></PubmedArticle>"
+            for pmid in ids
+        )
+        return FakeResponse(f"<PubmedArticleSet>{articles}</PubmedArticleSet>".encode("utf-8"))
+
+
+def test_pubmed_fetches_are_batched(monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(gather_academic, "get_session", lambda: session)
+    ids = [str(n) for n in range(PUBMED_BATCH + 3)]
+    records = list(iter_pubmed_records(ids))
+    assert [len(batch) for batch in session.batches] == [PUBMED_BATCH, 3]
+    assert [record['pmid'] for record in records] == ids
+
+
+def test_arxiv_entries_with_missing_fields():
+    full, bare = parse_arxiv_atom(io.BytesIO(ATOM_FEED))
+    assert full.page_content == "We screen breast cancer."
+    assert full.metadata == {
+        'source': "http://arxiv.org/abs/2101.00001v2",
+        'arxiv_id': "2101.00001v2",
+        'Title': "Transformers for mammography",
+        'Authors': "Ada Lovelace, Alan Turing",
+        'Published': "2021-01-04",
+        'doi': "10.48550/arXiv.2101.00001",
+    }
+    assert bare.page_content == ""
+    assert bare.metadata == {
+        'source': "http://arxiv.org/abs/2101.00002v1", 'arxiv_id': "2101.00002v1",
+        'Title': "Bare entry", 'Authors': "", 'Published': "", 'doi': "",
+    }
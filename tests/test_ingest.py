@@ -0,0 +1,87 @@
+# agent/tests/test_ingest.py
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("numpy")
+fitz = pytest.importorskip("fitz")
+
+from agent import ingest
+from agent.numpy_store import NumpyVectorStore
+
+
+class LengthEmbedder:
+    """
+    Deterministic local embedder; retrieval quality does not matter here.
+    """
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+def write_pdf(path, pages):
+    with fitz.open() as pdf:
+        for text in pages:
+            page = pdf.new_page()
+            if text:
+                page.insert_text((72, 72), text)
+        pdf.save(str(path))
+
+
+def test_sync_feeds_every_changed_file_to_one_pool(tmp_path, monkeypatch):
+    folder = tmp_path / "pdfs"
+    folder.mkdir()
+    write_pdf(folder / "a.pdf", ["Alpha page one.", "Alpha page two."])
+    write_pdf(folder / "b.pdf", [""])  # No text layer: no chunks
+    write_pdf(folder / "c.pdf", ["Gamma page one."])
+    pools = []
+
+    def open_pool():
+        pools.append(ThreadPoolExecutor(max_workers=2))  # Same interface as the spawned process pool
+        return pools[-1]
+
+    monkeypatch.setattr(ingest, "open_pool", open_pool)
+    store = NumpyVectorStore(LengthEmbedder())
+    summary = ingest.sync_folder(str(folder), store, str(tmp_path / "index"), log=lambda message: None)
+
+    assert len(pools) == 1
+    assert summary == {"added": 3, "updated": 0, "removed": 0, "unchanged": 0, "chunks": 3}
+    manifest = ingest.load_manifest(str(tmp_path / "index"))
+    assert {path.rsplit("/", 1)[-1]: entry["chunks"] for path, entry in manifest.items()} == {"a.pdf": 2, "b.pdf": 0, "c.pdf": 1}
+    assert sorted(doc.metadata["source"].rsplit("/", 1)[-1] for doc in store.similarity_search("x", k=10)) == ["a.pdf", "a.pdf", "c.pdf"]
+
+    assert ingest.sync_folder(str(folder), store, str(tmp_path / "index"), log=lambda message: None)["unchanged"] == 3
+    assert len(pools) == 1  # Nothing changed: no pool is started
+
+
+class StrictStore(NumpyVectorStore):
+    """
+    Rejects an empty delete, as Chroma does.
+    """
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            raise ValueError("Expected IDs to be a non-empty list")
+        return super().delete(ids=ids, **kwargs)
+
+
+def test_sync_skips_deleting_chunks_of_files_that_had_none(tmp_path, monkeypatch):
+    folder = tmp_path / "pdfs"
+    folder.mkdir()
+    write_pdf(folder / "blank.pdf", [""])
+    write_pdf(folder / "gone.pdf", [""])
+    monkeypatch.setattr(ingest, "open_pool", lambda: ThreadPoolExecutor(max_workers=2))
+    store = StrictStore(LengthEmbedder())
+    index_dir = str(tmp_path / "index")
+    assert ingest.sync_folder(str(folder), store, index_dir, log=lambda message: None)["chunks"] == 0
+
+    write_pdf(folder / "blank.pdf", ["Now with text."])
+    (folder / "gone.pdf").unlink()
+    summary = ingest.sync_folder(str(folder), store, index_dir, log=lambda message: None)
+
+    assert summary == {"added": 0, "updated": 1, "removed": 1, "unchanged": 0, "chunks": 1}
+    assert [doc.page_content for doc in store.similarity_search("x", k=10)] == ["Now with text."]
@@ -0,0 +1,145 @@
+# agent/tests/test_llm.py
+
+import threading
+import time
+from itertools import islice
+
+import pytest
+
+from agent import llm as llm_module
+from agent.cache import Cache
+from agent.llm import LLMClient
+from agent.planner import stream_subquestions
+from agent.streaming import StreamMetrics
+from agent.synthesis import stream_answer
+
+
+class FakeLLM:
+    """
+    Stands in for OllamaLLM: streams a fixed reply word by word and counts calls and concurrency.
+    """
+
+    def __init__(self, reply="1. First?\n2. Second?\n3. Third?\n4. Fourth?\n", delay=0.0):
+        self.reply = reply
+        self.delay = delay
+        self.calls = 0
+        self.tokens_sent = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def stream(self, prompt):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            for word in self.reply.split(" "):
+                time.sleep(self.delay)
+                with self._lock:
+                    self.tokens_sent += 1
+                yield word + " "
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = Cache(path=str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(llm_module, "get_cache", lambda: cache)
+    return cache
+
+
+def make_client(fake, **params):
+    client = LLMClient("fake-model", **params)
+    client._llm = fake
+    return client
+
+
+def test_completion_is_cached_and_counted(cache):
+    fake = FakeLLM()
+    client = make_client(fake, temperature=0)
+    first = client.invoke("plan this")
+    second = client.invoke("plan this")
+    assert first == second
+    assert fake.calls == 1
+    assert client.stats["calls"] == 2
+    assert client.stats["generated"] == 1
+    assert client.stats["cache_hits"] == 1
+
+
+def test_early_close_still_caches_the_whole_completion(cache):
+    fake = FakeLLM()
+    client = make_client(fake, temperature=0)
+    for _ in range(2):  # The planner cut off after two sub-questions, twice
+        subquestions = list(islice(stream_subquestions("query", llm=client), 2))
+        assert subquestions == ["First?", "Second?"]
+    assert fake.calls == 1
+    assert fake.tokens_sent == len(fake.reply.split(" "))  # The abandoned stream was read to the end
+    assert client.stats["generated"] == 1
+    assert client.stats["cache_hits"] == 1
+    assert client.invoke("another prompt", use_cache=False)  # The parallel slot was released
+    assert len(list(stream_subquestions("query", llm=client))) == 4  # The cached entry is the full list
+
+
+def test_unset_temperature_is_not_cached(cache):
+    fake = FakeLLM()
+    client = make_client(fake)  # Ollama would sample at its default temperature
+    client.invoke("plan this")
+    client.invoke("plan this")
+    assert fake.calls == 2
+    assert client.stats["cache_hits"] == 0
+
+
+def test_seed_makes_sampling_cacheable(cache):
+    fake = FakeLLM()
+    client = make_client(fake, temperature=0.8, seed=7)
+    client.invoke("plan this")
+    client.invoke("plan this")
+    assert fake.calls == 1
+
+
+def test_generations_share_the_parallel_slots(cache, monkeypatch):
+    monkeypatch.setattr(llm_module, "_slots", threading.BoundedSemaphore(2))
+    fake = FakeLLM(reply="a b c d", delay=0.01)
+    clients = [make_client(fake, temperature=0), make_client(fake, temperature=0, seed=1)]
+    threads = [
+        threading.Thread(target=clients[i % 2].invoke, args=(f"prompt {i}",), kwargs={"use_cache": False})
+        for i in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert fake.calls == 6
+    assert fake.max_active == 2
+
+
+def test_answer_streams_with_timing_metrics():
+    fake = FakeLLM(reply="Screening improved recall in every cohort studied.", delay=0.01)
+    metrics = StreamMetrics()
+    tokens = list(stream_answer("Does screening help?", [], metrics, llm=fake))
+    assert "".join(tokens).strip() == fake.reply
+    assert metrics.tokens == len(tokens) == 7
+    assert 0 < metrics.ttft <= metrics.total
+    assert metrics.tokens_per_sec > 0
+
+
+def test_planner_yields_each_subquestion_before_the_list_is_done():
+    fake = FakeLLM(delay=0.001)
+    seen = []
+    for subq in stream_subquestions("query", llm=fake):
+        seen.append((subq, fake.tokens_sent))
+    assert [subq for subq, _ in seen] == ["First?", "Second?", "Third?", "Fourth?"]
+    assert seen[0][1] < len(fake.reply.split(" "))  # The first arrived while the model was still generating
+
+
+def test_default_client_keeps_ollama_sampling_unless_opted_in(monkeypatch):
+    monkeypatch.setattr(llm_module, "_clients", {})
+    assert llm_module.get_default_llm().params == {}
+    assert not llm_module.get_default_llm().deterministic
+    monkeypatch.setattr(llm_module, "LLM_SEED", 42)
+    assert llm_module.get_default_llm().params == {"seed": 42}
+    monkeypatch.setattr(llm_module, "LLM_TEMPERATURE", 0.0)
+    assert llm_module.get_default_llm().deterministic
@@ -0,0 +1,120 @@
+# agent/tests/test_numpy_store.py
+
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from langchain_core.documents import Document
+
+from agent import numpy_store
+from agent.numpy_store import LOG_NAME, NumpyVectorStore
+
+
+class TableEmbeddings:
+    """
+    Deterministic local embedder: each text maps to a fixed random vector; calls are counted.
+    """
+
+    def __init__(self, dim=16, table=None):
+        self.dim = dim
+        self.table = table if table is not None else {}
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        if text not in self.table:
+            seed = int.from_bytes(text.encode("utf-8")[-8:].rjust(8, b"\0"), "little")
+            self.table[text] = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return self.table[text]
+
+
+def docs(n, start=0, sources=("a", "b", "c")):
+    return [Document(page_content=f"doc{i}", metadata={"source": sources[i % len(sources)]}) for i in range(start, start + n)]
+
+
+def texts(results):
+    return [doc.page_content for doc in results]
+
+
+def test_capacity_doubles_and_keeps_rows(monkeypatch):
+    monkeypatch.setattr(numpy_store, "MIN_CAPACITY", 4)
+    store = NumpyVectorStore(TableEmbeddings())
+    store.add_documents(docs(3))
+    assert store._vectors.shape[0] == 4
+    store.add_documents(docs(2, start=3))
+    assert store._vectors.shape[0] == 8
+    store.add_documents(docs(9, start=5))
+    assert store._vectors.shape[0] == 16
+    assert len(store) == 14
+    for i in (0, 4, 13):  # Rows copied across every reallocation
+        assert texts(store.similarity_search(f"doc{i}", k=1)) == [f"doc{i}"]
+
+
+def test_persistence_and_reload_after_delete(tmp_path, monkeypatch):
+    monkeypatch.setattr(numpy_store, "MIN_CAPACITY", 4)
+    path = str(tmp_path / "index")
+    embeddings = TableEmbeddings()
+    store = NumpyVectorStore(embeddings, persist_directory=path)
+    ids = store.add_documents(docs(6))
+    store.delete(ids=ids[:2])
+    store.delete(ids=[])  # No-op: nothing is logged
+    with open(os.path.join(path, LOG_NAME), encoding="utf-8") as f:
+        assert [line.count('"op": "delete"') for line in f].count(1) == 1
+
+    reloaded = NumpyVectorStore(TableEmbeddings(table=embeddings.table), persist_directory=path)
+    assert len(reloaded) == 4
+    assert sorted(reloaded._rows) == sorted(ids[2:])
+    assert texts(reloaded.similarity_search("doc3", k=1)) == ["doc3"]
+    assert "doc0" not in texts(reloaded.similarity_search("doc0", k=6))
+    assert isinstance(reloaded._vectors, np.memmap)
+
+
+def test_source_filter():
+    store = NumpyVectorStore(TableEmbeddings())
+    store.add_documents(docs(9))
+    assert {d.metadata["source"] for d in store.similarity_search("doc0", k=9, filter={"source": "b"})} == {"b"}
+    both = store.similarity_search("doc0", k=9, filter={"source": {"$in": ["a", "c"]}})
+    assert len(both) == 6 and {d.metadata["source"] for d in both} == {"a", "c"}
+    assert store.similarity_search("doc0", k=9, filter={"source": "missing"}) == []
+    with pytest.raises(ValueError):
+        store.similarity_search("doc0", filter={"title": "x"})
+
+
+def test_update_reuses_vectors_when_only_metadata_changes():
+    embeddings = TableEmbeddings()
+    store = NumpyVectorStore(embeddings)
+    ids = store.add_documents(docs(3))
+    calls = embeddings.calls
+    store.update_documents([ids[0]], [Document(page_content="doc0", metadata={"source": "a", "sources": "a\nz"})])
+    assert embeddings.calls == calls
+    assert store.similarity_search("doc0", k=1)[0].metadata["sources"] == "a\nz"
+    store.update_documents([ids[1]], [Document(page_content="new text", metadata={"source": "b"})])
+    assert embeddings.calls == calls + 1
+    assert len(store) == 3
+    assert texts(store.similarity_search("new text", k=1)) == ["new text"]
+
+
+def test_ivf_recall_against_brute_force():
+    rng = np.random.default_rng(3)
+    dim, n = 32, 4000
+    topics = rng.standard_normal((40, dim)).astype(np.float32)
+    corpus = topics[rng.integers(0, len(topics), n)] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+    table = {f"doc{i}": corpus[i] for i in range(n)}
+    queries = [corpus[i] + 0.05 * rng.standard_normal(dim).astype(np.float32) for i in rng.choice(n, 30)]
+    documents = [Document(page_content=f"doc{i}", metadata={"source": "s"}) for i in range(n)]
+
+    exact = NumpyVectorStore(TableEmbeddings(dim, table), ivf_threshold=n + 1)
+    ivf = NumpyVectorStore(TableEmbeddings(dim, table), ivf_threshold=0, nprobe=8)
+    exact.add_documents(documents)
+    ivf.add_documents(documents)
+    k = 5
+    expected = exact.similarity_search_by_vectors(queries, k=k)
+    got = ivf.similarity_search_by_vectors(queries, k=k)
+    assert ivf._ivf is not None
+    recall = np.mean([len(set(texts(a)) & set(texts(b))) / k for a, b in zip(expected, got)])
+    assert recall >= 0.9
@@ -0,0 +1,135 @@
+# agent/tests/test_orchestrator.py
+
+import threading
+import time
+
+import pytest
+
+from agent.orchestrator import Cancelled, FanOut, SourceTimeout
+
+
+class Gauge:
+    """
+    Counts how many stand-in calls run at once.
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def sleep(self, delay, value=None):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(delay)
+            return value
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def test_map_returns_input_order_while_completing_out_of_order():
+    delays = [0.3, 0.2, 0.1, 0.0]
+    events = []
+    with FanOut(subq_workers=4) as fanout:
+        results = fanout.map(
+            lambda delay: time.sleep(delay) or delay, delays,
+            on_submit=lambda i, item: events.append(("submit", i)),
+            on_result=lambda i, result, error: events.append(("result", i)),
+        )
+    assert results == delays
+    assert [i for kind, i in events if kind == "result"] == [3, 2, 1, 0]
+    assert [i for kind, i in events if kind == "submit"] == [0, 1, 2, 3]
+    for i in range(4):
+        assert events.index(("submit", i)) < events.index(("result", i))
+
+
+def test_map_reports_failures_as_none():
+    errors = {}
+
+    def work(n):
+        if n == 1:
+            raise ValueError("bad item")
+        return n
+
+    with FanOut() as fanout:
+        results = fanout.map(work, [0, 1, 2], on_result=lambda i, result, error: errors.setdefault(i, error))
+    assert results == [0, None, 2]
+    assert isinstance(errors[1], ValueError) and errors[0] is None
+
+
+def test_generator_items_start_before_the_generator_finishes():
+    first_done = threading.Event()
+    produced = []
+
+    def items():
+        for n in range(3):
+            produced.append(n)
+            yield n
+            if n == 0:
+                assert first_done.wait(2)  # Item 0 completes while the generator is still producing
+
+    def work(n):
+        if n == 0:
+            first_done.set()
+        return n * 10
+
+    with FanOut() as fanout:
+        assert fanout.map(work, items()) == [0, 10, 20]
+    assert produced == [0, 1, 2]
+
+
+def test_generator_errors_surface_after_submitted_items_finish():
+    def items():
+        yield 1
+        raise RuntimeError("planner failed")
+
+    done = []
+    with FanOut() as fanout:
+        with pytest.raises(RuntimeError, match="planner failed"):
+            fanout.map(lambda n: n, items(), on_result=lambda i, result, error: done.append(result))
+    assert done == [1]
+
+
+def test_source_calls_share_a_global_worker_cap():
+    gauge = Gauge()
+    with FanOut(max_workers=2, subq_workers=3) as fanout:
+        def subquestion(n):
+            results, errors = fanout.gather({f"source{k}": lambda k=k: gauge.sleep(0.05, k) for k in range(3)})
+            assert not errors
+            return sorted(results.values())
+
+        assert fanout.map(subquestion, range(3)) == [[0, 1, 2]] * 3
+    assert gauge.peak == 2
+
+
+def test_subquestion_workers_bound_map():
+    gauge = Gauge()
+    with FanOut(subq_workers=2) as fanout:
+        fanout.map(lambda n: gauge.sleep(0.05, n), range(6))
+    assert gauge.peak == 2
+
+
+def test_timeout_abandons_only_the_slow_source():
+    with FanOut(timeout=0.2) as fanout:
+        start = time.monotonic()
+        results, errors = fanout.gather({"fast": lambda: time.sleep(0.01) or "ok", "slow": lambda: time.sleep(1) or "late"})
+        assert time.monotonic() - start < 0.6
+    assert results == {"fast": "ok"}
+    assert isinstance(errors["slow"], SourceTimeout)
+
+
+def test_timeout_counts_from_when_a_call_starts():
+    with FanOut(max_workers=1, timeout=0.25) as fanout:  # The second call queues behind the first
+        results, errors = fanout.gather({"a": lambda: time.sleep(0.15) or "a", "b": lambda: time.sleep(0.15) or "b"})
+    assert errors == {}
+    assert results == {"a": "a", "b": "b"}
+
+
+def test_cancel_stops_new_work():
+    with FanOut() as fanout:
+        fanout.cancel()
+        with pytest.raises(Cancelled):
+            fanout.call(lambda: "never")
@@ -0,0 +1,76 @@
+# agent/tests/test_pdf_retrieval.py
+
+import threading
+import zlib
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from langchain_core.documents import Document
+
+from agent import pipeline
+from agent.dedup import NearDuplicateFilter
+from agent.numpy_store import NumpyVectorStore
+from agent.orchestrator import FanOut
+from agent.retrieval import tokenize
+from agent.synthesis import build_prompt
+from agent.vectorstore import query_vectorstore
+
+PDF_TEXT = (
+    "Mammography screening read with convolutional networks reduced false negatives "
+    "in breast cancer detection across three hospitals."
+)
+WEB_TEXT = "The hospital cafeteria opens at seven and the parking garage has two hundred spaces for visitors. " * 3
+
+
+class BagOfWords:
+    """
+    Deterministic local embedder: hashed word counts, so texts sharing words are close.
+    """
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        vector = [0.0] * 64
+        for word in tokenize(text):
+            vector[zlib.crc32(word.encode("utf-8")) % 64] += 1.0
+        return vector
+
+
+@pytest.fixture
+def library():
+    store = NumpyVectorStore(BagOfWords())
+    store.add_documents([Document(page_content=PDF_TEXT, metadata={"source": "docs/mammography.pdf", "page": 3})])
+    return store
+
+
+def test_library_results_are_fused_into_retrieval(library):
+    store = NumpyVectorStore(BagOfWords())
+    store.add_documents([Document(page_content=WEB_TEXT, metadata={"source": "https://example.org/visit"})])
+    sources = [doc.metadata["source"] for doc in query_vectorstore("mammography false negatives", store, k=4, library=library)]
+    assert sorted(sources) == ["docs/mammography.pdf", "https://example.org/visit"]  # Each store ranks its own chunk first
+    assert [doc.metadata["source"] for doc in query_vectorstore("mammography", store, k=4)] == ["https://example.org/visit"]
+
+
+def test_pdf_chunk_reaches_the_synthesis_context(library, monkeypatch):
+    monkeypatch.setattr(pipeline, "search_web", lambda query, max_results=3: [{"url": "https://example.org/visit", "title": "", "snippet": ""}])
+    monkeypatch.setattr(pipeline, "extract_web_page", lambda url: WEB_TEXT)
+    monkeypatch.setattr(pipeline, "search_arxiv", lambda query, max_results=2: [])
+    monkeypatch.setattr(pipeline, "get_pubmed_abstracts", lambda query, max_results=1: [])
+    prompts = []
+
+    def stream_answer(subq, chunks, metrics, context_stats=None):
+        prompts.append(build_prompt(subq, chunks, context_stats=context_stats))
+        yield "answer"
+
+    monkeypatch.setattr(pipeline, "stream_answer", stream_answer)
+    subq = "Does mammography screening with convolutional networks reduce false negatives?"
+    with FanOut() as fanout:
+        result = pipeline.research_subquestion(
+            subq, fanout, NumpyVectorStore(BagOfWords()), threading.Lock(), NearDuplicateFilter(), library=library,
+        )
+    assert result["errors"] == []
+    assert "docs/mammography.pdf" in [doc.metadata["source"] for doc in result["retrieved"]]
+    assert "reduced false negatives" in prompts[0]
@@ -0,0 +1,90 @@
+# agent/tests/test_retrieval.py
+
+import math
+import random
+from collections import Counter
+
+import pytest
+from langchain_core.documents import Document
+
+from agent.retrieval import BM25Index, cosine, mmr, reciprocal_rank_fusion, tokenize
+
+
+def exhaustive_bm25(index, query):
+    """
+    Reference scorer: every query term over every chunk, no pruning.
+    """
+    n = len(index.docs)
+    avgdl = index.total_len / n or 1.0
+    counts = [Counter(tokenize(doc.page_content)) for doc in index.docs]
+    scores = {}
+    for term in set(tokenize(query)):
+        postings = index.postings.get(term, {})
+        if not postings:
+            continue
+        idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+        for idx, tf in enumerate(count[term] for count in counts):
+            if tf:
+                norm = index.k1 * (1 - index.b + index.b * index.doc_len[idx] / avgdl)
+                scores[idx] = scores.get(idx, 0.0) + idf * tf * (index.k1 + 1) / (tf + norm)
+    return sorted(scores.values(), reverse=True)
+
+
+def test_pruned_bm25_matches_exhaustive_scoring():
+    rng = random.Random(7)
+    vocab = [f"w{n}" for n in range(300)]
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]  # Zipf-like: a few terms are in most chunks
+    index = BM25Index()
+    index.add([Document(page_content=" ".join(rng.choices(vocab, weights, k=rng.randint(5, 60))), metadata={"source": f"d{n}"})
+               for n in range(800)])
+    for _ in range(50):
+        query = " ".join(rng.choices(vocab[:5], k=2) + rng.sample(vocab, 3))  # Common terms mixed with rare ones
+        expected = exhaustive_bm25(index, query)
+        for k in (1, 5, 20):
+            assert [score for _, score in index.search(query, k)] == pytest.approx(expected[:k])
+
+
+def test_bm25_finds_rare_exact_terms():
+    index = BM25Index()
+    index.add([Document(page_content=f"common filler text number {n}", metadata={"source": str(n)}) for n in range(50)])
+    index.add([Document(page_content="EGFR mutation common filler", metadata={"source": "egfr"})])
+    index.add([Document(page_content="EGFR mutation common filler", metadata={"source": "egfr"})])  # Same chunk: ignored
+    assert len(index) == 51
+    assert index.search("egfr common", 1)[0][0].metadata["source"] == "egfr"
+
+
+def doc(name):
+    return Document(page_content=name, metadata={"source": name})
+
+
+def test_rrf_rewards_agreement_and_breaks_ties_by_first_seen():
+    a, b, c, d = doc("a"), doc("b"), doc("c"), doc("d")
+    fused = reciprocal_rank_fusion([[a, b, c], [d, b, a]], k=60)
+    names = [x.page_content for x, _ in fused]
+    assert names[:2] == ["a", "b"]  # In both lists: 1/61 + 1/63 for a beats 2/62 for b by a hair
+    assert names[2:] == ["d", "c"]  # Tied singletons in order of rank, then first seen
+    scores = dict((x.page_content, s) for x, s in fused)
+    assert scores["a"] == pytest.approx(1 / 61 + 1 / 63)
+    tied = reciprocal_rank_fusion([[a], [b]])
+    assert [x.page_content for x, _ in tied] == ["a", "b"] and tied[0][1] == tied[1][1]
+
+
+def test_rrf_keeps_the_first_object_for_a_document():
+    first, copy = doc("same"), doc("same")
+    fused = reciprocal_rank_fusion([[first], [copy]])
+    assert len(fused) == 1 and fused[0][0] is first
+
+
+def test_mmr_prefers_diverse_candidates():
+    query = [1.0, 0.0]
+    vectors = [[1.0, 0.05], [1.0, 0.06], [0.5, -0.866]]  # Two near-copies, then a different but relevant one
+    candidates = ["best", "near copy", "different"]
+    assert mmr(query, candidates, vectors, k=2) == ["best", "different"]
+    assert mmr(query, candidates, vectors, k=2, lambda_mult=1.0) == ["best", "near copy"]  # Pure relevance
+    assert mmr(query, candidates, vectors, k=5) == ["best", "different", "near copy"]
+
+
+def test_cosine():
+    assert cosine([1.0, 0.0], [2.0, 0.0]) == pytest.approx(1.0)
+    assert cosine([1.0, 0.0], [0.0, 3.0]) == pytest.approx(0.0)
+    assert cosine([0.0, 0.0], [1.0, 1.0]) == 0.0
@@ -0,0 +1,109 @@
+# agent/tests/test_tracing.py
+
+import json
+
+import pytest
+
+from agent.orchestrator import FanOut
+from agent.tracing import NOOP_SPAN, Tracer, current_tracer, span, traced
+
+
+@traced(items=len, bytes=lambda result: sum(map(len, result)))
+def fetch_pages(n):
+    with span("parse") as s:
+        s.add(items=n)
+    return ["page"] * n
+
+
+@traced()
+def stream_items(n):
+    yield from range(n)
+
+
+@traced()
+def fail():
+    raise ValueError("boom")
+
+
+def test_inactive_tracing_is_a_noop():
+    assert current_tracer() is None
+    assert span("anything") is NOOP_SPAN
+    with span("anything") as s:
+        s.set(items=3)
+        s.add(bytes=5)
+    assert fetch_pages(2) == ["page", "page"]
+    assert list(stream_items(3)) == [0, 1, 2]
+
+
+def test_spans_nest_across_fanout_worker_threads():
+    tracer = Tracer()
+    with tracer.activate():
+        with span("run"):
+            with FanOut(max_workers=2, subq_workers=2) as fanout:
+                fanout.map(lambda n: fanout.call(fetch_pages, n), [1, 2, 3])
+    assert current_tracer() is None
+    records = {record["id"]: record for record in tracer.records()}
+    by_name = {}
+    for record in records.values():
+        by_name.setdefault(record["name"], []).append(record)
+    (run,) = by_name["run"]
+    assert run["parent"] is None
+    assert len(by_name["fetch_pages"]) == 3
+    for record in by_name["fetch_pages"]:
+        assert record["parent"] == run["id"]  # The caller's span, carried onto the worker through contextvars
+        assert record["thread"] != run["thread"]
+    assert sorted(r["items"] for r in by_name["fetch_pages"]) == [1, 2, 3]
+    assert sorted(r["bytes"] for r in by_name["fetch_pages"]) == [4, 8, 12]
+    for record in by_name["parse"]:
+        assert records[record["parent"]]["name"] == "fetch_pages"
+
+
+def test_generators_and_errors_are_recorded():
+    tracer = Tracer()
+    with tracer.activate():
+        assert list(stream_items(4)) == [0, 1, 2, 3]
+        with pytest.raises(ValueError):
+            fail()
+    records = {record["name"]: record for record in tracer.records()}
+    assert records["stream_items"]["items"] == 4
+    assert records["fail"]["error"] == "ValueError: boom"
+    summary = {row["name"]: row for row in tracer.summary()}
+    assert summary["fail"]["errors"] == 1 and summary["stream_items"]["calls"] == 1
+
+
+def test_export_formats():
+    tracer = Tracer()
+    with tracer.activate():
+        fetch_pages(2)
+    lines = tracer.jsonl().splitlines()
+    assert len(lines) == 2
+    for line in lines:
+        assert set(json.loads(line)) == {"id", "parent", "name", "thread", "start", "wall", "cpu", "items", "bytes", "error"}
+
+    trace = tracer.chrome_trace()
+    assert trace["displayTimeUnit"] == "ms"
+    complete = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+    metadata = [event for event in trace["traceEvents"] if event["ph"] == "M"]
+    assert sorted(event["name"] for event in complete) == ["fetch_pages", "parse"]
+    for event in complete:
+        assert {"name", "ph", "pid", "tid", "ts", "dur", "args"} <= set(event)
+        assert event["dur"] >= 0
+    assert [event["name"] for event in metadata] == ["thread_name"]
+    assert json.loads(json.dumps(trace)) == trace
+
+
+def test_failed_page_fetch_is_recorded_on_its_span(monkeypatch, capsys):
+    from agent import gather_docs
+
+    def refuse(url):
+        raise ConnectionError(f"refused: {url}")
+
+    monkeypatch.setattr(gather_docs, "cached_fetch", refuse)
+    tracer = Tracer()
+    with tracer.activate():
+        assert gather_docs.extract_web_page("https://example.org/a") is None
+    records = {record["name"]: record for record in tracer.records()}
+    assert records["fetch_web_page"]["error"] == "ConnectionError: refused: https://example.org/a"
+    assert records["fetch_web_page"]["parent"] == records["extract_web_page"]["id"]
+    assert records["extract_web_page"]["error"] is None
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,54 @@
+# agent/tests/test_warmup.py
+
+import pytest
+
+from agent import warmup
+
+
+class FakeModule:
+    """
+    Records attribute access, the way langchain_community loads a loader.
+    """
+
+    def __init__(self, requested):
+        self._requested = requested
+
+    def __getattr__(self, attribute):
+        self._requested.append(attribute)
+
+
+@pytest.fixture
+def imported(monkeypatch):
+    """
+    Records what preload_imports asks for without importing anything.
+    """
+    requested = []
+
+    def import_module(name):
+        requested.append(name)
+        return FakeModule(requested)
+
+    monkeypatch.setattr(warmup.importlib, "import_module", import_module)
+    return requested
+
+
+@pytest.mark.parametrize("full_text", [False, True])
+def test_arxiv_loader_is_only_preloaded_for_full_text(imported, monkeypatch, full_text):
+    monkeypatch.setattr(warmup, "ARXIV_FULL_TEXT", full_text)
+    monkeypatch.setattr(warmup, "VECTOR_BACKEND", "numpy")
+    warmup.preload_imports()
+    assert ("ArxivLoader" in imported) is full_text
+    assert "PyMuPDFLoader" in imported and "langchain_chroma" not in imported
+
+
+def test_chroma_is_preloaded_for_its_backend(imported, monkeypatch):
+    monkeypatch.setattr(warmup, "VECTOR_BACKEND", "chroma")
+    warmup.preload_imports()
+    assert imported[-2:] == ["langchain_chroma", "Chroma"]
+
+
+def test_measure_imports_times_each_module_in_a_fresh_interpreter():
+    timings = warmup.measure_imports(("json", "no_such_module"))
+    assert set(timings) == {"json", "no_such_module"}
+    assert timings["json"] >= 0
+    assert timings["no_such_module"] is None  # A failed import is reported, not raised
@@ -0,0 +1,327 @@
+# agent/tracing.py
+
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+
+_tracer = contextvars.ContextVar("agent_tracer", default=None)
+_parent = contextvars.ContextVar("agent_span", default=None)
+_ids = itertools.count(1)
+
+
+class Span:
+    """
+    One timed operation: wall and CPU time (of the thread it ran on), plus optional item and byte counts.
+    """
+    __slots__ = ("id", "parent", "name", "thread", "start", "end", "cpu", "items", "bytes", "error", "_cpu_start")
+
+    def __init__(self, name, parent):
+        self.id = next(_ids)
+        self.parent = parent
+        self.name = name
+        self.thread = threading.current_thread().name
+        self.start = time.perf_counter()
+        self.end = None
+        self.cpu = None
+        self.items = None
+        self.bytes = None
+        self.error = None
+        self._cpu_start = time.thread_time()
+
+    @property
+    def wall(self):
+        return None if self.end is None else self.end - self.start
+
+    def set(self, items=None, bytes=None):
+        if items is not None:
+            self.items = items
+        if bytes is not None:
+            self.bytes = bytes
+
+    def add(self, items=0, bytes=0):
+        self.items = (self.items or 0) + items
+        self.bytes = (self.bytes or 0) + bytes
+
+
+class _NoopSpan:
+    """
+    Stands in for a span when tracing is off: every operation does nothing.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, items=None, bytes=None):
+        pass
+
+    def add(self, items=0, bytes=0):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _ActiveSpan:
+    __slots__ = ("tracer", "name", "span", "token")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        parent = _parent.get()
+        self.span = Span(self.name, parent.id if parent is not None else None)
+        self.token = _parent.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        span = self.span
+        span.end = time.perf_counter()
+        span.cpu = time.thread_time() - span._cpu_start
+        if exc_type is not None:
+            span.error = f"{exc_type.__name__}: {exc}"
+        _parent.reset(self.token)
+        self.tracer._finish(span)
+        return False
+
+
+class Tracer:
+    """
+    Collects the spans of one run, including those opened on FanOut worker threads.
+    Activate it with `with tracer.activate():`; outside an active tracer, span() and @traced cost one lookup.
+    """
+
+    def __init__(self):
+        self.spans = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _finish(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def activate(self):
+        return _Activation(self)
+
+    def span(self, name):
+        return _ActiveSpan(self, name)
+
+    def finished(self):
+        with self._lock:
+            return sorted(self.spans, key=lambda span: span.start)
+
+    def records(self):
+        """
+        Finished spans as plain dicts, times in seconds relative to the tracer's creation.
+        """
+        return [
+            {
+                "id": span.id, "parent": span.parent, "name": span.name, "thread": span.thread,
+                "start": span.start - self.started, "wall": span.wall, "cpu": span.cpu,
+                "items": span.items, "bytes": span.bytes, "error": span.error,
+            }
+            for span in self.finished()
+        ]
+
+    def summary(self):
+        """
+        Totals per span name: calls, wall and CPU seconds, items and bytes; slowest first.
+        """
+        totals = {}
+        for span in self.finished():
+            row = totals.setdefault(span.name, {"name": span.name, "calls": 0, "wall": 0.0, "cpu": 0.0, "items": 0, "bytes": 0, "errors": 0})
+            row["calls"] += 1
+            row["wall"] += span.wall or 0.0
+            row["cpu"] += span.cpu or 0.0
+            row["items"] += span.items or 0
+            row["bytes"] += span.bytes or 0
+            row["errors"] += span.error is not None
+        return sorted(totals.values(), key=lambda row: row["wall"], reverse=True)
+
+    def jsonl(self):
+        """
+        One JSON object per span, one per line.
+        """
+        return "".join(json.dumps(record) + "\n" for record in self.records())
+
+    def write_jsonl(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.jsonl())
+
+    def chrome_trace(self):
+        """
+        The spans in Chrome trace event format, for chrome://tracing or https://ui.perfetto.dev.
+        """
+        threads = {}
+        events = []
+        for record in self.records():
+            tid = threads.setdefault(record["thread"], len(threads) + 1)
+            args = {key: record[key] for key in ("cpu", "items", "bytes", "error") if record[key] is not None}
+            events.append({
+                "name": record["name"], "ph": "X", "pid": os.getpid(), "tid": tid,
+                "ts": record["start"] * 1e6, "dur": (record["wall"] or 0.0) * 1e6, "args": args,
+            })
+        events.extend(
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+            for name, tid in threads.items()
+        )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+class _Activation:
+    __slots__ = ("tracer", "tokens")
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def __enter__(self):
+        self.tokens = (_tracer.set(self.tracer), _parent.set(None))
+        return self.tracer
+
+    def __exit__(self, *exc):
+        _parent.reset(self.tokens[1])
+        _tracer.reset(self.tokens[0])
+        return False
+
+
+def current_tracer():
+    return _tracer.get()
+
+
+def span(name):
+    """
+    Opens a span under the active tracer, nested in the current span; a no-op when no tracer is active.
+    Use as `with span("stage") as s: ... s.set(items=n, bytes=m)`.
+    """
+    tracer = _tracer.get()
+    return NOOP_SPAN if tracer is None else _ActiveSpan(tracer, name)
+
+
+def traced(name=None, items=None, bytes=None):
+    """
+    Decorator that records each call of a function as a span.
+    `items` and `bytes` are optional functions of the return value (e.g. items=len).
+    Generator functions are timed from first to last item, with items counting what was yielded;
+    their spans are not parents of spans opened by the consumer in between.
+    """
+    def decorator(fn):
+        label = name or fn.__name__
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                tracer = _tracer.get()
+                if tracer is None:
+                    yield from fn(*args, **kwargs)
+                    return
+                parent = _parent.get()
+                span = Span(label, parent.id if parent is not None else None)
+                span.items = 0
+                try:
+                    for value in fn(*args, **kwargs):
+                        span.items += 1
+                        yield value
+                except BaseException as e:
+                    if not isinstance(e, GeneratorExit):
+                        span.error = f"{type(e).__name__}: {e}"
+                    raise
+                finally:
+                    span.end = time.perf_counter()
+                    tracer._finish(span)  # CPU time is left unset: the consumer runs on this thread between items
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer.get()
+            if tracer is None:
+                return fn(*args, **kwargs)
+            with _ActiveSpan(tracer, label) as span:
+                result = fn(*args, **kwargs)
+                if items is not None:
+                    span.items = items(result)
+                if bytes is not None:
+                    span.bytes = bytes(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def waterfall_spec(records):
+    """
+    Vega-Lite spec (data included) drawing spans as a waterfall: one row per span, in start order.
+    Used by the app's trace panel through st.vega_lite_chart.
+    """
+    rows = [
+        {
+            "span": f"{n:03d} {record['name']}", "start_ms": record["start"] * 1000,
+            "end_ms": (record["start"] + (record["wall"] or 0.0)) * 1000, "thread": record["thread"],
+            "wall_ms": round((record["wall"] or 0.0) * 1000, 1),
+            "cpu_ms": None if record["cpu"] is None else round(record["cpu"] * 1000, 1),
+            "items": record["items"], "bytes": record["bytes"],
+        }
+        for n, record in enumerate(records)
+    ]
+    return {
+        "data": {"values": rows},
+        "mark": "bar",
+        "height": max(200, 14 * len(rows)),
+        "encoding": {
+            "y": {"field": "span", "type": "nominal", "sort": None, "title": None},
+            "x": {"field": "start_ms", "type": "quantitative", "title": "ms since start"},
+            "x2": {"field": "end_ms"},
+            "color": {"field": "thread", "type": "nominal"},
+            "tooltip": [{"field": f} for f in ("span", "thread", "wall_ms", "cpu_ms", "items", "bytes")],
+        },
+    }
+
+
+if __name__ == "__main__":
+    # Overhead of @traced with tracing off and on, and a small nested trace written in both formats.
+    import tempfile
+
+    @traced("work", items=len)
+    def work(n):
+        return list(range(n))
+
+    def plain(n):
+        return list(range(n))
+
+    calls = 200_000
+    for label, fn in (("undecorated", plain), ("traced, no tracer", work)):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn(1)
+        print(f"{label:<20} {(time.perf_counter() - start) / calls * 1e9:7.0f} ns/call")
+    tracer = Tracer()
+    with tracer.activate():
+        start = time.perf_counter()
+        for _ in range(calls):
+            work(1)
+        print(f"{'traced, active':<20} {(time.perf_counter() - start) / calls * 1e9:7.0f} ns/call")
+
+    tracer = Tracer()
+    with tracer.activate():
+        with span("run") as run:
+            for n in range(3):
+                with span("stage"):
+                    work(10_000)
+            run.set(items=3)
+    with tempfile.TemporaryDirectory() as tmp:
+        tracer.write_jsonl(os.path.join(tmp, "trace.jsonl"))
+        tracer.write_chrome(os.path.join(tmp, "trace.json"))
+        print(f"{len(tracer.spans)} spans; JSONL {os.path.getsize(os.path.join(tmp, 'trace.jsonl'))} bytes")
+    for row in tracer.summary():
+        print(f"  {row['name']:<6} calls={row['calls']} wall={row['wall'] * 1000:.2f} ms cpu={row['cpu'] * 1000:.2f} ms items={row['items']}")
@@ -1,28 +1,98 @@
 # agent/vectorstore.py
 
-from langchain_ollama import OllamaEmbeddings
-from langchain_chroma import Chroma
+import hashlib
+import itertools
+import os
 
+from agent.config import RETRIEVAL_MODE, VECTOR_BACKEND
+from agent.embeddings import get_embeddings
+from agent.retrieval import HybridRetriever, get_bm25, reciprocal_rank_fusion
+from agent.tracing import span, traced
 
-def get_vectorstore():
-    embeddings = OllamaEmbeddings(model="nomic-embed-text:latest")
+_collection_ids = itertools.count(1)
+
+
+def get_vectorstore(collection_name="my_collection", persist_directory=None):
+    """
+    Creates a vector store: Chroma by default, or the in-process NumPy index when VECTOR_BACKEND is "numpy".
+    With a persist_directory the collection and its embeddings are kept on disk and reopened by later runs.
+    Embeddings go through the shared cache, so a text is only embedded once per model.
+    """
+    embeddings = get_embeddings()
+    if VECTOR_BACKEND == "numpy":
+        from agent.numpy_store import NumpyVectorStore
+        directory = os.path.join(persist_directory, collection_name) if persist_directory else None
+        return NumpyVectorStore(embeddings, persist_directory=directory)
+
+    from langchain_chroma import Chroma
     vectorstore = Chroma(
-        collection_name="my_collection",
-        embedding_function=embeddings
+        collection_name=collection_name,
+        embedding_function=embeddings,
+        persist_directory=persist_directory
     )
     return vectorstore
 
 
+def unique_collection_name(prefix, key=""):
+    """
+    Returns a collection name no other store in this process has used, valid for Chroma
+    (3-63 characters, alphanumeric at both ends): the prefix, a short hash of `key` and a counter.
+    """
+    digest = hashlib.sha1(str(key).encode("utf-8")).hexdigest()[:10]
+    return f"{prefix}-{digest}-{next(_collection_ids)}"
+
+
+def drop_vectorstore(vectorstore):
+    """
+    Deletes a store's collection. Chroma keeps in-memory collections for the life of the process.
+    """
+    if hasattr(vectorstore, "delete_collection"):
+        vectorstore.delete_collection()
+
+
 def add_chunks_to_vectorstore(chunks, vectorstore):
     """
-    Add a list of Document chunks to the vectorstore.
+    Add a list of Document chunks to the vectorstore, and to the BM25 index kept alongside it.
+    Returns the ids the vectorstore assigned.
     """
-    vectorstore.add_documents(chunks)
+    with span("add_chunks_to_vectorstore") as s:
+        s.set(items=len(chunks), bytes=sum(len(chunk.page_content) for chunk in chunks))
+        ids = vectorstore.add_documents(chunks)
+        get_bm25(vectorstore).add(chunks)
+        return ids
 
 
-def query_vectorstore(query, vectorstore, k=4):
+@traced(items=len)
+def query_vectorstore(query, vectorstore, k=4, library=None):
     """
     Query the vectorstore for top-k similar chunks.
+    In hybrid mode, dense results are fused with BM25 keyword matches, so exact
+    terms (gene and drug names, acronyms) are not missed.
+    With a library (the persistent PDF index), its matches are fused in as well.
     """
-    results = vectorstore.similarity_search(query, k=k)
-    return results
+    return query_vectorstore_many([query], vectorstore, k=k, library=library)[0]
+
+
+@traced(items=len)
+def query_vectorstore_many(queries, vectorstore, k=4, library=None):
+    """
+    Query the vectorstore for several queries at once; returns one top-k list per query.
+    A library store is searched too, and each query's two rankings are merged with reciprocal-rank fusion.
+    """
+    results = _search_many(queries, vectorstore, k)
+    if library is None:
+        return results
+    library_results = _search_many(queries, library, k)
+    return [
+        [doc for doc, _ in reciprocal_rank_fusion([found, from_library])][:k]
+        for found, from_library in zip(results, library_results)
+    ]
+
+
+def _search_many(queries, vectorstore, k):
+    index = get_bm25(vectorstore)
+    if RETRIEVAL_MODE != "hybrid" or not len(index):
+        if hasattr(vectorstore, "similarity_search_many"):  # NumPy backend: one batched matrix product
+            return vectorstore.similarity_search_many(queries, k=k)
+        return [vectorstore.similarity_search(query, k=k) for query in queries]
+    return HybridRetriever(vectorstore, index).search_many(queries, k=k)
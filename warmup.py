@@ -0,0 +1,136 @@
+# agent/warmup.py
+
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from agent.config import ARXIV_FULL_TEXT, EMBED_MODEL, LLM_MODEL, OLLAMA_HOST, PACKAGE_DIR, VECTOR_BACKEND, WARMUP_KEEP_ALIVE
+
+HEAVY_IMPORTS = (  # (module, attribute or None): deferred by the modules that use them, loaded ahead by warm-up
+    ("langchain_ollama", "OllamaLLM"),
+    ("langchain_community.document_loaders", "PyMuPDFLoader"),
+    ("bs4", None),
+    ("ddgs", None),
+    ("fitz", None),
+)
+APP_MODULES = (  # What app.py imports, for measuring cold-start import time
+    "streamlit", "agent.pipeline", "agent.export", "agent.ingest", "agent.llm", "agent.tracing", "agent.warmup",
+)
+MODEL_LOAD_TIMEOUT = 300  # Seconds; loading a large model from disk can take a while
+
+
+def _ollama_url(path):
+    host = OLLAMA_HOST if "://" in OLLAMA_HOST else f"http://{OLLAMA_HOST}"
+    return f"{host.rstrip('/')}{path}"
+
+
+def preload_imports():
+    """
+    Imports the heavy libraries the pipeline defers, so the first query does not pay for them.
+    Optional ones are only loaded when the configuration uses them.
+    """
+    modules = list(HEAVY_IMPORTS)
+    if ARXIV_FULL_TEXT:
+        modules.append(("langchain_community.document_loaders", "ArxivLoader"))
+    if VECTOR_BACKEND != "numpy":
+        modules.append(("langchain_chroma", "Chroma"))
+    for module, attribute in modules:
+        loaded = importlib.import_module(module)
+        if attribute:
+            getattr(loaded, attribute)  # langchain_community loads its loaders on attribute access
+
+
+def preload_models():
+    """
+    Asks Ollama to load the generation and embedding models and keep them loaded for WARMUP_KEEP_ALIVE,
+    and creates the shared LLM and embedding clients.
+    """
+    from agent.embeddings import get_embeddings
+    from agent.fetcher import get_session
+    from agent.llm import get_default_llm
+
+    session = get_session()
+    session.post(_ollama_url("/api/generate"), json={"model": LLM_MODEL, "keep_alive": WARMUP_KEEP_ALIVE},
+                 timeout=MODEL_LOAD_TIMEOUT).raise_for_status()  # No prompt: the model is only loaded
+    session.post(_ollama_url("/api/embed"), json={"model": EMBED_MODEL, "input": "warm-up", "keep_alive": WARMUP_KEEP_ALIVE},
+                 timeout=MODEL_LOAD_TIMEOUT).raise_for_status()
+    get_default_llm().llm
+    get_embeddings()
+
+
+def preload_pdf_index():
+    """
+    Opens the pre-ingested PDF index and runs one query, so its files are read before the first user query.
+    """
+    from agent.ingest import get_pdf_index
+
+    get_pdf_index().similarity_search("warm-up", k=1)
+
+
+STEPS = (("imports", preload_imports), ("models", preload_models), ("pdf_index", preload_pdf_index))
+
+
+def warm_up(log=print):
+    """
+    Runs every warm-up step, continuing past failures (e.g. Ollama not running yet).
+    Returns {step: seconds} and {step: error message}.
+    """
+    timings, errors = {}, {}
+    for name, step in STEPS:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            errors[name] = f"{type(e).__name__}: {e}"
+            log(f"Warm-up {name} failed: {errors[name]}")
+        timings[name] = time.perf_counter() - started
+    log("Warm-up: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    return timings, errors
+
+
+def start_warm_up(log=print):
+    """
+    Runs warm_up on a background thread, so the app renders while models load. Returns the thread.
+    """
+    thread = threading.Thread(target=warm_up, kwargs={"log": log}, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def measure_imports(modules=APP_MODULES):
+    """
+    Cold import time of each module, each measured in a fresh interpreter. Returns {module: seconds}.
+    """
+    code = "import importlib, sys, time; t = time.perf_counter(); importlib.import_module(sys.argv[1]); print(time.perf_counter() - t)"
+    timings = {}
+    for module in modules:
+        result = subprocess.run(
+            [sys.executable, "-c", code, module], cwd=os.path.dirname(PACKAGE_DIR),
+            capture_output=True, text=True,
+        )
+        timings[module] = float(result.stdout.strip().splitlines()[-1]) if result.returncode == 0 else None
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m agent.warmup",
+        description="Warm up the models, heavy imports and PDF index, or measure cold-start import times.",
+    )
+    parser.add_argument("--imports", action="store_true", help="Measure the cold import time of the app's modules instead")
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        for module, seconds in measure_imports().items():
+            print(f"{module:<20} " + ("failed" if seconds is None else f"{seconds * 1000:7.0f} ms"))
+        return 0
+    _, errors = warm_up()
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())